@@ -6,6 +6,7 @@ from typing import Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.db.database import get_db
@@ -36,11 +37,17 @@ def list_materials(
     is_critical: Optional[bool] = Query(None, alias="isCritical"),
     price_min: Optional[float] = Query(None, alias="priceMin"),
     price_max: Optional[float] = Query(None, alias="priceMax"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = Query(None, alias="totalMode", pattern="^(none|approximate|exact)$"),
     service: MaterialService = Depends(get_service),
 ) -> MaterialsListResult:
     query = MaterialsListQuery(
         page=page,
         pageSize=page_size,
+        pagination=pagination,
+        cursor=cursor,
+        totalMode=total_mode,
         search=search,
         group=group,
         subgroup=subgroup,
@@ -49,7 +56,10 @@ def list_materials(
         priceMin=price_min,
         priceMax=price_max,
     )
-    return service.list_materials(query)
+    try:
+        return service.list_materials(query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/{material_id}", response_model=MaterialResponse)
@@ -79,4 +89,8 @@ def update_material(
 
 @router.delete("/{material_id}", status_code=204)
 def delete_material(material_id: UUID, service: MaterialService = Depends(get_service)):
-    service.delete_material(material_id)
+    try:
+        service.delete_material(material_id)
+    except IntegrityError as exc:
+        # The warehouse ledger keeps its materials
+        raise HTTPException(status_code=409, detail="Material has warehouse movements") from exc
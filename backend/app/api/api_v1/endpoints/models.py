@@ -41,18 +41,27 @@ def list_models(
     model_type: Optional[str] = Query(None, alias="modelType"),
     category: Optional[str] = None,
     status: Optional[str] = None,
+    pagination: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = Query(None, alias="totalMode", pattern="^(none|approximate|exact)$"),
     service: ModelService = Depends(get_service),
 ) -> ModelsListResult:
     query = ModelsListQuery(
         page=page,
         pageSize=page_size,
+        pagination=pagination,
+        cursor=cursor,
+        totalMode=total_mode,
         search=search,
         gender=gender,
         modelType=model_type,
         category=category,
         status=status,
     )
-    return service.list_models(query)
+    try:
+        return service.list_models(query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/{model_id}", response_model=ModelResponse)
@@ -26,16 +26,25 @@ def list_references(
     search: Optional[str] = None,
     type: Optional[str] = None,
     is_active: Optional[bool] = Query(None, alias="isActive"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = Query(None, alias="totalMode", pattern="^(none|approximate|exact)$"),
     service: ReferenceService = Depends(get_service),
 ) -> ReferenceListResult:
     query = ReferenceListQuery(
         page=page,
         pageSize=page_size,
+        pagination=pagination,
+        cursor=cursor,
+        totalMode=total_mode,
         search=search,
         type=type,
         isActive=is_active,
     )
-    return service.list_references(query)
+    try:
+        return service.list_references(query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/{reference_id}", response_model=ReferenceItem)
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Optional
 from uuid import UUID
 
@@ -10,12 +11,39 @@ from sqlalchemy.orm import Session
 
 from app.db.database import get_db
 from app.schemas.warehouse import (
+    WarehouseAvailabilityRequest,
+    WarehouseAvailabilityResult,
+    WarehouseBatchLookupRequest,
+    WarehouseBatchLookupResult,
     WarehouseIssueDraft,
+    WarehouseIssueResult,
     WarehouseListQuery,
     WarehouseListResult,
+    WarehouseMaterialValuation,
     WarehouseReceiptDraft,
+    WarehouseReservationDraft,
+    WarehouseReservationReleaseRequest,
+    WarehouseReservationReleaseResult,
+    WarehouseReservationResult,
+    WarehouseStatistics,
     WarehouseStock,
+    WarehouseStockAlertList,
+    WarehouseStocktake,
+    WarehouseStocktakeCountBatch,
+    WarehouseStocktakeCreate,
+    WarehouseStocktakeDiff,
+    WarehouseStocktakePostResult,
+    WarehouseTransferDraft,
+    WarehouseTransferResult,
+    WarehouseValuationSummary,
 )
+from app.services.alert_service import StockAlertService
+from app.services.batch_lookup_service import BatchLookupService
+from app.services.reservation_service import ReservationService
+from app.services.statistics_service import WarehouseStatisticsService
+from app.services.stocktake_service import StocktakeService
+from app.services.valuation_service import StockValuation
+from app.services.warehouse_ledger import WarehouseLedger
 from app.services.warehouse_service import WarehouseService
 
 router = APIRouter()
@@ -25,6 +53,30 @@ def get_service(db: Session = Depends(get_db)) -> WarehouseService:
     return WarehouseService(db)
 
 
+def get_reservation_service(db: Session = Depends(get_db)) -> ReservationService:
+    return ReservationService(db)
+
+
+def get_valuation(db: Session = Depends(get_db)) -> StockValuation:
+    return StockValuation(db)
+
+
+def get_stocktake_service(db: Session = Depends(get_db)) -> StocktakeService:
+    return StocktakeService(db)
+
+
+def get_alert_service(db: Session = Depends(get_db)) -> StockAlertService:
+    return StockAlertService(db)
+
+
+def get_batch_lookup_service(db: Session = Depends(get_db)) -> BatchLookupService:
+    return BatchLookupService(db)
+
+
+def get_statistics_service(db: Session = Depends(get_db)) -> WarehouseStatisticsService:
+    return WarehouseStatisticsService(db)
+
+
 @router.get("/stock", response_model=WarehouseListResult)
 def list_stock(
     page: int = Query(1, ge=1),
@@ -32,16 +84,27 @@ def list_stock(
     search: Optional[str] = None,
     warehouse_code: Optional[str] = Query(None, alias="warehouseCode"),
     status: Optional[str] = None,
+    as_of: Optional[datetime] = Query(None, alias="asOf"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = Query(None, alias="totalMode", pattern="^(none|approximate|exact)$"),
     service: WarehouseService = Depends(get_service),
 ) -> WarehouseListResult:
     query = WarehouseListQuery(
         page=page,
         pageSize=page_size,
+        pagination=pagination,
+        cursor=cursor,
+        totalMode=total_mode,
         search=search,
         warehouseCode=warehouse_code,
         status=status,
+        asOf=as_of,
     )
-    return service.list_stock(query)
+    try:
+        return service.list_stock(query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/stock/{stock_id}", response_model=WarehouseStock)
@@ -59,24 +122,201 @@ def receipt_materials(
 ) -> dict:
     """Process material receipt."""
     try:
-        service.receipt(draft)
-        return {"message": "Material receipt processed successfully"}
+        batch_numbers = service.receipt(draft)
+        return {"message": "Material receipt processed successfully", "batchNumbers": batch_numbers}
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail="Internal server error") from exc
 
 
-@router.post("/issue", status_code=201)
+@router.post("/issue", response_model=WarehouseIssueResult, status_code=201)
 def issue_materials(
     draft: WarehouseIssueDraft,
     service: WarehouseService = Depends(get_service),
-) -> dict:
-    """Process material issue/consumption."""
+) -> WarehouseIssueResult:
+    """Process material issue/consumption and report the outcome of every line."""
     try:
-        service.issue(draft)
-        return {"message": "Material issue processed successfully"}
+        return service.issue(draft)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail="Internal server error") from exc
+
+
+@router.post("/transfers", response_model=WarehouseTransferResult, status_code=201)
+def transfer_materials(
+    draft: WarehouseTransferDraft,
+    service: WarehouseService = Depends(get_service),
+) -> WarehouseTransferResult:
+    """Move batches to another warehouse as one document."""
+    try:
+        return service.transfer(draft)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.post("/availability", response_model=WarehouseAvailabilityResult)
+def check_availability(
+    payload: WarehouseAvailabilityRequest,
+    service: WarehouseService = Depends(get_service),
+) -> WarehouseAvailabilityResult:
+    """Return on-hand, reserved and available quantities for a set of materials."""
+    return service.check_availability(payload.materialIds)
+
+
+@router.post("/reservations", response_model=WarehouseReservationResult, status_code=201)
+def reserve_materials(
+    draft: WarehouseReservationDraft,
+    service: ReservationService = Depends(get_reservation_service),
+) -> WarehouseReservationResult:
+    """Reserve stock for a wave of order lines using FIFO or FEFO batch allocation."""
+    try:
+        return service.reserve(draft)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.post("/reservations/release", response_model=WarehouseReservationReleaseResult)
+def release_reservations(
+    payload: WarehouseReservationReleaseRequest,
+    service: ReservationService = Depends(get_reservation_service),
+) -> WarehouseReservationReleaseResult:
+    """Release active reservations of cancelled orders."""
+    return service.release(payload.orderReferences)
+
+
+@router.post("/snapshots", status_code=201)
+def take_balance_snapshot(db: Session = Depends(get_db)) -> dict:
+    """Snapshot current balances now; the backend also takes them on a timer."""
+    return {"rows": WarehouseLedger(db).take_snapshot()}
+
+
+@router.get("/valuation", response_model=WarehouseValuationSummary)
+def get_valuation_summary(valuation: StockValuation = Depends(get_valuation)) -> WarehouseValuationSummary:
+    """Total stock value at moving average and FIFO cost."""
+    return valuation.summary()
+
+
+@router.get("/valuation/{material_id}", response_model=WarehouseMaterialValuation)
+def get_material_valuation(
+    material_id: UUID,
+    valuation: StockValuation = Depends(get_valuation),
+) -> WarehouseMaterialValuation:
+    result = valuation.material_valuation(material_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Material valuation not found")
+    return result
+
+
+@router.post("/stocktakes", response_model=WarehouseStocktake, status_code=201)
+def create_stocktake(
+    payload: WarehouseStocktakeCreate,
+    service: StocktakeService = Depends(get_stocktake_service),
+) -> WarehouseStocktake:
+    """Open a stocktake session, optionally limited to one warehouse."""
+    return service.create(payload)
+
+
+@router.get("/stocktakes/{stocktake_id}", response_model=WarehouseStocktake)
+def get_stocktake(
+    stocktake_id: UUID,
+    service: StocktakeService = Depends(get_stocktake_service),
+) -> WarehouseStocktake:
+    stocktake = service.get(stocktake_id)
+    if not stocktake:
+        raise HTTPException(status_code=404, detail="Stocktake not found")
+    return stocktake
+
+
+@router.post("/stocktakes/{stocktake_id}/counts")
+def add_stocktake_counts(
+    stocktake_id: UUID,
+    batch: WarehouseStocktakeCountBatch,
+    service: StocktakeService = Depends(get_stocktake_service),
+) -> dict:
+    """Upload a batch of counted quantities, e.g. a scanner buffer."""
+    try:
+        return {"accepted": service.add_counts(stocktake_id, batch)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/stocktakes/{stocktake_id}/diff", response_model=WarehouseStocktakeDiff)
+def get_stocktake_diff(
+    stocktake_id: UUID,
+    service: StocktakeService = Depends(get_stocktake_service),
+) -> WarehouseStocktakeDiff:
+    """Preview discrepancies between counted and system quantities."""
+    try:
+        return service.diff(stocktake_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@router.post("/stocktakes/{stocktake_id}/post", response_model=WarehouseStocktakePostResult)
+def post_stocktake(
+    stocktake_id: UUID,
+    service: StocktakeService = Depends(get_stocktake_service),
+) -> WarehouseStocktakePostResult:
+    """Book discrepancies as adjustment entries and close the stocktake."""
+    try:
+        return service.post(stocktake_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/alerts", response_model=WarehouseStockAlertList)
+def list_alerts(
+    level: Optional[str] = None,
+    service: StockAlertService = Depends(get_alert_service),
+) -> WarehouseStockAlertList:
+    """Active low-stock alerts against each material's reorder point and safety stock."""
+    try:
+        return service.list_alerts(level)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.post("/alerts/refresh")
+def refresh_alerts(service: StockAlertService = Depends(get_alert_service)) -> dict:
+    """Re-evaluate alerts of all materials; movements keep them current afterwards."""
+    return {"active": service.refresh_all()}
+
+
+@router.get("/batches/{batch_number}", response_model=WarehouseBatchLookupResult)
+def scan_batch(
+    batch_number: str,
+    service: BatchLookupService = Depends(get_batch_lookup_service),
+) -> WarehouseBatchLookupResult:
+    """Resolve one scanned batch number to its stock rows, material and location."""
+    result = service.lookup([batch_number])
+    if not result.items:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return result
+
+
+@router.post("/batches/lookup", response_model=WarehouseBatchLookupResult)
+def lookup_batches(
+    payload: WarehouseBatchLookupRequest,
+    service: BatchLookupService = Depends(get_batch_lookup_service),
+) -> WarehouseBatchLookupResult:
+    """Resolve a whole list of scanned batch numbers in one request."""
+    try:
+        return service.lookup(payload.batchNumbers)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@router.get("/statistics", response_model=WarehouseStatistics)
+def get_statistics(
+    service: WarehouseStatisticsService = Depends(get_statistics_service),
+) -> WarehouseStatistics:
+    """Dashboard totals by status, warehouse and material group from the rollup."""
+    return service.get_statistics()
+
+
+@router.post("/statistics/refresh")
+def refresh_statistics(service: WarehouseStatisticsService = Depends(get_statistics_service)) -> dict:
+    """Recompute the statistics rollup now instead of waiting for the timer."""
+    return {"rows": service.refresh()}
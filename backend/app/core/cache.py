@@ -0,0 +1,193 @@
+"""Caches shared by services: in-process LRU and an optional Redis backend."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple, Union
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is optional at runtime
+    redis = None
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with an optional time-to-live per entry.
+
+    Each worker process has its own instance, so entries another process
+    changed are only refreshed after ``ttl`` seconds; writers in this
+    process should call :meth:`invalidate` for immediate consistency.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Cached values for the keys that are present and fresh."""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[Hashable, Any]) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            for key, value in values.items():
+                self._entries[key] = (expires_at, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def add(self, key: Hashable, value: Any) -> Any:
+        """Store ``value`` unless a fresh entry exists; returns the entry now cached."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= now:
+                self._entries.move_to_end(key)
+                return entry[1]
+            self._entries[key] = (now + self.ttl if self.ttl is not None else float("inf"), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache:
+    """String cache in Redis with the :class:`LRUCache` interface.
+
+    Entries are shared by all worker processes, so invalidation takes effect
+    everywhere at once; eviction is left to Redis (``ttl`` and its own memory
+    policy). Redis errors are logged and treated as misses, so an unavailable
+    Redis slows requests down but never fails them.
+    """
+
+    def __init__(self, client: "redis.Redis", namespace: str, ttl: Optional[float] = None) -> None:
+        self.client = client
+        self.prefix = f"krai:{namespace}:"
+        self.ttl = int(ttl) if ttl else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            values = self.client.mget([self.prefix + key for key in keys])
+        except redis.RedisError as exc:
+            logger.warning("Redis cache read failed: %s", exc)
+            return {}
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set(self, key: str, value: str) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: Dict[str, str]) -> None:
+        if not values:
+            return
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(self.prefix + key, value, ex=self.ttl)
+                pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("Redis cache write failed: %s", exc)
+
+    def add(self, key: str, value: str) -> str:
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.set(self.prefix + key, value, ex=self.ttl, nx=True)
+                pipe.get(self.prefix + key)
+                _, current = pipe.execute()
+        except redis.RedisError as exc:
+            logger.warning("Redis cache write failed: %s", exc)
+            return value
+        return value if current is None else current
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        names = [self.prefix + key for key in keys]
+        if not names:
+            return
+        try:
+            self.client.delete(*names)
+        except redis.RedisError as exc:
+            logger.warning("Redis cache invalidation failed: %s", exc)
+
+    def clear(self) -> None:
+        try:
+            names = list(self.client.scan_iter(match=self.prefix + "*", count=1000))
+            if names:
+                self.client.delete(*names)
+        except redis.RedisError as exc:
+            logger.warning("Redis cache invalidation failed: %s", exc)
+
+
+def create_cache(
+    namespace: str, maxsize: int, ttl: Optional[float] = None, local_ttl: Optional[float] = None
+) -> Union[LRUCache, RedisCache]:
+    """Redis cache when ``REDIS_URL`` answers, otherwise an in-process LRU.
+
+    The in-process LRU keeps entries for ``local_ttl`` (``ttl`` when not
+    given): invalidations there never reach other workers, so that is how
+    long they may serve stale entries. Called lazily by the services so that
+    importing them never waits on Redis.
+    """
+    if redis is not None and settings.REDIS_URL:
+        client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+        try:
+            client.ping()
+        except redis.RedisError as exc:
+            logger.warning(
+                "Redis unavailable for %s cache, using in-process LRU; other workers will not see "
+                "its invalidations: %s",
+                namespace,
+                exc,
+            )
+        else:
+            return RedisCache(client, namespace, ttl)
+    return LRUCache(maxsize=maxsize, ttl=ttl if local_ttl is None else local_ttl)
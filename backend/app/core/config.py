@@ -55,6 +55,13 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Serialized model cards; Redis when REDIS_URL answers, otherwise per-process LRU.
+    # Invalidation only reaches other worker processes through Redis: without it a
+    # worker serves a card another worker changed for up to the local TTL, so
+    # deployments with more than one worker need Redis.
+    MODEL_CACHE_SIZE: int = 1000
+    MODEL_CACHE_TTL_SECONDS: int = 600
+    MODEL_CACHE_LOCAL_TTL_SECONDS: int = 30
 
     # Telegram Bot for 2FA
     TELEGRAM_BOT_TOKEN: Optional[str] = None
@@ -62,6 +69,12 @@ class Settings(BaseSettings):
     # Production Settings
     DAILY_PRODUCTION_CAPACITY: int = 150
     DEFAULT_LEAD_TIME_DAYS: int = 7
+    # Interval of the warehouse statistics rollup refresh; 0 disables the timer
+    WAREHOUSE_STATISTICS_REFRESH_SECONDS: int = 300
+    # Interval between warehouse balance snapshots; 0 disables the timer
+    WAREHOUSE_SNAPSHOT_INTERVAL_SECONDS: int = 86400
+    # How often background timers check whether their job is due
+    SCHEDULER_TICK_SECONDS: int = 60
 
     # Environment
     ENVIRONMENT: str = Field(default="development")
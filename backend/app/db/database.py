@@ -2,10 +2,14 @@
 Database configuration for KRAI System v0.6
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
 
+T = TypeVar("T")
+
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.DATABASE_URL,
@@ -24,4 +28,21 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def run_exclusive(lock_key: int, job: Callable[[Session], T]) -> Optional[T]:
+    """Run ``job`` in a new session unless another process holds ``lock_key``.
+
+    Background timers start in every worker; the PostgreSQL advisory lock,
+    held on a separate connection for the duration of the job, lets one of
+    them do the work while the others skip the round.
+    """
+    with engine.connect() as connection:
+        if not connection.scalar(select(func.pg_try_advisory_lock(lock_key))):
+            return None
+        try:
+            with SessionLocal() as db:
+                return job(db)
+        finally:
+            connection.scalar(select(func.pg_advisory_unlock(lock_key)))
\ No newline at end of file
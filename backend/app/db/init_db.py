@@ -14,6 +14,30 @@ from app.models import Base
 
 logger = logging.getLogger(__name__)
 
+# ``create_all`` only creates missing tables; columns and indexes added to
+# existing tables are applied here. Every statement must be idempotent.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE warehouse_transactions ADD COLUMN IF NOT EXISTS document_id UUID",
+    "ALTER TABLE warehouse_stocktake_lines ADD COLUMN IF NOT EXISTS scanned_at TIMESTAMPTZ",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_transactions_document_id "
+    "ON warehouse_transactions (document_id)",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_transactions_stock_performed "
+    "ON warehouse_transactions (stock_id, performed_at)",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_transactions_performed_at "
+    "ON warehouse_transactions (performed_at)",
+    # Available quantity per material, summed for the stock status (CRITICAL/LOW/OK)
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_stock_material_available "
+    "ON warehouse_stock (material_id, (COALESCE(quantity, 0) - COALESCE(reserved_quantity, 0)))",
+    # FEFO batch picking for issues and reservations
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_stock_fefo "
+    "ON warehouse_stock (material_id, expiry_date, receipt_date)",
+    # Keyset pagination sort keys
+    "CREATE INDEX IF NOT EXISTS ix_materials_updated_keyset ON materials (updated_at DESC, material_id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_models_updated_keyset ON models (updated_at DESC, model_id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_stock_updated_keyset ON warehouse_stock (updated_at DESC, stock_id DESC)",
+    "CREATE INDEX IF NOT EXISTS ix_reference_items_name_keyset ON reference_items (name, reference_id)",
+]
+
 
 def _create_engine() -> Engine:
     """Create a synchronous SQLAlchemy engine for DDL actions."""
@@ -34,6 +58,9 @@ def init_db() -> None:
     engine = _create_engine()
     logger.info("Creating database schema if missing")
     Base.metadata.create_all(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
     with suppress(Exception):
         # Warm up the connection pool; helpful to fail fast if the URL is wrong
         with engine.connect() as connection:
@@ -3,8 +3,11 @@ KRAI System v0.6 - FastAPI Backend
 Main application entry point
 """
 
+import asyncio
 import logging
+from datetime import timedelta
 from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import time
@@ -12,8 +15,11 @@ import time
 from app.core.config import settings
 from app.core.logging import setup_logging, log_api_request, log_api_response
 from app.api.api_v1.api import api_router
+from app.db.database import run_exclusive
 from app.db.init_db import init_db
 from app.middleware.auth import BasicAuthMiddleware
+from app.services.statistics_service import WarehouseStatisticsService
+from app.services.warehouse_ledger import WarehouseLedger
 
 # Initialize logging
 setup_logging()
@@ -120,10 +126,51 @@ async def health_check():
     })
 
 
+def refresh_due_warehouse_statistics() -> None:
+    interval = timedelta(seconds=settings.WAREHOUSE_STATISTICS_REFRESH_SECONDS)
+    run_exclusive(
+        WarehouseStatisticsService.REFRESH_LOCK_KEY,
+        lambda db: WarehouseStatisticsService(db).refresh_if_due(interval),
+    )
+
+
+async def warehouse_statistics_timer(tick: int) -> None:
+    """Keep the warehouse statistics rollup fresh; one worker takes each due refresh"""
+    while True:
+        try:
+            await run_in_threadpool(refresh_due_warehouse_statistics)
+        except Exception:
+            logger.exception("Warehouse statistics refresh failed")
+        await asyncio.sleep(tick)
+
+
+def take_due_balance_snapshot() -> None:
+    interval = timedelta(seconds=settings.WAREHOUSE_SNAPSHOT_INTERVAL_SECONDS)
+    run_exclusive(WarehouseLedger.SNAPSHOT_LOCK_KEY, lambda db: WarehouseLedger(db).take_snapshot_if_due(interval))
+
+
+async def balance_snapshot_timer(tick: int) -> None:
+    """Snapshot ledger balances on schedule; one worker takes each due snapshot"""
+    while True:
+        try:
+            await run_in_threadpool(take_due_balance_snapshot)
+        except Exception:
+            logger.exception("Warehouse balance snapshot failed")
+        await asyncio.sleep(tick)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Application startup event"""
     init_db()
+    if settings.WAREHOUSE_STATISTICS_REFRESH_SECONDS > 0:
+        app.state.warehouse_statistics_timer = asyncio.create_task(
+            warehouse_statistics_timer(min(settings.SCHEDULER_TICK_SECONDS, settings.WAREHOUSE_STATISTICS_REFRESH_SECONDS))
+        )
+    if settings.WAREHOUSE_SNAPSHOT_INTERVAL_SECONDS > 0:
+        app.state.balance_snapshot_timer = asyncio.create_task(
+            balance_snapshot_timer(min(settings.SCHEDULER_TICK_SECONDS, settings.WAREHOUSE_SNAPSHOT_INTERVAL_SECONDS))
+        )
     logger.info("KRAI System backend starting up...")
     logger.info(f"Version: {settings.VERSION}")
     logger.info(f"Database URL: {settings.DATABASE_URL}")
@@ -133,6 +180,10 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event"""
+    for name in ("warehouse_statistics_timer", "balance_snapshot_timer"):
+        timer = getattr(app.state, name, None)
+        if timer:
+            timer.cancel()
     logger.info("KRAI System backend shutting down...")
 
 if __name__ == "__main__":
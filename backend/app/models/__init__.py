@@ -15,7 +15,19 @@ from .model import (
     ModelVariantCuttingPart,
 )
 from .reference import CuttingPart, ReferenceItem
-from .warehouse import WarehouseStock, WarehouseTransaction
+from .warehouse import (
+    WarehouseBalanceSnapshot,
+    WarehouseBatchCounter,
+    WarehouseCostLayer,
+    WarehouseMaterialValuation,
+    WarehouseReservation,
+    WarehouseStatisticsRollup,
+    WarehouseStock,
+    WarehouseStockAlert,
+    WarehouseStocktake,
+    WarehouseStocktakeLine,
+    WarehouseTransaction,
+)
 
 __all__ = [
     "Base",
@@ -32,7 +44,16 @@ __all__ = [
     "ModelVariantCuttingPart",
     "CuttingPart",
     "ReferenceItem",
+    "WarehouseBalanceSnapshot",
+    "WarehouseBatchCounter",
+    "WarehouseCostLayer",
+    "WarehouseMaterialValuation",
+    "WarehouseReservation",
+    "WarehouseStatisticsRollup",
     "WarehouseStock",
+    "WarehouseStockAlert",
+    "WarehouseStocktake",
+    "WarehouseStocktakeLine",
     "WarehouseTransaction",
 ]
 
@@ -6,7 +6,7 @@ import uuid
 from datetime import date, datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Numeric, String, Text, func
+from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Index, Integer, Numeric, String, Text, event, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -16,6 +16,12 @@ from .material import Material
 
 class WarehouseStock(Base):
     __tablename__ = "warehouse_stock"
+    __table_args__ = (
+        # FEFO candidate batches of a material: earliest expiry, then earliest receipt
+        Index("ix_warehouse_stock_fefo", "material_id", "expiry_date", "receipt_date"),
+        # One row per batch and warehouse; also serves scanner lookups by batch number
+        Index("uq_warehouse_stock_batch", "batch_number", "warehouse_code", "material_id", unique=True),
+    )
 
     stock_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=generate_uuid
@@ -42,17 +48,40 @@ class WarehouseStock(Base):
     material: Mapped[Material] = relationship()
 
 
+class WarehouseBatchCounter(Base):
+    """Last batch sequence issued per material and receipt day."""
+
+    __tablename__ = "warehouse_batch_counters"
+
+    material_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE"), primary_key=True
+    )
+    batch_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    last_sequence: Mapped[int] = mapped_column(Integer, default=0)
+
+
 class WarehouseTransaction(Base):
+    """Append-only stock ledger entry.
+
+    ``quantity`` is signed: receipts are positive, issues negative, so the
+    balance of a stock row is the sum of its entries. Stock rows and
+    materials with ledger history cannot be deleted.
+    """
+
     __tablename__ = "warehouse_transactions"
+    __table_args__ = (
+        Index("ix_warehouse_transactions_stock_performed", "stock_id", "performed_at"),
+        Index("ix_warehouse_transactions_performed_at", "performed_at"),
+    )
 
     transaction_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=generate_uuid
     )
     stock_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("warehouse_stock.stock_id", ondelete="CASCADE"), index=True
+        UUID(as_uuid=True), ForeignKey("warehouse_stock.stock_id", ondelete="RESTRICT"), index=True
     )
     material_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE"), index=True
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="RESTRICT"), index=True
     )
     transaction_type: Mapped[str] = mapped_column(String(20))
     quantity: Mapped[float] = mapped_column(Numeric(15, 3))
@@ -65,3 +94,165 @@ class WarehouseTransaction(Base):
     notes: Mapped[Optional[str]] = mapped_column(Text)
     performed_by: Mapped[Optional[str]] = mapped_column(String(80))
     performed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    document_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), index=True)
+
+
+@event.listens_for(WarehouseTransaction, "before_update")
+@event.listens_for(WarehouseTransaction, "before_delete")
+def _reject_ledger_change(mapper, connection, target) -> None:
+    raise ValueError("Warehouse ledger entries are immutable")
+
+
+class WarehouseBalanceSnapshot(Base):
+    """Balance of a stock row at a point in time; the ledger holds the deltas since."""
+
+    __tablename__ = "warehouse_balance_snapshots"
+    __table_args__ = (Index("ix_warehouse_balance_snapshots_stock_at", "stock_id", "snapshot_at"),)
+
+    snapshot_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=generate_uuid
+    )
+    snapshot_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    stock_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("warehouse_stock.stock_id", ondelete="CASCADE")
+    )
+    material_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE"), index=True
+    )
+    warehouse_code: Mapped[str] = mapped_column(String(40))
+    quantity: Mapped[float] = mapped_column(Numeric(15, 3))
+
+
+class WarehouseReservation(Base):
+    """Stock reserved for a production order from a specific batch."""
+
+    __tablename__ = "warehouse_reservations"
+
+    reservation_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=generate_uuid
+    )
+    stock_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("warehouse_stock.stock_id", ondelete="CASCADE"), index=True
+    )
+    material_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE"), index=True
+    )
+    order_reference: Mapped[str] = mapped_column(String(80), index=True)
+    quantity: Mapped[float] = mapped_column(Numeric(15, 3))
+    status: Mapped[str] = mapped_column(String(20), default="ACTIVE")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    released_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+
+class WarehouseCostLayer(Base):
+    """FIFO cost layer: quantity received at one unit cost, consumed oldest first."""
+
+    __tablename__ = "warehouse_cost_layers"
+    __table_args__ = (
+        Index(
+            "ix_warehouse_cost_layers_open",
+            "material_id",
+            "received_at",
+            "layer_id",
+            postgresql_where=text("remaining_quantity > 0"),
+        ),
+    )
+
+    layer_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=generate_uuid
+    )
+    material_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE")
+    )
+    stock_id: Mapped[Optional[uuid.UUID]] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("warehouse_stock.stock_id", ondelete="SET NULL")
+    )
+    document_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True))
+    received_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    quantity: Mapped[float] = mapped_column(Numeric(15, 3))
+    remaining_quantity: Mapped[float] = mapped_column(Numeric(15, 3))
+    unit_cost: Mapped[float] = mapped_column(Numeric(14, 4))
+
+
+class WarehouseMaterialValuation(Base):
+    """Running stock value of a material, maintained on every receipt and issue."""
+
+    __tablename__ = "warehouse_material_valuations"
+
+    material_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE"), primary_key=True
+    )
+    quantity: Mapped[float] = mapped_column(Numeric(15, 3), default=0)
+    average_cost: Mapped[float] = mapped_column(Numeric(14, 4), default=0)
+    fifo_value: Mapped[float] = mapped_column(Numeric(18, 4), default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class WarehouseStocktake(Base):
+    """Inventory count session; counts stream in while stock keeps moving."""
+
+    __tablename__ = "warehouse_stocktakes"
+
+    stocktake_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=generate_uuid
+    )
+    warehouse_code: Mapped[Optional[str]] = mapped_column(String(40))
+    status: Mapped[str] = mapped_column(String(20), default="OPEN", index=True)
+    responsible: Mapped[Optional[str]] = mapped_column(String(80))
+    notes: Mapped[Optional[str]] = mapped_column(Text)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    posted_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    document_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True))
+
+
+class WarehouseStocktakeLine(Base):
+    """Counted quantity of one stock row; a recount replaces the previous value.
+
+    ``counted_at`` is stamped by the database clock, the one the ledger's
+    ``performed_at`` uses; ``scanned_at`` is the device time, kept for reference.
+    """
+
+    __tablename__ = "warehouse_stocktake_lines"
+
+    stocktake_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("warehouse_stocktakes.stocktake_id", ondelete="CASCADE"), primary_key=True
+    )
+    stock_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("warehouse_stock.stock_id", ondelete="CASCADE"), primary_key=True
+    )
+    counted_quantity: Mapped[float] = mapped_column(Numeric(15, 3))
+    counted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    scanned_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+
+class WarehouseStockAlert(Base):
+    """Active low-stock alert of a material; the row is removed once stock recovers."""
+
+    __tablename__ = "warehouse_stock_alerts"
+    __table_args__ = (Index("ix_warehouse_stock_alerts_level_raised", "level", "raised_at"),)
+
+    material_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("materials.material_id", ondelete="CASCADE"), primary_key=True
+    )
+    level: Mapped[str] = mapped_column(String(20))
+    available_quantity: Mapped[float] = mapped_column(Numeric(15, 3))
+    safety_stock: Mapped[Optional[float]] = mapped_column(Numeric(12, 3))
+    reorder_point: Mapped[Optional[float]] = mapped_column(Numeric(12, 3))
+    raised_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class WarehouseStatisticsRollup(Base):
+    """Precomputed warehouse totals per dimension (total, status, warehouse, group)."""
+
+    __tablename__ = "warehouse_statistics_rollups"
+
+    dimension: Mapped[str] = mapped_column(String(20), primary_key=True)
+    key: Mapped[str] = mapped_column(String(80), primary_key=True)
+    items_count: Mapped[int] = mapped_column(Integer, default=0)
+    # Distinct materials do not add up across keys; kept for the total row only
+    materials_count: Mapped[Optional[int]] = mapped_column(Integer)
+    total_value: Mapped[float] = mapped_column(Numeric(18, 2), default=0)
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -33,16 +33,49 @@ from .model import (
 )
 from .reference import ReferenceDraft, ReferenceItem, ReferenceListQuery, ReferenceListResult
 from .warehouse import (
+    WarehouseAvailabilityItem,
+    WarehouseAvailabilityRequest,
+    WarehouseAvailabilityResult,
+    WarehouseBatchLookupItem,
+    WarehouseBatchLookupRequest,
+    WarehouseBatchLookupResult,
     WarehouseInventoryDraft,
     WarehouseInventoryLine,
+    WarehouseIssueAllocation,
     WarehouseIssueDraft,
     WarehouseIssueLine,
+    WarehouseIssueLineResult,
+    WarehouseIssueResult,
     WarehouseListQuery,
     WarehouseListResult,
+    WarehouseMaterialValuation,
     WarehouseReceiptDraft,
     WarehouseReceiptLine,
+    WarehouseReservationAllocation,
+    WarehouseReservationDraft,
+    WarehouseReservationLine,
+    WarehouseReservationLineResult,
+    WarehouseReservationReleaseRequest,
+    WarehouseReservationReleaseResult,
+    WarehouseReservationResult,
+    WarehouseStatistics,
+    WarehouseStatisticsBucket,
     WarehouseStock,
+    WarehouseStockAlert,
+    WarehouseStockAlertList,
     WarehouseStockListItem,
+    WarehouseStocktake,
+    WarehouseStocktakeCount,
+    WarehouseStocktakeCountBatch,
+    WarehouseStocktakeCreate,
+    WarehouseStocktakeDiff,
+    WarehouseStocktakeDiffLine,
+    WarehouseStocktakePostResult,
+    WarehouseTransferDraft,
+    WarehouseTransferLine,
+    WarehouseTransferLineResult,
+    WarehouseTransferResult,
+    WarehouseValuationSummary,
 )
 
 __all__ = [
@@ -80,14 +113,47 @@ __all__ = [
     "ReferenceItem",
     "ReferenceListQuery",
     "ReferenceListResult",
+    "WarehouseAvailabilityItem",
+    "WarehouseAvailabilityRequest",
+    "WarehouseAvailabilityResult",
+    "WarehouseBatchLookupItem",
+    "WarehouseBatchLookupRequest",
+    "WarehouseBatchLookupResult",
     "WarehouseInventoryDraft",
     "WarehouseInventoryLine",
+    "WarehouseIssueAllocation",
     "WarehouseIssueDraft",
     "WarehouseIssueLine",
+    "WarehouseIssueLineResult",
+    "WarehouseIssueResult",
     "WarehouseListQuery",
     "WarehouseListResult",
+    "WarehouseMaterialValuation",
     "WarehouseReceiptDraft",
     "WarehouseReceiptLine",
+    "WarehouseReservationAllocation",
+    "WarehouseReservationDraft",
+    "WarehouseReservationLine",
+    "WarehouseReservationLineResult",
+    "WarehouseReservationReleaseRequest",
+    "WarehouseReservationReleaseResult",
+    "WarehouseReservationResult",
+    "WarehouseStatistics",
+    "WarehouseStatisticsBucket",
     "WarehouseStock",
+    "WarehouseStockAlert",
+    "WarehouseStockAlertList",
     "WarehouseStockListItem",
+    "WarehouseStocktake",
+    "WarehouseStocktakeCount",
+    "WarehouseStocktakeCountBatch",
+    "WarehouseStocktakeCreate",
+    "WarehouseStocktakeDiff",
+    "WarehouseStocktakeDiffLine",
+    "WarehouseStocktakePostResult",
+    "WarehouseTransferDraft",
+    "WarehouseTransferLine",
+    "WarehouseTransferLineResult",
+    "WarehouseTransferResult",
+    "WarehouseValuationSummary",
 ]
@@ -28,15 +28,22 @@ T = TypeVar("T")
 
 class PaginatedResult(BaseModel, Generic[T]):
     items: List[T]
-    total: int
+    total: Optional[int] = None
     page: int
     pageSize: int
+    nextCursor: Optional[str] = None
+    totalIsApproximate: bool = False
 
 
 class ListQuery(BaseModel):
     page: int = 1
     pageSize: int = 10
     search: Optional[str] = None
+    # "offset" (page numbers) or "cursor" (keyset tokens from nextCursor)
+    pagination: str = "offset"
+    cursor: Optional[str] = None
+    # Cursor mode only: "none", "approximate" (planner estimate) or "exact"
+    totalMode: Optional[str] = None
 
 
 class EnumValues:
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 from uuid import UUID
 
@@ -41,6 +41,7 @@ class WarehouseListQuery(ListQuery):
     warehouseCode: Optional[str] = None
     status: Optional[str] = None
     showArchived: bool = False
+    asOf: Optional[datetime] = None
 
 
 class WarehouseListResult(PaginatedResult[WarehouseStockListItem]):
@@ -66,7 +67,11 @@ class WarehouseReceiptDraft(BaseModel):
 
 
 class WarehouseIssueLine(BaseModel):
-    stockId: UUID
+    """One issue line: a specific batch (``stockId``) or a material picked FEFO."""
+
+    stockId: Optional[UUID] = None
+    materialId: Optional[UUID] = None
+    warehouseCode: Optional[str] = None
     quantity: float
     unit: str
     reason: str
@@ -75,9 +80,80 @@ class WarehouseIssueLine(BaseModel):
 
 
 class WarehouseIssueDraft(BaseModel):
+    allowPartial: bool = False
     lines: List[WarehouseIssueLine] = Field(default_factory=list)
 
 
+class WarehouseIssueAllocation(BaseModel):
+    stockId: UUID
+    batchNumber: Optional[str] = None
+    warehouseCode: str
+    quantity: float
+
+
+class WarehouseIssueLineResult(BaseModel):
+    stockId: Optional[UUID] = None
+    materialId: Optional[UUID] = None
+    requestedQuantity: float
+    issuedQuantity: float
+    status: str
+    error: Optional[str] = None
+    allocations: List[WarehouseIssueAllocation] = Field(default_factory=list)
+
+
+class WarehouseIssueResult(BaseModel):
+    documentId: Optional[UUID] = None
+    issuedCount: int
+    failedCount: int
+    lines: List[WarehouseIssueLineResult] = Field(default_factory=list)
+
+
+class WarehouseTransferLine(BaseModel):
+    stockId: UUID
+    quantity: float
+    location: Optional[str] = None
+
+
+class WarehouseTransferDraft(BaseModel):
+    toWarehouseCode: str
+    toLocation: Optional[str] = None
+    referenceNumber: Optional[str] = None
+    comments: Optional[str] = None
+    lines: List[WarehouseTransferLine] = Field(default_factory=list)
+
+
+class WarehouseTransferLineResult(BaseModel):
+    sourceStockId: UUID
+    targetStockId: UUID
+    batchNumber: Optional[str] = None
+    fromWarehouseCode: str
+    toWarehouseCode: str
+    quantity: float
+
+
+class WarehouseTransferResult(BaseModel):
+    documentId: Optional[UUID] = None
+    lines: List[WarehouseTransferLineResult] = Field(default_factory=list)
+
+
+class WarehouseAvailabilityRequest(BaseModel):
+    materialIds: List[UUID] = Field(default_factory=list)
+
+
+class WarehouseAvailabilityItem(BaseModel):
+    materialId: UUID
+    code: str
+    name: str
+    unit: str
+    quantity: float
+    reservedQuantity: float
+    availableQuantity: float
+
+
+class WarehouseAvailabilityResult(BaseModel):
+    items: List[WarehouseAvailabilityItem] = Field(default_factory=list)
+
+
 class WarehouseInventoryLine(BaseModel):
     stockId: UUID
     systemQuantity: float
@@ -91,3 +167,166 @@ class WarehouseInventoryDraft(BaseModel):
     performedAt: Optional[datetime] = None
     responsible: Optional[str] = None
 
+
+
+class WarehouseReservationLine(BaseModel):
+    orderReference: str
+    materialId: UUID
+    quantity: float
+    warehouseCode: Optional[str] = None
+
+
+class WarehouseReservationDraft(BaseModel):
+    strategy: str = "FIFO"
+    allowPartial: bool = True
+    lines: List[WarehouseReservationLine] = Field(default_factory=list)
+
+
+class WarehouseReservationAllocation(BaseModel):
+    reservationId: UUID
+    stockId: UUID
+    batchNumber: Optional[str] = None
+    warehouseCode: str
+    quantity: float
+
+
+class WarehouseReservationLineResult(BaseModel):
+    orderReference: str
+    materialId: UUID
+    requestedQuantity: float
+    reservedQuantity: float
+    shortageQuantity: float
+    allocations: List[WarehouseReservationAllocation] = Field(default_factory=list)
+
+
+class WarehouseReservationResult(BaseModel):
+    strategy: str
+    lines: List[WarehouseReservationLineResult] = Field(default_factory=list)
+
+
+class WarehouseReservationReleaseRequest(BaseModel):
+    orderReferences: List[str] = Field(default_factory=list)
+
+
+class WarehouseReservationReleaseResult(BaseModel):
+    releasedCount: int
+    releasedQuantity: float
+
+
+class WarehouseMaterialValuation(BaseModel):
+    materialId: UUID
+    quantity: float
+    averageCost: float
+    averageValue: float
+    fifoValue: float
+    updatedAt: Optional[datetime] = None
+
+
+class WarehouseValuationSummary(BaseModel):
+    materialsCount: int
+    averageValue: float
+    fifoValue: float
+
+
+class WarehouseStocktakeCreate(BaseModel):
+    warehouseCode: Optional[str] = None
+    responsible: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class WarehouseStocktake(BaseModel):
+    id: UUID
+    warehouseCode: Optional[str] = None
+    status: str
+    responsible: Optional[str] = None
+    notes: Optional[str] = None
+    startedAt: Optional[datetime] = None
+    postedAt: Optional[datetime] = None
+    documentId: Optional[UUID] = None
+
+
+class WarehouseStocktakeCount(BaseModel):
+    stockId: UUID
+    countedQuantity: float
+    # Device clock, stored for reference; the count is stamped by the database
+    countedAt: Optional[datetime] = None
+
+
+class WarehouseStocktakeCountBatch(BaseModel):
+    lines: List[WarehouseStocktakeCount] = Field(default_factory=list)
+
+
+class WarehouseStocktakeDiffLine(BaseModel):
+    stockId: UUID
+    materialId: UUID
+    batchNumber: Optional[str] = None
+    warehouseCode: str
+    unit: str
+    systemQuantity: float
+    countedQuantity: float
+    difference: float
+
+
+class WarehouseStocktakeDiff(BaseModel):
+    stocktakeId: UUID
+    countedCount: int
+    lines: List[WarehouseStocktakeDiffLine] = Field(default_factory=list)
+
+
+class WarehouseStocktakePostResult(BaseModel):
+    stocktakeId: UUID
+    documentId: UUID
+    countedCount: int
+    adjustedCount: int
+
+
+class WarehouseStockAlert(BaseModel):
+    material: MaterialReference
+    level: str
+    availableQuantity: float
+    safetyStock: Optional[float] = None
+    reorderPoint: Optional[float] = None
+    raisedAt: datetime
+    updatedAt: datetime
+
+
+class WarehouseStockAlertList(BaseModel):
+    items: List[WarehouseStockAlert] = Field(default_factory=list)
+
+
+class WarehouseBatchLookupRequest(BaseModel):
+    batchNumbers: List[str] = Field(default_factory=list)
+
+
+class WarehouseBatchLookupItem(BaseModel):
+    batchNumber: str
+    stockId: UUID
+    material: MaterialReference
+    warehouseCode: str
+    location: Optional[str] = None
+    quantity: float
+    reservedQuantity: float
+    availableQuantity: float
+    unit: str
+    expiryDate: Optional[date] = None
+
+
+class WarehouseBatchLookupResult(BaseModel):
+    items: List[WarehouseBatchLookupItem] = Field(default_factory=list)
+    missing: List[str] = Field(default_factory=list)
+
+
+class WarehouseStatisticsBucket(BaseModel):
+    key: str
+    itemsCount: int
+    totalValue: float
+
+
+class WarehouseStatistics(BaseModel):
+    itemsCount: int
+    materialsCount: int
+    totalValue: float
+    byStatus: List[WarehouseStatisticsBucket] = Field(default_factory=list)
+    byWarehouse: List[WarehouseStatisticsBucket] = Field(default_factory=list)
+    byGroup: List[WarehouseStatisticsBucket] = Field(default_factory=list)
+    refreshedAt: Optional[datetime] = None
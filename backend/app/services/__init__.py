@@ -1,14 +1,28 @@
 """Expose service classes for convenient imports."""
 
+from .alert_service import StockAlertService
+from .batch_lookup_service import BatchLookupService
 from .material_service import MaterialService
 from .model_service import ModelService
 from .reference_service import ReferenceService
+from .reservation_service import ReservationService
+from .statistics_service import WarehouseStatisticsService
+from .stocktake_service import StocktakeService
+from .valuation_service import StockValuation
+from .warehouse_ledger import WarehouseLedger
 from .warehouse_service import WarehouseService
 
 __all__ = [
+    "BatchLookupService",
     "MaterialService",
     "ModelService",
     "ReferenceService",
+    "ReservationService",
+    "StockAlertService",
+    "StocktakeService",
+    "StockValuation",
+    "WarehouseLedger",
     "WarehouseService",
+    "WarehouseStatisticsService",
 ]
 
@@ -0,0 +1,204 @@
+"""Low-stock alerts re-evaluated for the materials touched by stock movements."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, case, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import Material, WarehouseStock, WarehouseStockAlert
+from app.schemas.material import MaterialReference
+from app.schemas.warehouse import (
+    WarehouseStockAlert as WarehouseStockAlertSchema,
+    WarehouseStockAlertList,
+)
+
+
+class StockAlertService:
+    """Keep ``warehouse_stock_alerts`` in step with stock levels.
+
+    Movements call :meth:`refresh` with the materials they touched, inside
+    their own transaction. Total available stock of those materials is
+    compared with each material's own ``safety_stock`` (CRITICAL) and
+    ``reorder_point`` (LOW); alerts are upserted or removed accordingly, so
+    the table only ever holds active alerts and reading it is an index scan.
+    Materials without thresholds never raise alerts. The material rows are
+    locked before their totals are read, so movements of different batches of
+    one material re-evaluate its alert one after the other, each seeing the
+    stock the previous one committed.
+
+    The threshold rules here are the single definition of stock levels; the
+    warehouse stock list derives its status from them and the same
+    per-material total as well.
+    """
+
+    CRITICAL = "CRITICAL"
+    LOW = "LOW"
+    LEVELS = {CRITICAL, LOW}
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    @classmethod
+    def level(
+        cls, available: Decimal, safety_stock: Optional[Decimal], reorder_point: Optional[Decimal]
+    ) -> Optional[str]:
+        if safety_stock is not None and available < safety_stock:
+            return cls.CRITICAL
+        if reorder_point is not None and available < reorder_point:
+            return cls.LOW
+        return None
+
+    @classmethod
+    def level_condition(cls, level: Optional[str], available, safety_stock=None, reorder_point=None):
+        """SQL predicate: ``available`` is at ``level`` (``None`` means no alert).
+
+        Mirrors :meth:`level`; the thresholds default to the columns of the
+        joined ``Material``. Written as plain range comparisons rather than a
+        ``CASE`` so that the planner can evaluate it per material.
+        """
+        safety_stock = Material.safety_stock if safety_stock is None else safety_stock
+        reorder_point = Material.reorder_point if reorder_point is None else reorder_point
+        below_safety = and_(safety_stock.is_not(None), available < safety_stock)
+        below_reorder = and_(reorder_point.is_not(None), available < reorder_point)
+        if level == cls.CRITICAL:
+            return below_safety
+        not_critical = or_(safety_stock.is_(None), available >= safety_stock)
+        if level == cls.LOW:
+            return and_(below_reorder, not_critical)
+        return and_(not_critical, or_(reorder_point.is_(None), available >= reorder_point))
+
+    def refresh(self, material_ids: Iterable[UUID]) -> None:
+        """Re-evaluate alerts of the given materials; does not commit."""
+        ordered = sorted(set(material_ids), key=str)
+        if not ordered:
+            return
+
+        # NO KEY UPDATE leaves foreign key checks of stock and ledger inserts unblocked
+        self.db.execute(
+            select(Material.material_id)
+            .where(Material.material_id.in_(ordered))
+            .order_by(Material.material_id)
+            .with_for_update(key_share=True)
+        )
+        available = func.coalesce(
+            func.sum(func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(WarehouseStock.reserved_quantity, 0)),
+            0,
+        )
+        rows = self.db.execute(
+            select(Material.material_id, Material.safety_stock, Material.reorder_point, available.label("available"))
+            .outerjoin(WarehouseStock, WarehouseStock.material_id == Material.material_id)
+            .where(Material.material_id.in_(ordered))
+            .group_by(Material.material_id, Material.safety_stock, Material.reorder_point)
+            .order_by(Material.material_id)
+        ).all()
+
+        now = datetime.now(timezone.utc)
+        raised = []
+        cleared = []
+        for row in rows:
+            level = self.level(
+                Decimal(str(row.available)),
+                None if row.safety_stock is None else Decimal(str(row.safety_stock)),
+                None if row.reorder_point is None else Decimal(str(row.reorder_point)),
+            )
+            if level is None:
+                cleared.append(row.material_id)
+                continue
+            raised.append(
+                {
+                    "material_id": row.material_id,
+                    "level": level,
+                    "available_quantity": row.available,
+                    "safety_stock": row.safety_stock,
+                    "reorder_point": row.reorder_point,
+                    "raised_at": now,
+                    "updated_at": now,
+                }
+            )
+
+        if raised:
+            stmt = pg_insert(WarehouseStockAlert).values(raised)
+            self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[WarehouseStockAlert.material_id],
+                    set_={
+                        "level": stmt.excluded.level,
+                        "available_quantity": stmt.excluded.available_quantity,
+                        "safety_stock": stmt.excluded.safety_stock,
+                        "reorder_point": stmt.excluded.reorder_point,
+                        # An alert keeps its age until it changes level
+                        "raised_at": case(
+                            (WarehouseStockAlert.level == stmt.excluded.level, WarehouseStockAlert.raised_at),
+                            else_=stmt.excluded.raised_at,
+                        ),
+                        "updated_at": stmt.excluded.updated_at,
+                    },
+                )
+            )
+        if cleared:
+            self.db.execute(delete(WarehouseStockAlert).where(WarehouseStockAlert.material_id.in_(cleared)))
+
+    def refresh_all(self, chunk_size: int = 1000) -> int:
+        """Re-evaluate every material with thresholds; used to seed or repair the table."""
+        try:
+            self.db.execute(
+                delete(WarehouseStockAlert).where(
+                    WarehouseStockAlert.material_id.in_(
+                        select(Material.material_id).where(
+                            Material.safety_stock.is_(None), Material.reorder_point.is_(None)
+                        )
+                    )
+                )
+            )
+            material_ids = self.db.scalars(
+                select(Material.material_id).where(
+                    (Material.safety_stock.is_not(None)) | (Material.reorder_point.is_not(None))
+                )
+            ).all()
+            for start in range(0, len(material_ids), chunk_size):
+                self.refresh(material_ids[start : start + chunk_size])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return self.db.scalar(select(func.count()).select_from(WarehouseStockAlert)) or 0
+
+    def list_alerts(self, level: Optional[str] = None) -> WarehouseStockAlertList:
+        """Active alerts, CRITICAL first, oldest first within a level."""
+        if level is not None and level not in self.LEVELS:
+            raise ValueError(f"Unknown alert level: {level}")
+        stmt = (
+            select(WarehouseStockAlert, Material)
+            .join(Material, Material.material_id == WarehouseStockAlert.material_id)
+            .order_by(WarehouseStockAlert.level, WarehouseStockAlert.raised_at)
+        )
+        if level:
+            stmt = stmt.where(WarehouseStockAlert.level == level)
+
+        return WarehouseStockAlertList(
+            items=[
+                WarehouseStockAlertSchema(
+                    material=MaterialReference(
+                        id=material.material_id,
+                        code=material.code,
+                        name=material.name,
+                        group=material.group,
+                        unit=material.unit_primary,
+                        color=material.color,
+                    ),
+                    level=alert.level,
+                    availableQuantity=float(alert.available_quantity),
+                    safetyStock=float(alert.safety_stock) if alert.safety_stock is not None else None,
+                    reorderPoint=float(alert.reorder_point) if alert.reorder_point is not None else None,
+                    raisedAt=alert.raised_at,
+                    updatedAt=alert.updated_at,
+                )
+                for alert, material in self.db.execute(stmt)
+            ]
+        )
@@ -0,0 +1,88 @@
+"""Resolve scanned batch numbers to stock rows for warehouse terminals."""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCache
+from app.models import Material, WarehouseStock
+from app.schemas.material import MaterialReference
+from app.schemas.warehouse import WarehouseBatchLookupItem, WarehouseBatchLookupResult
+
+# Hot batches of this worker process. Movements posted here invalidate their
+# batches; the TTL bounds staleness for changes made by other processes.
+batch_cache = LRUCache(maxsize=20000, ttl=30)
+
+
+def invalidate_batches(batch_numbers: Iterable[str]) -> None:
+    """Drop cached lookups after a movement touched these batches."""
+    batch_cache.invalidate(number for number in batch_numbers if number)
+
+
+class BatchLookupService:
+    """Look up one or many batch numbers; misses are resolved with one query.
+
+    A batch number identifies a batch of one material and may be stored in
+    several warehouses after transfers, so a lookup returns every stock row
+    carrying it. The ``(batch_number, warehouse_code, material_id)`` unique
+    index serves the query.
+    """
+
+    MAX_BATCHES = 1000
+
+    def __init__(self, db: Session, cache: LRUCache = batch_cache) -> None:
+        self.db = db
+        self.cache = cache
+
+    def lookup(self, batch_numbers: List[str]) -> WarehouseBatchLookupResult:
+        requested = list(dict.fromkeys(number.strip() for number in batch_numbers if number and number.strip()))
+        if len(requested) > self.MAX_BATCHES:
+            raise ValueError(f"At most {self.MAX_BATCHES} batch numbers per request")
+
+        found = self.cache.get_many(requested)
+        misses = [number for number in requested if number not in found]
+        if misses:
+            loaded: Dict[str, List[WarehouseBatchLookupItem]] = {}
+            rows = self.db.execute(
+                select(WarehouseStock, Material)
+                .join(Material, Material.material_id == WarehouseStock.material_id)
+                .where(WarehouseStock.batch_number.in_(misses))
+                .order_by(WarehouseStock.batch_number, WarehouseStock.warehouse_code)
+            )
+            for stock, material in rows:
+                loaded.setdefault(stock.batch_number, []).append(self._to_item(stock, material))
+            # Unknown codes are not cached so a batch received a moment later resolves at once
+            self.cache.set_many(loaded)
+            found.update(loaded)
+
+        return WarehouseBatchLookupResult(
+            items=[item for number in requested for item in found.get(number, [])],
+            missing=[number for number in requested if number not in found],
+        )
+
+    @staticmethod
+    def _to_item(stock: WarehouseStock, material: Material) -> WarehouseBatchLookupItem:
+        quantity = float(stock.quantity or 0)
+        reserved = float(stock.reserved_quantity or 0)
+        return WarehouseBatchLookupItem(
+            batchNumber=stock.batch_number,
+            stockId=stock.stock_id,
+            material=MaterialReference(
+                id=material.material_id,
+                code=material.code,
+                name=material.name,
+                group=material.group,
+                unit=material.unit_primary,
+                color=material.color,
+            ),
+            warehouseCode=stock.warehouse_code,
+            location=stock.location,
+            quantity=quantity,
+            reservedQuantity=reserved,
+            availableQuantity=quantity - reserved,
+            unit=stock.unit,
+            expiryDate=stock.expiry_date,
+        )
@@ -9,6 +9,9 @@ from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from app.models import Material
+from app.services.alert_service import StockAlertService
+from app.services.model_cache import invalidate_models, models_using_material
+from app.services.pagination import paginate
 from app.schemas.material import (
     Material as MaterialSchema,
     MaterialCreateRequest,
@@ -51,18 +54,24 @@ class MaterialService:
         if query.priceMax is not None:
             base_stmt = base_stmt.where(Material.price <= query.priceMax)
 
-        count_stmt = select(func.count()).select_from(base_stmt.subquery())
-        total = self.db.scalar(count_stmt) or 0
-
-        stmt = (
-            base_stmt.order_by(Material.updated_at.desc())
-            .offset((query.page - 1) * query.pageSize)
-            .limit(query.pageSize)
+        page = paginate(
+            self.db,
+            base_stmt,
+            query,
+            key_columns=(Material.updated_at, Material.material_id),
+            key_of=lambda row: (row[0].updated_at, row[0].material_id),
+            descending=True,
         )
-        materials = self.db.scalars(stmt).all()
 
-        items: List[MaterialsListItem] = [self._to_list_item(mat) for mat in materials]
-        return MaterialsListResult(items=items, total=total, page=query.page, pageSize=query.pageSize)
+        items: List[MaterialsListItem] = [self._to_list_item(row[0]) for row in page.rows]
+        return MaterialsListResult(
+            items=items,
+            total=page.total,
+            page=query.page,
+            pageSize=query.pageSize,
+            nextCursor=page.nextCursor,
+            totalIsApproximate=page.totalIsApproximate,
+        )
 
     def get_material(self, material_id: UUID) -> MaterialResponse:
         material = self.db.get(Material, material_id)
@@ -83,7 +92,12 @@ class MaterialService:
         if not material:
             raise ValueError("Material not found")
         self._apply_draft(material, payload)
+        # Thresholds may have changed
+        self.db.flush()
+        StockAlertService(self.db).refresh([material_id])
         self.db.commit()
+        # Model cards embed code, name, unit and color of their materials
+        invalidate_models(models_using_material(self.db, material_id))
         self.db.refresh(material)
         return self._to_response(material)
 
@@ -91,8 +105,11 @@ class MaterialService:
         material = self.db.get(Material, material_id)
         if not material:
             return
+        # Collected before the delete cascades or nulls out the references
+        model_ids = models_using_material(self.db, material_id)
         self.db.delete(material)
         self.db.commit()
+        invalidate_models(model_ids)
 
     # ------------------------------------------------------------------
     @staticmethod
@@ -0,0 +1,82 @@
+"""Read-through cache of serialized model cards with per-model versions."""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Iterable, List, Optional, Union
+from uuid import UUID, uuid4
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from app.core.cache import LRUCache, RedisCache, create_cache
+from app.core.config import settings
+from app.models import (
+    ModelCuttingPart,
+    ModelHardwareCompatibleMaterial,
+    ModelHardwareItem,
+    ModelHardwareSet,
+    ModelSoleOption,
+    ModelVariant,
+    ModelVariantCuttingPart,
+)
+from app.schemas.model import ModelResponse
+
+_backend: Optional[Union[LRUCache, RedisCache]] = None
+_backend_lock = threading.Lock()
+
+
+def _cache() -> Union[LRUCache, RedisCache]:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_cache(
+                    "models",
+                    maxsize=settings.MODEL_CACHE_SIZE,
+                    ttl=settings.MODEL_CACHE_TTL_SECONDS,
+                    local_ttl=settings.MODEL_CACHE_LOCAL_TTL_SECONDS,
+                )
+    return _backend
+
+
+def cached_model(model_id: UUID, load: Callable[[], ModelResponse]) -> ModelResponse:
+    """Return the cached card of a model, loading and storing it on a miss.
+
+    Cards are stored under ``<model_id>:<version>``. The version is read
+    before loading, so a card loaded concurrently with a write lands under
+    the superseded version and is never served.
+    """
+    cache = _cache()
+    version = cache.add(f"version:{model_id}", uuid4().hex)
+    key = f"{model_id}:{version}"
+    payload = cache.get(key)
+    if payload is not None:
+        return ModelResponse.model_validate_json(payload)
+    response = load()
+    cache.set(key, response.model_dump_json())
+    return response
+
+
+def invalidate_models(model_ids: Iterable[UUID]) -> None:
+    """Start new versions of these models; call after the change is committed."""
+    _cache().set_many({f"version:{model_id}": uuid4().hex for model_id in set(model_ids)})
+
+
+def models_using_material(db: Session, material_id: UUID) -> List[UUID]:
+    """Models whose card shows the material: cutting parts, soles, hardware or variants."""
+    query = union(
+        select(ModelCuttingPart.model_id).where(ModelCuttingPart.material_id == material_id),
+        select(ModelSoleOption.model_id).where(ModelSoleOption.material_id == material_id),
+        select(ModelHardwareSet.model_id)
+        .join(ModelHardwareItem, ModelHardwareItem.hardware_set_id == ModelHardwareSet.hardware_set_id)
+        .join(
+            ModelHardwareCompatibleMaterial,
+            ModelHardwareCompatibleMaterial.hardware_item_id == ModelHardwareItem.hardware_item_id,
+        )
+        .where(ModelHardwareCompatibleMaterial.material_id == material_id),
+        select(ModelVariant.model_id)
+        .join(ModelVariantCuttingPart, ModelVariantCuttingPart.variant_id == ModelVariant.variant_id)
+        .where(ModelVariantCuttingPart.material_id == material_id),
+    )
+    return list(db.scalars(query))
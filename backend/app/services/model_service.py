@@ -25,6 +25,8 @@ from app.models import (
     ModelVariantCuttingPart,
 )
 from app.schemas.material import MaterialReference
+from app.services.model_cache import cached_model, invalidate_models
+from app.services.pagination import paginate
 from app.schemas.model import (
     CuttingPartUsage,
     HardwareItemOption,
@@ -106,17 +108,15 @@ class ModelService:
             is_active = query.status.upper() == "ACTIVE"
             base_stmt = base_stmt.where(Model.is_active == is_active)
 
-        count_stmt = select(func.count()).select_from(base_stmt.subquery())
-        total = self.db.scalar(count_stmt) or 0
-
-        stmt = (
-            base_stmt.options(selectinload(Model.sole_options))
-            .order_by(Model.updated_at.desc())
-            .offset((query.page - 1) * query.pageSize)
-            .limit(query.pageSize)
+        page = paginate(
+            self.db,
+            base_stmt.options(selectinload(Model.sole_options)),
+            query,
+            key_columns=(Model.updated_at, Model.model_id),
+            key_of=lambda row: (row[0].updated_at, row[0].model_id),
+            descending=True,
         )
-
-        models = self.db.scalars(stmt).all()
+        models = [row[0] for row in page.rows]
 
         items: List[ModelListItem] = []
         for model in models:
@@ -148,10 +148,20 @@ class ModelService:
                 )
             )
 
-        return ModelsListResult(items=items, total=total, page=query.page, pageSize=query.pageSize)
+        return ModelsListResult(
+            items=items,
+            total=page.total,
+            page=query.page,
+            pageSize=query.pageSize,
+            nextCursor=page.nextCursor,
+            totalIsApproximate=page.totalIsApproximate,
+        )
 
     # ------------------------------------------------------------------
     def get_model(self, model_id: UUID) -> ModelResponse:
+        return cached_model(model_id, lambda: self._load_model(model_id))
+
+    def _load_model(self, model_id: UUID) -> ModelResponse:
         stmt = (
             select(Model)
             .options(
@@ -385,6 +395,7 @@ class ModelService:
             self.db.flush()
 
         # Transaction committed here if no errors
+        invalidate_models([model_id])
         self.db.refresh(model)
         logger.info("update_model: committed and refreshed")
         return self.get_model(model_id)
@@ -396,6 +407,7 @@ class ModelService:
             return
         self.db.delete(model)
         self.db.commit()
+        invalidate_models([model_id])
 
     # ------------------------------------------------------------------
     def upsert_variant(self, model_id: UUID, payload: ModelVariantSchema) -> ModelResponse:
@@ -434,6 +446,7 @@ class ModelService:
                     variant.is_default = False
 
         self.db.commit()
+        invalidate_models([model_id])
         self.db.refresh(model)
         return self._serialize_model(model)
 
@@ -447,6 +460,7 @@ class ModelService:
             raise ValueError("Variant not found")
         self.db.delete(entity)
         self.db.commit()
+        invalidate_models([model_id])
         self.db.refresh(model)
         return self._serialize_model(model)
 
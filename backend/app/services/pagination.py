@@ -0,0 +1,113 @@
+"""Offset and keyset (cursor) pagination shared by list endpoints."""
+
+from __future__ import annotations
+
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.schemas.common import ListQuery
+
+TOTAL_MODES = {"none", "approximate", "exact"}
+
+
+class Page(NamedTuple):
+    rows: List[Any]
+    total: Optional[int]
+    nextCursor: Optional[str]
+    totalIsApproximate: bool
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque token for the sort key of the last row on a page."""
+    payload = json.dumps(
+        [value.isoformat() if isinstance(value, (date, datetime)) else str(value) for value in values]
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, key_columns: Sequence[Any]) -> List[Any]:
+    """Parse a cursor back into values typed like ``key_columns``."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if len(raw) != len(key_columns):
+            raise ValueError
+        values = []
+        for value, column in zip(raw, key_columns):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            elif python_type is uuid.UUID:
+                values.append(uuid.UUID(value))
+            else:
+                values.append(python_type(value))
+        return values
+    except (ValueError, TypeError, json.JSONDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def count_total(db: Session, stmt: Select, mode: str) -> Tuple[Optional[int], bool]:
+    """Total row count for ``stmt``: skipped, estimated by the planner, or exact."""
+    if mode not in TOTAL_MODES:
+        raise ValueError(f"Unknown total mode: {mode}")
+    if mode == "none":
+        return None, False
+
+    if mode == "approximate" and db.bind.dialect.name == "postgresql":
+        # Expanding IN parameters are rendered as one placeholder per value
+        compiled = stmt.compile(dialect=db.bind.dialect, compile_kwargs={"render_postcompile": True})
+        plan = db.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+
+    return db.scalar(select(func.count()).select_from(stmt.subquery())) or 0, False
+
+
+def paginate(
+    db: Session,
+    stmt: Select,
+    query: ListQuery,
+    key_columns: Sequence[Any],
+    key_of: Callable[[Any], Sequence[Any]],
+    descending: bool = False,
+) -> Page:
+    """Fetch one page of ``stmt`` ordered by ``key_columns``.
+
+    Offset mode (the default) keeps ``page`` semantics and an exact total.
+    Cursor mode is enabled by ``pagination="cursor"`` or a ``cursor`` token:
+    rows after the cursor are selected with a row-value comparison on the
+    sort key, so deep pages cost the same as the first one. ``key_of`` maps
+    a result row to its sort key values; the last column must be unique.
+    """
+    order_by = [column.desc() if descending else column.asc() for column in key_columns]
+
+    if query.cursor is None and query.pagination != "cursor":
+        total, _ = count_total(db, stmt, "exact")
+        rows = db.execute(
+            stmt.order_by(*order_by).offset((query.page - 1) * query.pageSize).limit(query.pageSize)
+        ).all()
+        return Page(rows=rows, total=total, nextCursor=None, totalIsApproximate=False)
+
+    total, approximate = count_total(db, stmt, query.totalMode or "none")
+    page_stmt = stmt
+    if query.cursor:
+        key = tuple_(*key_columns)
+        after = tuple_(*decode_cursor(query.cursor, key_columns))
+        page_stmt = page_stmt.where(key < after if descending else key > after)
+
+    # One extra row tells whether another page exists
+    rows = db.execute(page_stmt.order_by(*order_by).limit(query.pageSize + 1)).all()
+    next_cursor = None
+    if len(rows) > query.pageSize:
+        rows = rows[: query.pageSize]
+        next_cursor = encode_cursor(key_of(rows[-1]))
+    return Page(rows=rows, total=total, nextCursor=next_cursor, totalIsApproximate=approximate)
@@ -9,6 +9,7 @@ from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
 from app.models import ReferenceItem as ReferenceItemModel
+from app.services.pagination import paginate
 from app.schemas.reference import (
     ReferenceDraft,
     ReferenceItem,
@@ -31,20 +32,20 @@ class ReferenceService:
             pattern = f"%{query.search.lower()}%"
             stmt = stmt.where(func.lower(ReferenceItemModel.name).like(pattern))
 
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = self.db.scalar(count_stmt) or 0
-
-        stmt = (
-            stmt.order_by(ReferenceItemModel.name.asc())
-            .offset((query.page - 1) * query.pageSize)
-            .limit(query.pageSize)
+        page = paginate(
+            self.db,
+            stmt,
+            query,
+            key_columns=(ReferenceItemModel.name, ReferenceItemModel.reference_id),
+            key_of=lambda row: (row[0].name, row[0].reference_id),
         )
-        items = self.db.scalars(stmt).all()
         return ReferenceListResult(
-            items=[self._to_schema(item) for item in items],
-            total=total,
+            items=[self._to_schema(row[0]) for row in page.rows],
+            total=page.total,
             page=query.page,
             pageSize=query.pageSize,
+            nextCursor=page.nextCursor,
+            totalIsApproximate=page.totalIsApproximate,
         )
 
     def get_reference(self, reference_id: UUID) -> ReferenceItem:
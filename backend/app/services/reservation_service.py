@@ -0,0 +1,245 @@
+"""Batch reservation of warehouse stock for production orders."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List
+from uuid import UUID
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import WarehouseReservation, WarehouseStock
+from app.models.base import generate_uuid
+from app.services.alert_service import StockAlertService
+from app.services.batch_lookup_service import invalidate_batches
+from app.schemas.warehouse import (
+    WarehouseReservationAllocation,
+    WarehouseReservationDraft,
+    WarehouseReservationLineResult,
+    WarehouseReservationReleaseResult,
+    WarehouseReservationResult,
+)
+
+
+class ReservationService:
+    """Allocate stock batches to orders and keep ``reserved_quantity`` in sync.
+
+    A whole wave of order lines is allocated in one transaction: candidate
+    batches for every requested material are read with a single
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` (rows held by a concurrent wave are
+    skipped instead of waited on), allocated in memory, and written back with
+    one bulk UPDATE plus one bulk INSERT.
+    """
+
+    STRATEGIES = {"FIFO", "FEFO"}
+    ACTIVE = "ACTIVE"
+    RELEASED = "RELEASED"
+    # Issued to the order by ``WarehouseService.issue``
+    CONSUMED = "CONSUMED"
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def reserve(self, draft: WarehouseReservationDraft) -> WarehouseReservationResult:
+        strategy = draft.strategy.upper()
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown allocation strategy: {draft.strategy}")
+        if not draft.lines:
+            return WarehouseReservationResult(strategy=strategy, lines=[])
+        for line in draft.lines:
+            if line.quantity <= 0:
+                raise ValueError(
+                    f"Reservation quantity must be positive for order {line.orderReference}, got {line.quantity}"
+                )
+
+        try:
+            batches = self._lock_batches({line.materialId for line in draft.lines}, strategy)
+            free: Dict[UUID, Decimal] = {
+                stock.stock_id: Decimal(str(stock.quantity or 0)) - Decimal(str(stock.reserved_quantity or 0))
+                for material_batches in batches.values()
+                for stock in material_batches
+            }
+
+            reservations: List[WarehouseReservation] = []
+            results: List[WarehouseReservationLineResult] = []
+            for line in draft.lines:
+                requested = Decimal(str(line.quantity))
+                remaining = requested
+                allocations: List[WarehouseReservationAllocation] = []
+
+                for stock in batches.get(line.materialId, []):
+                    if remaining <= 0:
+                        break
+                    if line.warehouseCode and stock.warehouse_code != line.warehouseCode:
+                        continue
+                    take = min(free[stock.stock_id], remaining)
+                    if take <= 0:
+                        continue
+
+                    free[stock.stock_id] -= take
+                    remaining -= take
+                    reservation = WarehouseReservation(
+                        reservation_id=generate_uuid(),
+                        stock_id=stock.stock_id,
+                        material_id=line.materialId,
+                        order_reference=line.orderReference,
+                        quantity=take,
+                        status=self.ACTIVE,
+                    )
+                    reservations.append(reservation)
+                    allocations.append(
+                        WarehouseReservationAllocation(
+                            reservationId=reservation.reservation_id,
+                            stockId=stock.stock_id,
+                            batchNumber=stock.batch_number,
+                            warehouseCode=stock.warehouse_code,
+                            quantity=float(take),
+                        )
+                    )
+
+                if remaining > 0 and not draft.allowPartial:
+                    raise ValueError(
+                        f"Insufficient stock for order {line.orderReference}: "
+                        f"material {line.materialId} short by {remaining}"
+                    )
+
+                results.append(
+                    WarehouseReservationLineResult(
+                        orderReference=line.orderReference,
+                        materialId=line.materialId,
+                        requestedQuantity=float(requested),
+                        reservedQuantity=float(requested - remaining),
+                        shortageQuantity=float(remaining),
+                        allocations=allocations,
+                    )
+                )
+
+            reserved_by_stock: Dict[UUID, Decimal] = defaultdict(Decimal)
+            for reservation in reservations:
+                reserved_by_stock[reservation.stock_id] += reservation.quantity
+
+            if reservations:
+                stocks = {
+                    stock.stock_id: stock
+                    for material_batches in batches.values()
+                    for stock in material_batches
+                }
+                self.db.execute(
+                    update(WarehouseStock),
+                    [
+                        {
+                            "stock_id": stock_id,
+                            "reserved_quantity": Decimal(str(stocks[stock_id].reserved_quantity or 0)) + qty,
+                        }
+                        for stock_id, qty in reserved_by_stock.items()
+                    ],
+                )
+                self.db.add_all(reservations)
+                StockAlertService(self.db).refresh(reserved.material_id for reserved in reservations)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        invalidate_batches(
+            allocation.batchNumber for result in results for allocation in result.allocations
+        )
+        return WarehouseReservationResult(strategy=strategy, lines=results)
+
+    def release(self, order_references: List[str]) -> WarehouseReservationReleaseResult:
+        """Release all active reservations of cancelled orders in one transaction.
+
+        Stock rows are locked before the reservations, the same order
+        ``WarehouseService.issue`` uses when it consumes reservations.
+        """
+        if not order_references:
+            return WarehouseReservationReleaseResult(releasedCount=0, releasedQuantity=0)
+
+        active = (
+            WarehouseReservation.order_reference.in_(order_references),
+            WarehouseReservation.status == self.ACTIVE,
+        )
+        try:
+            stocks = self.db.execute(
+                select(WarehouseStock.stock_id, WarehouseStock.reserved_quantity, WarehouseStock.batch_number)
+                .where(WarehouseStock.stock_id.in_(select(WarehouseReservation.stock_id).where(*active)))
+                .order_by(WarehouseStock.stock_id)
+                .with_for_update()
+            ).all()
+            reservations = self.db.execute(
+                select(
+                    WarehouseReservation.reservation_id,
+                    WarehouseReservation.stock_id,
+                    WarehouseReservation.material_id,
+                    WarehouseReservation.quantity,
+                )
+                .where(*active)
+                .with_for_update()
+            ).all()
+            if not reservations:
+                self.db.rollback()
+                return WarehouseReservationReleaseResult(releasedCount=0, releasedQuantity=0)
+
+            released_by_stock: Dict[UUID, Decimal] = defaultdict(Decimal)
+            for row in reservations:
+                released_by_stock[row.stock_id] += Decimal(str(row.quantity))
+
+            reserved = {row.stock_id: row.reserved_quantity for row in stocks}
+            self.db.execute(
+                update(WarehouseStock),
+                [
+                    {
+                        "stock_id": stock_id,
+                        "reserved_quantity": max(Decimal(str(reserved[stock_id] or 0)) - qty, Decimal(0)),
+                    }
+                    for stock_id, qty in released_by_stock.items()
+                    if stock_id in reserved
+                ],
+            )
+            self.db.execute(
+                update(WarehouseReservation)
+                .where(WarehouseReservation.reservation_id.in_([row.reservation_id for row in reservations]))
+                .values(status=self.RELEASED, released_at=datetime.utcnow())
+            )
+            StockAlertService(self.db).refresh(row.material_id for row in reservations)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        invalidate_batches(row.batch_number for row in stocks)
+        return WarehouseReservationReleaseResult(
+            releasedCount=len(reservations),
+            releasedQuantity=float(sum(released_by_stock.values())),
+        )
+
+    # ------------------------------------------------------------------
+    def _lock_batches(self, material_ids: set, strategy: str) -> Dict[UUID, List[WarehouseStock]]:
+        """Lock unexpired batches with free stock, ordered for allocation."""
+        available = func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(WarehouseStock.reserved_quantity, 0)
+        if strategy == "FEFO":
+            ordering = (
+                WarehouseStock.expiry_date.asc().nulls_last(),
+                WarehouseStock.receipt_date.asc().nulls_last(),
+            )
+        else:
+            ordering = (WarehouseStock.receipt_date.asc().nulls_last(),)
+
+        stmt = (
+            select(WarehouseStock)
+            .where(
+                WarehouseStock.material_id.in_(material_ids),
+                available > 0,
+                or_(WarehouseStock.expiry_date.is_(None), WarehouseStock.expiry_date >= date.today()),
+            )
+            .order_by(WarehouseStock.material_id, *ordering, WarehouseStock.stock_id)
+            .with_for_update(skip_locked=True)
+        )
+
+        batches: Dict[UUID, List[WarehouseStock]] = defaultdict(list)
+        for stock in self.db.scalars(stmt):
+            batches[stock.material_id].append(stock)
+        return batches
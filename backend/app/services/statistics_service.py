@@ -0,0 +1,152 @@
+"""Warehouse dashboard statistics served from a periodically refreshed rollup."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import Material, WarehouseMaterialValuation, WarehouseStatisticsRollup, WarehouseStock
+from app.schemas.warehouse import WarehouseStatistics, WarehouseStatisticsBucket
+from app.services.valuation_service import StockValuation
+from app.services.warehouse_service import WarehouseService
+
+
+class WarehouseStatisticsService:
+    """Aggregate stock in SQL into ``warehouse_statistics_rollups`` and read it back.
+
+    :meth:`refresh` scans stock once, grouped by status, warehouse and
+    material group, and upserts the per-dimension totals; it is meant to run
+    on a timer. :meth:`get_statistics` only reads the rollup, so the cost and
+    size of the dashboard payload do not grow with the number of stock rows.
+
+    Stock is valued from ``warehouse_material_valuations``: the total is the
+    FIFO value of all materials, and a stock row is worth its quantity at
+    its material's FIFO unit cost.
+    """
+
+    TOTAL = "total"
+    STATUS = "status"
+    WAREHOUSE = "warehouse"
+    GROUP = "group"
+
+    # Advisory lock of the scheduled refresh, one worker takes it
+    REFRESH_LOCK_KEY = 7_301_024
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def get_statistics(self) -> WarehouseStatistics:
+        rows = self.db.scalars(select(WarehouseStatisticsRollup)).all()
+        if not rows:
+            # First request after deployment: build the rollup once
+            self.refresh()
+            rows = self.db.scalars(select(WarehouseStatisticsRollup)).all()
+
+        buckets: Dict[str, list] = defaultdict(list)
+        total = None
+        for row in rows:
+            if row.dimension == self.TOTAL:
+                total = row
+                continue
+            buckets[row.dimension].append(
+                WarehouseStatisticsBucket(key=row.key, itemsCount=row.items_count, totalValue=float(row.total_value))
+            )
+        for items in buckets.values():
+            items.sort(key=lambda bucket: (-bucket.totalValue, bucket.key))
+
+        return WarehouseStatistics(
+            itemsCount=total.items_count if total else 0,
+            materialsCount=(total.materials_count or 0) if total else 0,
+            totalValue=float(total.total_value) if total else 0,
+            byStatus=buckets[self.STATUS],
+            byWarehouse=buckets[self.WAREHOUSE],
+            byGroup=buckets[self.GROUP],
+            refreshedAt=total.refreshed_at if total else None,
+        )
+
+    def refresh(self) -> int:
+        """Recompute the rollup from current stock; returns the number of rollup rows."""
+        totals = WarehouseService.material_available()
+        status = WarehouseService.status_expression(totals.c.available).label("status")
+        value = func.sum(func.coalesce(WarehouseStock.quantity, 0) * func.coalesce(StockValuation.unit_cost(), 0))
+        # Status by material totals, then one pass over stock; the status x warehouse x group grid stays small
+        grid = self.db.execute(
+            select(
+                status,
+                WarehouseStock.warehouse_code,
+                Material.group,
+                func.count().label("items_count"),
+                value.label("total_value"),
+            )
+            .join(Material, Material.material_id == WarehouseStock.material_id)
+            .join(totals, totals.c.material_id == WarehouseStock.material_id)
+            .outerjoin(
+                WarehouseMaterialValuation, WarehouseMaterialValuation.material_id == WarehouseStock.material_id
+            )
+            .group_by(status, WarehouseStock.warehouse_code, Material.group)
+        ).all()
+        materials_count = self.db.scalar(select(func.count(func.distinct(WarehouseStock.material_id)))) or 0
+        total_value = self.db.scalar(select(func.coalesce(func.sum(WarehouseMaterialValuation.fifo_value), 0)))
+
+        totals: Dict[Tuple[str, str], list] = defaultdict(lambda: [0, Decimal(0)])
+        totals[(self.TOTAL, self.TOTAL)] = [0, Decimal(0)]
+        for row in grid:
+            row_value = Decimal(str(row.total_value or 0))
+            for key in (
+                (self.TOTAL, self.TOTAL),
+                (self.STATUS, row.status),
+                (self.WAREHOUSE, row.warehouse_code or ""),
+                (self.GROUP, row.group or ""),
+            ):
+                totals[key][0] += row.items_count
+                totals[key][1] += row_value
+        totals[(self.TOTAL, self.TOTAL)][1] = Decimal(str(total_value))
+
+        refreshed_at = datetime.now(timezone.utc)
+        values = [
+            {
+                "dimension": dimension,
+                "key": key,
+                "items_count": items_count,
+                "materials_count": materials_count if dimension == self.TOTAL else None,
+                "total_value": total_value,
+                "refreshed_at": refreshed_at,
+            }
+            for (dimension, key), (items_count, total_value) in sorted(totals.items())
+        ]
+        try:
+            # Upsert, then drop keys that vanished; concurrent refreshes cannot collide
+            stmt = pg_insert(WarehouseStatisticsRollup).values(values)
+            self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[WarehouseStatisticsRollup.dimension, WarehouseStatisticsRollup.key],
+                    set_={
+                        "items_count": stmt.excluded.items_count,
+                        "materials_count": stmt.excluded.materials_count,
+                        "total_value": stmt.excluded.total_value,
+                        "refreshed_at": stmt.excluded.refreshed_at,
+                    },
+                )
+            )
+            self.db.execute(
+                delete(WarehouseStatisticsRollup).where(WarehouseStatisticsRollup.refreshed_at < refreshed_at)
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(values)
+
+    def refresh_if_due(self, interval: timedelta) -> Optional[int]:
+        """Refresh unless the rollup is younger than ``interval``; used by the scheduler."""
+        latest = self.db.scalar(select(func.max(WarehouseStatisticsRollup.refreshed_at)))
+        if latest is not None and datetime.now(timezone.utc) - latest < interval:
+            self.db.rollback()
+            return None
+        return self.refresh()
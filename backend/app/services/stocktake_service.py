@@ -0,0 +1,311 @@
+"""Stocktake sessions: streamed counts reconciled against ledger balances."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Row, Select, case, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import (
+    WarehouseStock,
+    WarehouseStocktake,
+    WarehouseStocktakeLine,
+    WarehouseTransaction,
+)
+from app.models.base import generate_uuid
+from app.schemas.warehouse import (
+    WarehouseStocktake as WarehouseStocktakeSchema,
+    WarehouseStocktakeCountBatch,
+    WarehouseStocktakeCreate,
+    WarehouseStocktakeDiff,
+    WarehouseStocktakeDiffLine,
+    WarehouseStocktakePostResult,
+)
+from app.services.alert_service import StockAlertService
+from app.services.batch_lookup_service import batch_cache
+from app.services.valuation_service import StockValuation
+from app.services.warehouse_ledger import WarehouseLedger
+
+
+class StocktakeService:
+    """Count stock without freezing it.
+
+    Counts are upserted per stock row, stamped with the database clock when
+    they arrive; the device time is stored beside it but never used as the
+    cutoff, because ledger entries are stamped by the same database clock.
+    On reconciliation the system quantity of a row *at that moment* is
+    its current quantity minus the ledger deltas recorded after the count, so
+    receipts and issues may continue while the warehouse is being counted.
+    The diff is one SQL query; posting writes the ADJUSTMENT ledger entries
+    with ``INSERT ... SELECT`` and applies them to stock with one UPDATE.
+    """
+
+    OPEN = "OPEN"
+    POSTED = "POSTED"
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def create(self, payload: WarehouseStocktakeCreate) -> WarehouseStocktakeSchema:
+        stocktake = WarehouseStocktake(
+            stocktake_id=generate_uuid(),
+            warehouse_code=payload.warehouseCode,
+            status=self.OPEN,
+            responsible=payload.responsible,
+            notes=payload.notes,
+            started_at=datetime.now(timezone.utc),
+        )
+        self.db.add(stocktake)
+        self.db.commit()
+        return self._to_schema(stocktake)
+
+    def get(self, stocktake_id: UUID) -> Optional[WarehouseStocktakeSchema]:
+        stocktake = self.db.get(WarehouseStocktake, stocktake_id)
+        return self._to_schema(stocktake) if stocktake else None
+
+    def add_counts(self, stocktake_id: UUID, batch: WarehouseStocktakeCountBatch) -> int:
+        """Store a batch of counted quantities; returns the number of stock rows counted.
+
+        A stock row counted again (in this or a later batch) keeps the latest count.
+        """
+        stocktake = self._open_stocktake(stocktake_id)
+        if not batch.lines:
+            return 0
+
+        latest: Dict[UUID, dict] = {}
+        for line in batch.lines:
+            if line.countedQuantity < 0:
+                raise ValueError(f"Counted quantity of {line.stockId} must not be negative")
+            latest[line.stockId] = {
+                "stocktake_id": stocktake_id,
+                "stock_id": line.stockId,
+                "counted_quantity": Decimal(str(line.countedQuantity)),
+                "scanned_at": line.countedAt,
+            }
+
+        try:
+            known = select(WarehouseStock.stock_id).where(WarehouseStock.stock_id.in_(latest))
+            if stocktake.warehouse_code:
+                known = known.where(WarehouseStock.warehouse_code == stocktake.warehouse_code)
+            missing = latest.keys() - set(self.db.scalars(known))
+            if missing:
+                raise ValueError(f"Stock item {next(iter(missing))} is not part of this stocktake")
+
+            # executemany of one cached statement; the driver batches it into multi-row INSERTs
+            stmt = pg_insert(WarehouseStocktakeLine).values(counted_at=func.statement_timestamp())
+            self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[WarehouseStocktakeLine.stocktake_id, WarehouseStocktakeLine.stock_id],
+                    set_={
+                        "counted_quantity": stmt.excluded.counted_quantity,
+                        "counted_at": stmt.excluded.counted_at,
+                        "scanned_at": stmt.excluded.scanned_at,
+                    },
+                ),
+                list(latest.values()),
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return len(latest)
+
+    def diff(self, stocktake_id: UUID) -> WarehouseStocktakeDiff:
+        """Counted rows whose quantity differs from the system at count time."""
+        if self.db.get(WarehouseStocktake, stocktake_id) is None:
+            raise ValueError("Stocktake not found")
+        diff = self._diff_query(stocktake_id).subquery()
+        lines = [
+            WarehouseStocktakeDiffLine(
+                stockId=row.stock_id,
+                materialId=row.material_id,
+                batchNumber=row.batch_number,
+                warehouseCode=row.warehouse_code,
+                unit=row.unit,
+                systemQuantity=float(row.system_quantity),
+                countedQuantity=float(row.counted_quantity),
+                difference=float(row.difference),
+            )
+            for row in self.db.execute(
+                select(diff).where(diff.c.difference != 0).order_by(diff.c.warehouse_code, diff.c.stock_id)
+            )
+        ]
+        return WarehouseStocktakeDiff(
+            stocktakeId=stocktake_id,
+            countedCount=self._counted(stocktake_id),
+            lines=lines,
+        )
+
+    def post(self, stocktake_id: UUID) -> WarehouseStocktakePostResult:
+        """Book the differences as ADJUSTMENT ledger entries and close the session."""
+        try:
+            stocktake = self._open_stocktake(stocktake_id, lock=True)
+            # Hold counted rows for the few statements below, in the shared stock_id order
+            self.db.execute(
+                select(WarehouseStock.stock_id)
+                .join(WarehouseStocktakeLine, WarehouseStocktakeLine.stock_id == WarehouseStock.stock_id)
+                .where(WarehouseStocktakeLine.stocktake_id == stocktake_id)
+                .order_by(WarehouseStock.stock_id)
+                .with_for_update(of=WarehouseStock)
+            )
+
+            document_id = generate_uuid()
+            diff = self._diff_query(stocktake_id).subquery()
+            adjusted = self.db.execute(
+                insert(WarehouseTransaction).from_select(
+                    [
+                        "transaction_id",
+                        "stock_id",
+                        "material_id",
+                        "transaction_type",
+                        "quantity",
+                        "unit",
+                        "warehouse_from",
+                        "warehouse_to",
+                        "reference_type",
+                        "reason",
+                        "performed_by",
+                        "performed_at",
+                        "document_id",
+                    ],
+                    select(
+                        func.gen_random_uuid(),
+                        diff.c.stock_id,
+                        diff.c.material_id,
+                        literal(WarehouseLedger.ADJUSTMENT),
+                        diff.c.difference,
+                        diff.c.unit,
+                        case((diff.c.difference < 0, diff.c.warehouse_code)),
+                        case((diff.c.difference > 0, diff.c.warehouse_code)),
+                        literal("STOCKTAKE"),
+                        literal("STOCKTAKE"),
+                        literal(stocktake.responsible, WarehouseTransaction.performed_by.type),
+                        func.statement_timestamp(),
+                        literal(document_id, WarehouseTransaction.document_id.type),
+                    ).where(diff.c.difference != 0),
+                )
+            ).rowcount
+
+            if adjusted:
+                entries = (
+                    select(WarehouseTransaction.stock_id, WarehouseTransaction.quantity)
+                    .where(WarehouseTransaction.document_id == document_id)
+                    .subquery()
+                )
+                self.db.execute(
+                    update(WarehouseStock)
+                    .where(WarehouseStock.stock_id == entries.c.stock_id)
+                    .values(
+                        quantity=func.coalesce(WarehouseStock.quantity, 0) + entries.c.quantity,
+                        updated_at=func.now(),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                entries = self.db.execute(
+                    select(
+                        WarehouseTransaction.stock_id,
+                        WarehouseTransaction.material_id,
+                        WarehouseTransaction.quantity,
+                    ).where(WarehouseTransaction.document_id == document_id)
+                ).all()
+                self._revalue(entries, document_id)
+                StockAlertService(self.db).refresh(entry.material_id for entry in entries)
+
+            stocktake.status = self.POSTED
+            stocktake.posted_at = func.now()
+            stocktake.document_id = document_id
+            counted = self._counted(stocktake_id)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        if adjusted:
+            # A stocktake touches too many batches to track individually
+            batch_cache.clear()
+        return WarehouseStocktakePostResult(
+            stocktakeId=stocktake_id,
+            documentId=document_id,
+            countedCount=counted,
+            adjustedCount=adjusted,
+        )
+
+    # ------------------------------------------------------------------
+    def _diff_query(self, stocktake_id: UUID) -> Select:
+        """Per counted row: system quantity at count time, counted quantity, difference."""
+        line = WarehouseStocktakeLine
+        later = (
+            select(
+                WarehouseTransaction.stock_id,
+                func.sum(WarehouseTransaction.quantity).label("quantity"),
+            )
+            .join(
+                line,
+                (line.stock_id == WarehouseTransaction.stock_id)
+                & (WarehouseTransaction.performed_at > line.counted_at),
+            )
+            .where(line.stocktake_id == stocktake_id)
+            .group_by(WarehouseTransaction.stock_id)
+            .subquery()
+        )
+        system_quantity = func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(later.c.quantity, 0)
+        return (
+            select(
+                WarehouseStock.stock_id,
+                WarehouseStock.material_id,
+                WarehouseStock.batch_number,
+                WarehouseStock.warehouse_code,
+                WarehouseStock.unit,
+                system_quantity.label("system_quantity"),
+                line.counted_quantity,
+                (line.counted_quantity - system_quantity).label("difference"),
+            )
+            .join(line, line.stock_id == WarehouseStock.stock_id)
+            .outerjoin(later, later.c.stock_id == WarehouseStock.stock_id)
+            .where(line.stocktake_id == stocktake_id)
+        )
+
+    def _revalue(self, entries: List[Row], document_id: UUID) -> None:
+        """Surplus enters valuation at average cost, shortage consumes FIFO layers."""
+        valuation = StockValuation(self.db)
+        valuation.record_receipts(
+            ((entry, Decimal(str(entry.quantity)), None) for entry in entries if entry.quantity > 0),
+            document_id=document_id,
+        )
+        valuation.record_issues(
+            (entry.material_id, -Decimal(str(entry.quantity))) for entry in entries if entry.quantity < 0
+        )
+
+    def _open_stocktake(self, stocktake_id: UUID, lock: bool = False) -> WarehouseStocktake:
+        stmt = select(WarehouseStocktake).where(WarehouseStocktake.stocktake_id == stocktake_id)
+        if lock:
+            stmt = stmt.with_for_update()
+        stocktake = self.db.scalar(stmt)
+        if stocktake is None:
+            raise ValueError("Stocktake not found")
+        if stocktake.status != self.OPEN:
+            raise ValueError(f"Stocktake is {stocktake.status.lower()}")
+        return stocktake
+
+    def _counted(self, stocktake_id: UUID) -> int:
+        return self.db.scalar(
+            select(func.count()).where(WarehouseStocktakeLine.stocktake_id == stocktake_id)
+        ) or 0
+
+    @staticmethod
+    def _to_schema(stocktake: WarehouseStocktake) -> WarehouseStocktakeSchema:
+        return WarehouseStocktakeSchema(
+            id=stocktake.stocktake_id,
+            warehouseCode=stocktake.warehouse_code,
+            status=stocktake.status,
+            responsible=stocktake.responsible,
+            notes=stocktake.notes,
+            startedAt=stocktake.started_at,
+            postedAt=stocktake.posted_at,
+            documentId=stocktake.document_id,
+        )
@@ -0,0 +1,246 @@
+"""Incremental stock valuation: FIFO cost layers and moving average cost."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import DateTime, cast, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import WarehouseCostLayer, WarehouseMaterialValuation, WarehouseStock
+from app.models.base import generate_uuid
+from app.schemas.warehouse import (
+    WarehouseMaterialValuation as WarehouseMaterialValuationSchema,
+    WarehouseValuationSummary,
+)
+
+ZERO = Decimal(0)
+
+
+class StockValuation:
+    """Keep stock value up to date as goods move instead of recomputing it.
+
+    Every receipt opens a FIFO layer at its unit cost and folds the cost into
+    the material's moving average; every issue consumes the oldest open
+    layers. The running quantity, average cost and FIFO value live in one row
+    per material, so reading a material's value is a primary-key lookup and
+    the warehouse total aggregates one row per material rather than stock
+    rows or ledger history.
+
+    Methods that change state run inside the caller's transaction; call them
+    after the stock rows are locked so lock order stays stock -> valuation.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    @staticmethod
+    def unit_cost():
+        """SQL FIFO unit cost of the joined ``WarehouseMaterialValuation``; NULL without stock."""
+        return WarehouseMaterialValuation.fifo_value / func.nullif(WarehouseMaterialValuation.quantity, 0)
+
+    def record_receipts(
+        self,
+        receipts: Iterable[Tuple[WarehouseStock, Decimal, Optional[Decimal]]],
+        document_id: Optional[UUID] = None,
+        received_at: Optional[datetime] = None,
+    ) -> None:
+        """Open a cost layer per ``(stock, quantity, unit_cost)`` and update averages.
+
+        Lines without a unit cost are valued at the material's current average.
+        """
+        by_material: Dict[UUID, List[Tuple[WarehouseStock, Decimal, Optional[Decimal]]]] = defaultdict(list)
+        for stock, quantity, unit_cost in receipts:
+            if quantity > 0:
+                by_material[stock.material_id].append((stock, quantity, unit_cost))
+        if not by_material:
+            return
+
+        received_at = received_at or datetime.now(timezone.utc)
+        valuations = self._lock_valuations(by_material)
+        layers = []
+        changes = []
+        for material_id, lines in by_material.items():
+            valuation = valuations[material_id]
+            quantity = Decimal(str(valuation.quantity or 0))
+            average = Decimal(str(valuation.average_cost or 0))
+            fifo_value = Decimal(str(valuation.fifo_value or 0))
+            for stock, received, unit_cost in lines:
+                cost = average if unit_cost is None else Decimal(str(unit_cost))
+                total = quantity + received
+                average = (quantity * average + received * cost) / total if quantity > 0 else cost
+                quantity = total
+                fifo_value += received * cost
+                layers.append(
+                    {
+                        "layer_id": generate_uuid(),
+                        "material_id": material_id,
+                        "stock_id": stock.stock_id,
+                        "document_id": document_id,
+                        "received_at": received_at,
+                        "quantity": received,
+                        "remaining_quantity": received,
+                        "unit_cost": cost,
+                    }
+                )
+            changes.append(
+                {"material_id": material_id, "quantity": quantity, "average_cost": average, "fifo_value": fifo_value}
+            )
+
+        self.db.execute(insert(WarehouseCostLayer), layers)
+        self.db.execute(update(WarehouseMaterialValuation), changes)
+
+    def record_issues(self, issues: Iterable[Tuple[UUID, Decimal]]) -> Dict[UUID, Decimal]:
+        """Consume FIFO layers for ``(material_id, quantity)`` pairs.
+
+        Returns the FIFO cost of the issued quantity per material. Stock that
+        no layer covers is costed at the average.
+        """
+        issued: Dict[UUID, Decimal] = defaultdict(Decimal)
+        for material_id, quantity in issues:
+            if quantity > 0:
+                issued[material_id] += quantity
+        if not issued:
+            return {}
+
+        valuations = self._lock_valuations(issued)
+        open_layers: Dict[UUID, List[WarehouseCostLayer]] = defaultdict(list)
+        for layer in self.db.scalars(
+            select(WarehouseCostLayer)
+            .where(
+                WarehouseCostLayer.material_id.in_(issued),
+                WarehouseCostLayer.remaining_quantity > 0,
+            )
+            .order_by(WarehouseCostLayer.material_id, WarehouseCostLayer.received_at, WarehouseCostLayer.layer_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        ):
+            open_layers[layer.material_id].append(layer)
+
+        consumed = []
+        changes = []
+        costs: Dict[UUID, Decimal] = {}
+        for material_id, quantity in issued.items():
+            valuation = valuations[material_id]
+            average = Decimal(str(valuation.average_cost or 0))
+            remaining = quantity
+            cost = ZERO
+            for layer in open_layers.get(material_id, []):
+                if remaining <= 0:
+                    break
+                left = Decimal(str(layer.remaining_quantity))
+                take = min(left, remaining)
+                remaining -= take
+                cost += take * Decimal(str(layer.unit_cost))
+                consumed.append({"layer_id": layer.layer_id, "remaining_quantity": left - take})
+            cost += remaining * average
+
+            balance = Decimal(str(valuation.quantity or 0)) - quantity
+            fifo_value = Decimal(str(valuation.fifo_value or 0)) - cost
+            if balance <= 0:
+                # Nothing left to value; drop rounding residue
+                balance, fifo_value = max(balance, ZERO), ZERO
+            changes.append({"material_id": material_id, "quantity": balance, "fifo_value": fifo_value})
+            costs[material_id] = cost
+
+        if consumed:
+            self.db.execute(update(WarehouseCostLayer), consumed)
+        self.db.execute(update(WarehouseMaterialValuation), changes)
+        return costs
+
+    def material_valuation(self, material_id: UUID) -> Optional[WarehouseMaterialValuationSchema]:
+        valuation = self.db.get(WarehouseMaterialValuation, material_id)
+        if valuation is None:
+            return None
+        quantity = float(valuation.quantity or 0)
+        average = float(valuation.average_cost or 0)
+        return WarehouseMaterialValuationSchema(
+            materialId=valuation.material_id,
+            quantity=quantity,
+            averageCost=average,
+            averageValue=quantity * average,
+            fifoValue=float(valuation.fifo_value or 0),
+            updatedAt=valuation.updated_at,
+        )
+
+    def summary(self) -> WarehouseValuationSummary:
+        count, average_value, fifo_value = self.db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(WarehouseMaterialValuation.quantity * WarehouseMaterialValuation.average_cost), 0),
+                func.coalesce(func.sum(WarehouseMaterialValuation.fifo_value), 0),
+            ).where(WarehouseMaterialValuation.quantity > 0)
+        ).one()
+        return WarehouseValuationSummary(
+            materialsCount=count,
+            averageValue=float(average_value),
+            fifoValue=float(fifo_value),
+        )
+
+    def rebuild(self) -> int:
+        """Reseed layers and valuations from current stock, one layer per batch.
+
+        Each batch is valued at its ``purchase_price``, discarding FIFO
+        history. Not exposed over HTTP: stock that predates valuation is seeded
+        once by database/migrations/013, this is a maintenance tool to recover
+        from drift. Returns the number of valued materials.
+        """
+        try:
+            self.db.execute(delete(WarehouseCostLayer))
+            self.db.execute(delete(WarehouseMaterialValuation))
+            self.db.execute(
+                insert(WarehouseCostLayer).from_select(
+                    ["layer_id", "material_id", "stock_id", "received_at", "quantity", "remaining_quantity", "unit_cost"],
+                    select(
+                        func.gen_random_uuid(),
+                        WarehouseStock.material_id,
+                        WarehouseStock.stock_id,
+                        func.coalesce(
+                            cast(WarehouseStock.receipt_date, DateTime(timezone=True)), WarehouseStock.updated_at
+                        ),
+                        WarehouseStock.quantity,
+                        WarehouseStock.quantity,
+                        func.coalesce(WarehouseStock.purchase_price, 0),
+                    ).where(WarehouseStock.quantity > 0),
+                )
+            )
+            quantity = func.sum(WarehouseCostLayer.remaining_quantity)
+            value = func.sum(WarehouseCostLayer.remaining_quantity * WarehouseCostLayer.unit_cost)
+            count = self.db.execute(
+                insert(WarehouseMaterialValuation).from_select(
+                    ["material_id", "quantity", "average_cost", "fifo_value"],
+                    select(WarehouseCostLayer.material_id, quantity, value / quantity, value).group_by(
+                        WarehouseCostLayer.material_id
+                    ),
+                )
+            ).rowcount
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return count
+
+    # ------------------------------------------------------------------
+    def _lock_valuations(self, material_ids: Iterable[UUID]) -> Dict[UUID, WarehouseMaterialValuation]:
+        """Create missing valuation rows and lock all of them in ``material_id`` order."""
+        ordered = sorted(material_ids, key=str)
+        self.db.execute(
+            pg_insert(WarehouseMaterialValuation)
+            .values([{"material_id": material_id, "quantity": 0, "average_cost": 0, "fifo_value": 0} for material_id in ordered])
+            .on_conflict_do_nothing(index_elements=[WarehouseMaterialValuation.material_id])
+        )
+        return {
+            valuation.material_id: valuation
+            for valuation in self.db.scalars(
+                select(WarehouseMaterialValuation)
+                .where(WarehouseMaterialValuation.material_id.in_(ordered))
+                .order_by(WarehouseMaterialValuation.material_id)
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+        }
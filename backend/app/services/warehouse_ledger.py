@@ -0,0 +1,153 @@
+"""Append-only warehouse ledger and periodic balance snapshots."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import Subquery, func, insert, select, text, union_all
+from sqlalchemy.orm import Session
+
+from app.models import WarehouseBalanceSnapshot, WarehouseStock, WarehouseTransaction
+from app.models.base import generate_uuid
+
+
+class WarehouseLedger:
+    """Write ledger entries in bulk and snapshot balances.
+
+    Entries are never updated or deleted. A balance at any moment is the
+    latest snapshot before it plus the ledger deltas recorded after that
+    snapshot, so history queries never need to scan the whole ledger.
+
+    Entry and snapshot times both come from the database clock. Writers lock
+    their stock rows before appending entries, so an entry stamped before a
+    snapshot was committed before it and is part of the snapshot, and one
+    stamped after it is a delta on top of it.
+    """
+
+    RECEIPT = "RECEIPT"
+    ISSUE = "ISSUE"
+    TRANSFER = "TRANSFER"
+    ADJUSTMENT = "ADJUSTMENT"
+    # Balance of a stock row that predates the ledger (database/migrations/012)
+    OPENING = "OPENING"
+
+    # Advisory lock of the scheduled snapshot, one worker takes it
+    SNAPSHOT_LOCK_KEY = 7_301_012
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    @staticmethod
+    def entry(
+        stock: WarehouseStock,
+        transaction_type: str,
+        quantity: Decimal,
+        *,
+        document_id: Optional[UUID] = None,
+        warehouse_from: Optional[str] = None,
+        warehouse_to: Optional[str] = None,
+        reference_number: Optional[str] = None,
+        reference_type: Optional[str] = None,
+        reason: Optional[str] = None,
+        notes: Optional[str] = None,
+        performed_by: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Build a ledger row for ``stock``; ``quantity`` is the signed change."""
+        return {
+            "transaction_id": generate_uuid(),
+            "stock_id": stock.stock_id,
+            "material_id": stock.material_id,
+            "transaction_type": transaction_type,
+            "quantity": quantity,
+            "unit": stock.unit,
+            "warehouse_from": warehouse_from,
+            "warehouse_to": warehouse_to,
+            "reference_number": reference_number,
+            "reference_type": reference_type,
+            "reason": reason,
+            "notes": notes,
+            "performed_by": performed_by,
+            "document_id": document_id,
+        }
+
+    def record(self, entries: List[Dict[str, Any]]) -> None:
+        """Append the entries of one document with a single multi-row INSERT.
+
+        Runs inside the caller's transaction so stock and ledger commit together,
+        after the caller has locked or written the stock rows. ``performed_at``
+        is the database time of the INSERT.
+        """
+        if entries:
+            self.db.execute(
+                insert(WarehouseTransaction).values(performed_at=func.statement_timestamp()), entries
+            )
+
+    def take_snapshot(self) -> int:
+        """Copy current balances of all stock rows into a snapshot set-based.
+
+        The ``EXCLUSIVE`` table lock waits for in-flight movements to commit and
+        holds new ones back (plain reads go on) while the copy runs; the
+        snapshot is stamped with the database time of the copying statement.
+        Returns the number of rows.
+        """
+        self.db.execute(text("LOCK TABLE warehouse_stock IN EXCLUSIVE MODE"))
+        stmt = insert(WarehouseBalanceSnapshot).from_select(
+            ["snapshot_id", "snapshot_at", "stock_id", "material_id", "warehouse_code", "quantity"],
+            select(
+                func.gen_random_uuid(),
+                func.statement_timestamp(),
+                WarehouseStock.stock_id,
+                WarehouseStock.material_id,
+                WarehouseStock.warehouse_code,
+                func.coalesce(WarehouseStock.quantity, 0),
+            ),
+        )
+        count = self.db.execute(stmt).rowcount
+        self.db.commit()
+        return count
+
+    def take_snapshot_if_due(self, interval: timedelta) -> Optional[int]:
+        """Take a snapshot unless one was taken within ``interval``; used by the scheduler."""
+        latest = self.db.scalar(select(func.max(WarehouseBalanceSnapshot.snapshot_at)))
+        if latest is not None and self.db.scalar(select(func.now() - latest)) < interval:
+            self.db.rollback()
+            return None
+        return self.take_snapshot()
+
+    def balances_as_of(self, at: datetime) -> Subquery:
+        """Balances per stock row at ``at`` as a ``(stock_id, quantity)`` subquery.
+
+        Starts from the latest snapshot taken at or before ``at`` and adds the
+        ledger deltas recorded between that snapshot and ``at``. Without an
+        earlier snapshot the ledger is summed from its beginning.
+        """
+        snapshot_at = self.db.scalar(
+            select(func.max(WarehouseBalanceSnapshot.snapshot_at)).where(
+                WarehouseBalanceSnapshot.snapshot_at <= at
+            )
+        )
+
+        deltas = select(
+            WarehouseTransaction.stock_id,
+            WarehouseTransaction.quantity.label("quantity"),
+        ).where(WarehouseTransaction.performed_at <= at)
+        if snapshot_at is None:
+            movements = deltas
+        else:
+            movements = union_all(
+                select(
+                    WarehouseBalanceSnapshot.stock_id,
+                    WarehouseBalanceSnapshot.quantity.label("quantity"),
+                ).where(WarehouseBalanceSnapshot.snapshot_at == snapshot_at),
+                deltas.where(WarehouseTransaction.performed_at > snapshot_at),
+            )
+        movements = movements.subquery()
+
+        return (
+            select(movements.c.stock_id, func.sum(movements.c.quantity).label("quantity"))
+            .group_by(movements.c.stock_id)
+            .subquery("balances_as_of")
+        )
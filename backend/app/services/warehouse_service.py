@@ -2,64 +2,248 @@
 
 from __future__ import annotations
 
-from typing import List
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
 from uuid import UUID
 
 from datetime import datetime, date
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session, selectinload
+from decimal import Decimal
+from sqlalchemy import Subquery, and_, case, func, literal, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, contains_eager
 
-from app.models import Material, WarehouseStock
+from app.models import (
+    Material,
+    WarehouseBatchCounter,
+    WarehouseMaterialValuation,
+    WarehouseReservation,
+    WarehouseStock,
+)
+from app.models.base import generate_uuid
 from app.schemas.material import MaterialReference
 from app.schemas.warehouse import (
+    WarehouseAvailabilityItem,
+    WarehouseAvailabilityResult,
+    WarehouseIssueAllocation,
     WarehouseIssueDraft,
+    WarehouseIssueLineResult,
+    WarehouseIssueResult,
     WarehouseListQuery,
     WarehouseListResult,
     WarehouseReceiptDraft,
     WarehouseStock as WarehouseStockSchema,
     WarehouseStockListItem,
+    WarehouseTransferDraft,
+    WarehouseTransferLineResult,
+    WarehouseTransferResult,
 )
+from app.services.alert_service import StockAlertService
+from app.services.batch_lookup_service import invalidate_batches
+from app.services.pagination import paginate
+from app.services.reservation_service import ReservationService
+from app.services.valuation_service import StockValuation
+from app.services.warehouse_ledger import WarehouseLedger
+
+logger = logging.getLogger(__name__)
 
 
 class WarehouseService:
     def __init__(self, db: Session) -> None:
         self.db = db
 
+    # Stock status of a material without an alert level
+    OK = "OK"
+    # Fixed thresholds of materials that have neither safety stock nor reorder point
+    DEFAULT_CRITICAL_BELOW = 100
+    DEFAULT_LOW_BELOW = 500
+
+    # Per-line outcome of an issue draft
+    ISSUED = "ISSUED"
+    FAILED = "FAILED"
+
+    @classmethod
+    def _thresholds(cls):
+        """Safety stock and reorder point of the joined ``Material``, with the fixed defaults."""
+        unset = and_(Material.safety_stock.is_(None), Material.reorder_point.is_(None))
+        return (
+            case((unset, cls.DEFAULT_CRITICAL_BELOW), else_=Material.safety_stock),
+            case((unset, cls.DEFAULT_LOW_BELOW), else_=Material.reorder_point),
+        )
+
+    @classmethod
+    def status_expression(cls, available):
+        """SQL ``CASE`` for CRITICAL/LOW/OK of a material.
+
+        ``available`` is the material's total over all batches (see
+        :meth:`material_available`), the same quantity alerts compare, so all
+        batches of a material share its status. Requires ``Material`` to be
+        joined into the statement. Filter with :meth:`status_condition`.
+        """
+        safety_stock, reorder_point = cls._thresholds()
+        return case(
+            (
+                StockAlertService.level_condition(StockAlertService.CRITICAL, available, safety_stock, reorder_point),
+                StockAlertService.CRITICAL,
+            ),
+            (
+                StockAlertService.level_condition(StockAlertService.LOW, available, safety_stock, reorder_point),
+                StockAlertService.LOW,
+            ),
+            else_=cls.OK,
+        )
+
+    @classmethod
+    def status_condition(cls, status: str, available):
+        """SQL predicate for materials whose :meth:`status_expression` equals ``status``."""
+        status = status.upper()
+        safety_stock, reorder_point = cls._thresholds()
+        if status in StockAlertService.LEVELS:
+            return StockAlertService.level_condition(status, available, safety_stock, reorder_point)
+        if status == cls.OK:
+            return StockAlertService.level_condition(None, available, safety_stock, reorder_point)
+        raise ValueError(f"Unknown stock status: {status}")
+
+    @staticmethod
+    def material_available(balances: Optional[Subquery] = None) -> Subquery:
+        """Available quantity per material over all its batches, as ``(material_id, available)``.
+
+        Without ``balances`` it is current quantity minus reservations; with a
+        :meth:`WarehouseLedger.balances_as_of` subquery it is the historical balance.
+        """
+        if balances is None:
+            # Same expression as ix_warehouse_stock_material_available
+            available = func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(WarehouseStock.reserved_quantity, 0)
+            stmt = select(WarehouseStock.material_id, func.sum(available).label("available"))
+        else:
+            stmt = select(WarehouseStock.material_id, func.sum(balances.c.quantity).label("available")).join(
+                balances, balances.c.stock_id == WarehouseStock.stock_id
+            )
+        return stmt.group_by(WarehouseStock.material_id).subquery("material_available")
+
     def list_stock(self, query: WarehouseListQuery) -> WarehouseListResult:
-        stmt = select(WarehouseStock).options(selectinload(WarehouseStock.material))
+        balances = None
+        if query.asOf:
+            # Historical view: ledger balance at asOf, reservations are not historised
+            balances = WarehouseLedger(self.db).balances_as_of(query.asOf)
+            quantity = balances.c.quantity
+            reserved = literal(0)
+        else:
+            quantity = func.coalesce(WarehouseStock.quantity, 0)
+            reserved = func.coalesce(WarehouseStock.reserved_quantity, 0)
+        totals = self.material_available(balances)
+        status = self.status_expression(totals.c.available)
+
+        stmt = (
+            select(
+                WarehouseStock,
+                quantity.label("quantity"),
+                reserved.label("reserved"),
+                status.label("status"),
+                StockValuation.unit_cost().label("unit_cost"),
+            )
+            .join(WarehouseStock.material)
+            .join(totals, totals.c.material_id == WarehouseStock.material_id)
+            .outerjoin(
+                WarehouseMaterialValuation, WarehouseMaterialValuation.material_id == WarehouseStock.material_id
+            )
+            .options(contains_eager(WarehouseStock.material))
+        )
+        if balances is not None:
+            stmt = stmt.join(balances, balances.c.stock_id == WarehouseStock.stock_id)
         if query.search:
             pattern = f"%{query.search.lower()}%"
-            stmt = stmt.join(WarehouseStock.material).where(
+            stmt = stmt.where(
                 func.lower(Material.name).like(pattern) | func.lower(Material.code).like(pattern)
             )
         if query.warehouseCode:
             stmt = stmt.where(WarehouseStock.warehouse_code == query.warehouseCode)
-        count_stmt = select(func.count()).select_from(stmt.subquery())
-        total = self.db.scalar(count_stmt) or 0
-
-        stmt = (
-            stmt.order_by(WarehouseStock.updated_at.desc())
-            .offset((query.page - 1) * query.pageSize)
-            .limit(query.pageSize)
-        )
-        stocks = self.db.scalars(stmt).all()
-
-        items: List[WarehouseStockListItem] = [self._to_list_item(stock) for stock in stocks]
         if query.status:
-            target = query.status.upper()
-            items = [item for item in items if item.status == target]
-            total = len(items)
+            stmt = stmt.where(self.status_condition(query.status, totals.c.available))
+        page = paginate(
+            self.db,
+            stmt,
+            query,
+            key_columns=(WarehouseStock.updated_at, WarehouseStock.stock_id),
+            key_of=lambda row: (row[0].updated_at, row[0].stock_id),
+            descending=True,
+        )
+        items: List[WarehouseStockListItem] = [
+            self._to_list_item(
+                stock, quantity=row_quantity, reserved=row_reserved, status=row_status, unit_cost=row_unit_cost
+            )
+            for stock, row_quantity, row_reserved, row_status, row_unit_cost in page.rows
+        ]
 
-        return WarehouseListResult(items=items, total=total, page=query.page, pageSize=query.pageSize)
+        return WarehouseListResult(
+            items=items,
+            total=page.total,
+            page=query.page,
+            pageSize=query.pageSize,
+            nextCursor=page.nextCursor,
+            totalIsApproximate=page.totalIsApproximate,
+        )
 
     def get_stock(self, stock_id: UUID) -> WarehouseStockSchema:
         stock = self.db.get(WarehouseStock, stock_id)
         if not stock:
             raise ValueError("Stock item not found")
-        return self._to_schema(stock)
+        unit_cost = self.db.scalar(
+            select(StockValuation.unit_cost()).where(WarehouseMaterialValuation.material_id == stock.material_id)
+        )
+        return self._to_schema(stock, unit_cost=unit_cost)
+
+    def check_availability(self, material_ids: Iterable[UUID]) -> WarehouseAvailabilityResult:
+        """Aggregate on-hand and reserved stock for many materials in one query."""
+        material_ids = set(material_ids)
+        if not material_ids:
+            return WarehouseAvailabilityResult(items=[])
+
+        quantity = func.coalesce(func.sum(WarehouseStock.quantity), 0)
+        reserved = func.coalesce(func.sum(WarehouseStock.reserved_quantity), 0)
+        stmt = (
+            select(
+                Material.material_id,
+                Material.code,
+                Material.name,
+                Material.unit_primary,
+                quantity.label("quantity"),
+                reserved.label("reserved"),
+            )
+            .outerjoin(WarehouseStock, WarehouseStock.material_id == Material.material_id)
+            .where(Material.material_id.in_(material_ids))
+            .group_by(Material.material_id)
+        )
+
+        items = [
+            WarehouseAvailabilityItem(
+                materialId=row.material_id,
+                code=row.code,
+                name=row.name,
+                unit=row.unit_primary,
+                quantity=float(row.quantity),
+                reservedQuantity=float(row.reserved),
+                availableQuantity=float(row.quantity) - float(row.reserved),
+            )
+            for row in self.db.execute(stmt)
+        ]
+        return WarehouseAvailabilityResult(items=items)
 
     # ------------------------------------------------------------------
-    def _to_schema(self, stock: WarehouseStock) -> WarehouseStockSchema:
+    def _to_schema(
+        self,
+        stock: WarehouseStock,
+        quantity: Optional[float] = None,
+        reserved: Optional[float] = None,
+        status: Optional[str] = None,
+        unit_cost: Optional[Decimal] = None,
+    ) -> WarehouseStockSchema:
+        """Stock row as returned by the API.
+
+        ``totalValue`` is the quantity on hand at the material's FIFO unit cost
+        from :class:`StockValuation`, so rows add up to the valuation totals;
+        it is ``None`` for a material without valued stock.
+        """
         material_ref = MaterialReference(
             id=stock.material.material_id,
             code=stock.material.code,
@@ -68,15 +252,12 @@ class WarehouseService:
             unit=stock.material.unit_primary,
             color=stock.material.color,
         )
-        quantity = float(stock.quantity or 0)
-        reserved = float(stock.reserved_quantity or 0)
+        quantity = float(stock.quantity or 0) if quantity is None else float(quantity)
+        reserved = float(stock.reserved_quantity or 0) if reserved is None else float(reserved)
         available = quantity - reserved
-        total_value = (float(stock.purchase_price) if stock.purchase_price else 0) * available
-        status = "OK"
-        if available < 100:
-            status = "CRITICAL"
-        elif available < 500:
-            status = "LOW"
+        total_value = quantity * float(unit_cost) if unit_cost is not None else None
+        if status is None:
+            status = self._status(stock.material)
 
         return WarehouseStockSchema(
             id=stock.stock_id,
@@ -99,6 +280,20 @@ class WarehouseService:
             updatedAt=stock.updated_at,
         )
 
+    def _status(self, material: Material) -> str:
+        """Python mirror of :meth:`status_expression` for a single material."""
+        totals = self.material_available()
+        available = self.db.scalar(
+            select(totals.c.available).where(totals.c.material_id == material.material_id)
+        )
+        if material.safety_stock is None and material.reorder_point is None:
+            safety_stock, reorder_point = Decimal(self.DEFAULT_CRITICAL_BELOW), Decimal(self.DEFAULT_LOW_BELOW)
+        else:
+            safety_stock = None if material.safety_stock is None else Decimal(str(material.safety_stock))
+            reorder_point = None if material.reorder_point is None else Decimal(str(material.reorder_point))
+        level = StockAlertService.level(Decimal(str(available or 0)), safety_stock, reorder_point)
+        return level or self.OK
+
     def _process_receipt_date(self, receipt_date_input):
         """Convert receipt date to date object."""
         if receipt_date_input is None:
@@ -111,129 +306,665 @@ class WarehouseService:
             # Fallback для любых других типов
             return datetime.utcnow().date()
 
-    def _generate_batch_number(self, material_id: str, receipt_date) -> str:
-        """Generate human-readable batch number for material receipt."""
-        from datetime import datetime
-        
-        # Get material code from database
-        from app.models import Material
-        material = self.db.query(Material).filter(Material.material_id == material_id).first()
-        material_code = material.code if material else "MAT"
-        
-        # Format date
-        if isinstance(receipt_date, str):
-            date_obj = datetime.fromisoformat(receipt_date.replace('Z', '+00:00'))
-        elif hasattr(receipt_date, 'date'):
-            date_obj = receipt_date
-        else:
-            date_obj = datetime.now()
-            
-        today_str = date_obj.strftime('%Y%m%d')
-        
-        # Count DISTINCT batch numbers for this material today (not records!)
-        from sqlalchemy import func, and_
-        from app.models import WarehouseStock
-        
-        existing_batches = self.db.query(func.count(func.distinct(WarehouseStock.batch_number))).filter(
-            and_(
-                WarehouseStock.material_id == material_id,
-                WarehouseStock.batch_number.like(f"{material_code}-{today_str}-%"),
-                WarehouseStock.batch_number.isnot(None)
-            )
-        ).scalar() or 0
-        
-        seq_number = str(existing_batches + 1).zfill(3)  # 001, 002, 003...
-        
-        # Format: МАТЕРИАЛ-YYYYMMDD-NNN
-        return f"{material_code}-{today_str}-{seq_number}"
-
-    def receipt(self, draft: WarehouseReceiptDraft) -> None:
-        """Process material receipt."""
-        import logging
-        from decimal import Decimal
-        logger = logging.getLogger(__name__)
-        logger.info(f"Starting receipt processing: {draft}")
+    def _allocate_batch_numbers(
+        self, keys: List[Tuple[UUID, date]], material_codes: Dict[UUID, str]
+    ) -> List[str]:
+        """Issue ``CODE-YYYYMMDD-NNN`` batch numbers for (material, receipt day) keys.
+
+        All counters are advanced by one ``INSERT ... ON CONFLICT DO UPDATE ...
+        RETURNING``; the upsert row-locks each counter, so concurrent receipts
+        of the same material never get the same sequence. Rows are sorted to
+        take the locks in a deterministic order.
+
+        Counters are first raised to the highest sequence already present in
+        stock for their day, so numbers continue after batches numbered before
+        the counter existed or entered by hand.
+        """
+        if not keys:
+            return []
+
+        counts = Counter(keys)
+        ordered = sorted(counts, key=lambda key: (str(key[0]), key[1]))
+        self._seed_batch_counters(ordered, material_codes)
+        stmt = pg_insert(WarehouseBatchCounter).values(
+            [
+                {"material_id": material_id, "batch_date": batch_date, "last_sequence": counts[(material_id, batch_date)]}
+                for material_id, batch_date in ordered
+            ]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[WarehouseBatchCounter.material_id, WarehouseBatchCounter.batch_date],
+            set_={"last_sequence": WarehouseBatchCounter.last_sequence + stmt.excluded.last_sequence},
+        ).returning(
+            WarehouseBatchCounter.material_id,
+            WarehouseBatchCounter.batch_date,
+            WarehouseBatchCounter.last_sequence,
+        )
+        next_sequence = {
+            (row.material_id, row.batch_date): row.last_sequence - counts[(row.material_id, row.batch_date)] + 1
+            for row in self.db.execute(stmt)
+        }
+
+        batch_numbers = []
+        for material_id, batch_date in keys:
+            sequence = next_sequence[(material_id, batch_date)]
+            next_sequence[(material_id, batch_date)] = sequence + 1
+            # Format: МАТЕРИАЛ-YYYYMMDD-NNN
+            batch_numbers.append(f"{self._batch_prefix(material_codes[material_id], batch_date)}{sequence:03d}")
+        return batch_numbers
+
+    @staticmethod
+    def _batch_prefix(material_code: str, batch_date: date) -> str:
+        return f"{material_code}-{batch_date:%Y%m%d}-"
+
+    def _seed_batch_counters(self, keys: List[Tuple[UUID, date]], material_codes: Dict[UUID, str]) -> None:
+        """Raise counters of ``keys`` to the highest sequence of existing batches."""
+        prefixes = {key: self._batch_prefix(material_codes[key[0]], key[1]) for key in keys}
+        rows = self.db.execute(
+            select(WarehouseStock.material_id, WarehouseStock.batch_number).where(
+                or_(
+                    *(
+                        and_(
+                            WarehouseStock.material_id == material_id,
+                            WarehouseStock.batch_number.startswith(prefix, autoescape=True),
+                        )
+                        for (material_id, _), prefix in prefixes.items()
+                    )
+                )
+            )
+        )
+        seeds: Dict[Tuple[UUID, date], int] = {}
+        for material_id, batch_number in rows:
+            for key, prefix in prefixes.items():
+                suffix = batch_number[len(prefix):]
+                if key[0] == material_id and batch_number.startswith(prefix) and suffix.isdigit():
+                    seeds[key] = max(seeds.get(key, 0), int(suffix))
+        if not seeds:
+            return
+
+        stmt = pg_insert(WarehouseBatchCounter).values(
+            [
+                {"material_id": material_id, "batch_date": batch_date, "last_sequence": seeds[(material_id, batch_date)]}
+                for material_id, batch_date in keys
+                if (material_id, batch_date) in seeds
+            ]
+        )
+        self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[WarehouseBatchCounter.material_id, WarehouseBatchCounter.batch_date],
+                set_={"last_sequence": func.greatest(WarehouseBatchCounter.last_sequence, stmt.excluded.last_sequence)},
+            )
+        )
+
+    def receipt(self, draft: WarehouseReceiptDraft) -> List[str]:
+        """Post a delivery note in bulk and return the batch number of every line.
+
+        Materials are resolved with one query, batch numbers come from one
+        counter upsert, lines with an explicit batch are matched to existing
+        stock with one locking query, and new stock and ledger rows are
+        inserted as batched statements.
+        """
+        if not draft.lines:
+            return []
+        for line in draft.lines:
+            if line.quantity <= 0:
+                raise ValueError(f"Receipt quantity must be positive, got {line.quantity}")
+
+        ledger = WarehouseLedger(self.db)
+        document_id = generate_uuid()
         try:
-            for line in draft.lines:
-                logger.info(f"Processing line: {line}")
-                
-                # Генерируем уникальную партию для каждого прихода
-                receipt_date = self._process_receipt_date(line.receiptDate)
-                batch_number = line.batchNumber or self._generate_batch_number(line.materialId, receipt_date)
-                logger.info(f"Generated batch number: {batch_number}")
-                
-                # Ищем существующую запись по партии (всегда будет новая для нового прихода)
-                query = self.db.query(WarehouseStock).filter(
-                    WarehouseStock.material_id == line.materialId,
-                    WarehouseStock.warehouse_code == line.warehouseCode,
-                    WarehouseStock.batch_number == batch_number
+            material_ids = {line.materialId for line in draft.lines}
+            material_codes = dict(
+                self.db.execute(
+                    select(Material.material_id, Material.code).where(Material.material_id.in_(material_ids))
+                ).all()
+            )
+            missing = material_ids - material_codes.keys()
+            if missing:
+                raise ValueError(f"Material {next(iter(missing))} not found")
+
+            receipt_dates = [self._process_receipt_date(line.receiptDate) for line in draft.lines]
+            generated = iter(
+                self._allocate_batch_numbers(
+                    [
+                        (line.materialId, receipt_date)
+                        for line, receipt_date in zip(draft.lines, receipt_dates)
+                        if not line.batchNumber
+                    ],
+                    material_codes,
+                )
+            )
+            batch_numbers = [line.batchNumber or next(generated) for line in draft.lines]
+
+            # Приход в уже существующую партию возможен только с явно указанным номером
+            explicit = {
+                (line.materialId, line.warehouseCode, line.batchNumber)
+                for line in draft.lines
+                if line.batchNumber
+            }
+            stocks: Dict[Tuple[UUID, str, str], WarehouseStock] = {}
+            if explicit:
+                stmt = (
+                    select(WarehouseStock)
+                    .where(
+                        tuple_(
+                            WarehouseStock.material_id,
+                            WarehouseStock.warehouse_code,
+                            WarehouseStock.batch_number,
+                        ).in_(explicit)
+                    )
+                    .order_by(WarehouseStock.stock_id)
+                    .with_for_update()
                 )
-                
-                stock = query.first()
-                
+                stocks = {
+                    (stock.material_id, stock.warehouse_code, stock.batch_number): stock
+                    for stock in self.db.scalars(stmt)
+                }
+
+            new_stocks = []
+            entries = []
+            received = []
+            for line, receipt_date, batch_number in zip(draft.lines, receipt_dates, batch_numbers):
+                quantity = Decimal(str(line.quantity))
+                key = (line.materialId, line.warehouseCode, batch_number)
+                stock = stocks.get(key)
                 if stock:
-                    # Обновить существующий остаток
-                    current_qty = Decimal(str(stock.quantity or 0))
-                    add_qty = Decimal(str(line.quantity))
-                    stock.quantity = current_qty + add_qty
+                    stock.quantity = Decimal(str(stock.quantity or 0)) + quantity
                     stock.last_receipt_date = receipt_date
                     if line.price is not None:
                         stock.purchase_price = line.price
                     if line.location:
                         stock.location = line.location
-                    # updated_at обновляется автоматически через onupdate=func.now()
                 else:
-                    # Создать новую запись
                     stock = WarehouseStock(
+                        stock_id=generate_uuid(),
                         material_id=line.materialId,
                         warehouse_code=line.warehouseCode,
                         location=line.location,
-                        quantity=Decimal(str(line.quantity)),
+                        quantity=quantity,
                         reserved_quantity=0,
                         unit=line.unit,
                         purchase_price=line.price,
-                        batch_number=batch_number,  # Используем сгенерированную партию
+                        batch_number=batch_number,
                         receipt_date=receipt_date,
                         last_receipt_date=receipt_date,
                         notes=line.comments,
-                        # updated_at устанавливается автоматически
                     )
-                    self.db.add(stock)
-            
-            logger.info("Committing transaction...")
+                    stocks[key] = stock
+                    new_stocks.append(stock)
+
+                received.append((stock, quantity, None if line.price is None else Decimal(str(line.price))))
+                entries.append(
+                    ledger.entry(
+                        stock,
+                        WarehouseLedger.RECEIPT,
+                        quantity,
+                        document_id=document_id,
+                        warehouse_to=line.warehouseCode,
+                        reference_number=draft.referenceNumber,
+                        reference_type="RECEIPT",
+                        notes=line.comments,
+                    )
+                )
+
+            # Client-side UUID keys let the ORM batch these INSERTs into executemany
+            self.db.add_all(new_stocks)
+            self.db.flush()
+            ledger.record(entries)
+            StockValuation(self.db).record_receipts(received, document_id=document_id)
+            StockAlertService(self.db).refresh(material_ids)
             self.db.commit()
-            logger.info("Transaction committed successfully")
         except Exception as e:
             logger.error(f"Exception in receipt: {e}", exc_info=True)
             self.db.rollback()
-            raise e
+            raise
 
-    def issue(self, draft: WarehouseIssueDraft) -> None:
-        """Process material issue/consumption."""
-        for line in draft.lines:
-            stock = self.db.get(WarehouseStock, line.stockId)
-            if not stock:
-                raise ValueError(f"Stock item {line.stockId} not found")
-            
-            available = (stock.quantity or 0) - (stock.reserved_quantity or 0)
-            if available < line.quantity:
-                raise ValueError(f"Insufficient stock: available {available}, requested {line.quantity}")
-            
-            # Списать материал
-            stock.quantity = (stock.quantity or 0) - line.quantity
-            stock.last_issue_date = datetime.utcnow().date()
-            # updated_at обновляется автоматически через onupdate=func.now()
-            
-            # Добавить комментарий к notes если есть
-            if line.comments:
-                existing_notes = stock.notes or ""
-                timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M")
-                new_note = f"[{timestamp}] {line.reason}: {line.comments}"
-                stock.notes = f"{existing_notes}\n{new_note}" if existing_notes else new_note
-        
-        self.db.commit()
-
-    def _to_list_item(self, stock: WarehouseStock) -> WarehouseStockListItem:
+        invalidate_batches(batch_numbers)
+        logger.info("Receipt %s posted: %s lines", draft.referenceNumber, len(draft.lines))
+        return batch_numbers
+
+    def issue(self, draft: WarehouseIssueDraft) -> WarehouseIssueResult:
+        """Process material issue/consumption.
+
+        A line either names a batch (``stockId``) or only a ``materialId``, in
+        which case the quantity is spread over unexpired batches by earliest
+        expiry, then earliest receipt (FEFO), optionally within one warehouse.
+
+        Named batches and FEFO candidates are locked with one
+        ``SELECT ... FOR UPDATE`` in ``stock_id`` order, so concurrent issues
+        touching overlapping rows queue behind each other instead of
+        deadlocking, and availability checked here cannot change before the
+        write. Lines are then validated in order (several lines may draw on
+        the same row) and applied with one bulk UPDATE plus one ledger INSERT.
+
+        A line with ``orderReference`` draws first on that order's ACTIVE
+        reservations: reserved stock counts as available to it, reserved
+        batches are picked before unreserved ones, and the consumed part is
+        taken off ``reserved_quantity`` and its reservations marked CONSUMED in
+        the same transaction.
+
+        Without ``allowPartial`` any failed line rejects the whole draft with
+        ``ValueError``; with it, failed lines are reported and the rest issued.
+        """
+        if not draft.lines:
+            return WarehouseIssueResult(issuedCount=0, failedCount=0, lines=[])
+
+        try:
+            stocks = self._lock_issue_stock(draft)
+            reservations = self._lock_order_reservations(draft, stocks)
+            free: Dict[UUID, Decimal] = {
+                stock_id: Decimal(str(stock.quantity or 0)) - Decimal(str(stock.reserved_quantity or 0))
+                for stock_id, stock in stocks.items()
+            }
+            held: Dict[Tuple[str, UUID], Decimal] = defaultdict(Decimal)
+            for reservation in reservations:
+                held[(reservation.order_reference, reservation.stock_id)] += Decimal(str(reservation.quantity))
+            fefo: Dict[UUID, List[WarehouseStock]] = {}
+            today = date.today()
+            for stock in sorted(stocks.values(), key=self._fefo_key):
+                if stock.expiry_date is None or stock.expiry_date >= today:
+                    fefo.setdefault(stock.material_id, []).append(stock)
+            issued: Dict[UUID, Decimal] = {}
+            consumed: Dict[Tuple[str, UUID], Decimal] = defaultdict(Decimal)
+
+            ledger = WarehouseLedger(self.db)
+            document_id = generate_uuid()
+            entries = []
+            results: List[WarehouseIssueLineResult] = []
+            for line in draft.lines:
+                quantity = Decimal(str(line.quantity))
+                picks: List[Tuple[WarehouseStock, Decimal]] = []
+                error = None
+                if quantity <= 0:
+                    error = f"Issue quantity must be positive, got {line.quantity}"
+                elif line.stockId is not None:
+                    stock = stocks.get(line.stockId)
+                    if stock is None:
+                        error = f"Stock item {line.stockId} not found"
+                    else:
+                        available = free[line.stockId] + held.get((line.orderReference, line.stockId), 0)
+                        if available < quantity:
+                            error = f"Insufficient stock: available {available}, requested {line.quantity}"
+                        else:
+                            picks.append((stock, quantity))
+                elif line.materialId is not None:
+                    remaining = quantity
+                    # The order's own reserved batches first, FEFO within each group
+                    candidates = sorted(
+                        fefo.get(line.materialId, []),
+                        key=lambda stock: (line.orderReference, stock.stock_id) not in held,
+                    )
+                    for stock in candidates:
+                        if remaining <= 0:
+                            break
+                        if line.warehouseCode and stock.warehouse_code != line.warehouseCode:
+                            continue
+                        take = min(free[stock.stock_id] + held.get((line.orderReference, stock.stock_id), 0), remaining)
+                        if take > 0:
+                            picks.append((stock, take))
+                            remaining -= take
+                    if remaining > 0:
+                        error = f"Insufficient stock for material {line.materialId}: short by {remaining}"
+                        picks = []
+                else:
+                    error = "Either stockId or materialId is required"
+
+                if error:
+                    if not draft.allowPartial:
+                        raise ValueError(error)
+                    results.append(
+                        WarehouseIssueLineResult(
+                            stockId=line.stockId,
+                            materialId=line.materialId,
+                            requestedQuantity=line.quantity,
+                            issuedQuantity=0,
+                            status=self.FAILED,
+                            error=error,
+                        )
+                    )
+                    continue
+
+                allocations = []
+                for stock, take in picks:
+                    key = (line.orderReference, stock.stock_id)
+                    own = min(held.get(key, Decimal(0)), take)
+                    if own > 0:
+                        held[key] -= own
+                        consumed[key] += own
+                    free[stock.stock_id] -= take - own
+                    issued[stock.stock_id] = issued.get(stock.stock_id, Decimal(0)) + take
+                    entries.append(
+                        ledger.entry(
+                            stock,
+                            WarehouseLedger.ISSUE,
+                            -take,
+                            document_id=document_id,
+                            warehouse_from=stock.warehouse_code,
+                            reference_number=line.orderReference,
+                            reference_type="PRODUCTION_ORDER" if line.orderReference else None,
+                            reason=line.reason,
+                            notes=line.comments,
+                        )
+                    )
+                    allocations.append(
+                        WarehouseIssueAllocation(
+                            stockId=stock.stock_id,
+                            batchNumber=stock.batch_number,
+                            warehouseCode=stock.warehouse_code,
+                            quantity=float(take),
+                        )
+                    )
+                results.append(
+                    WarehouseIssueLineResult(
+                        stockId=line.stockId,
+                        materialId=picks[0][0].material_id,
+                        requestedQuantity=line.quantity,
+                        issuedQuantity=line.quantity,
+                        status=self.ISSUED,
+                        allocations=allocations,
+                    )
+                )
+
+            if issued:
+                unreserved: Dict[UUID, Decimal] = defaultdict(Decimal)
+                for (_, stock_id), qty in consumed.items():
+                    unreserved[stock_id] += qty
+                self.db.execute(
+                    update(WarehouseStock),
+                    [
+                        {
+                            "stock_id": stock_id,
+                            "quantity": Decimal(str(stocks[stock_id].quantity or 0)) - qty,
+                            "reserved_quantity": Decimal(str(stocks[stock_id].reserved_quantity or 0))
+                            - unreserved[stock_id],
+                            "last_issue_date": today,
+                        }
+                        for stock_id, qty in issued.items()
+                    ],
+                )
+                self._consume_reservations(reservations, consumed)
+                ledger.record(entries)
+                StockValuation(self.db).record_issues(
+                    (stocks[stock_id].material_id, qty) for stock_id, qty in issued.items()
+                )
+                StockAlertService(self.db).refresh(stocks[stock_id].material_id for stock_id in issued)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        invalidate_batches(stocks[stock_id].batch_number for stock_id in issued)
+        issued_count = sum(1 for result in results if result.status == self.ISSUED)
+        return WarehouseIssueResult(
+            documentId=document_id if issued else None,
+            issuedCount=issued_count,
+            failedCount=len(results) - issued_count,
+            lines=results,
+        )
+
+    def _lock_issue_stock(self, draft: WarehouseIssueDraft) -> Dict[UUID, WarehouseStock]:
+        """Lock named batches and FEFO candidates of an issue draft in one query."""
+        stock_ids = {line.stockId for line in draft.lines if line.stockId is not None}
+        material_lines = [line for line in draft.lines if line.stockId is None and line.materialId is not None]
+        material_ids = {line.materialId for line in material_lines}
+        order_references = {line.orderReference for line in material_lines if line.orderReference}
+        conditions = []
+        if stock_ids:
+            conditions.append(WarehouseStock.stock_id.in_(stock_ids))
+        if material_ids:
+            has_free = func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(WarehouseStock.reserved_quantity, 0) > 0
+            if order_references:
+                # Fully reserved batches are still candidates for their own orders
+                has_free = or_(
+                    has_free,
+                    WarehouseStock.stock_id.in_(
+                        select(WarehouseReservation.stock_id).where(
+                            WarehouseReservation.order_reference.in_(order_references),
+                            WarehouseReservation.material_id.in_(material_ids),
+                            WarehouseReservation.status == ReservationService.ACTIVE,
+                        )
+                    ),
+                )
+            # Served by ix_warehouse_stock_fefo (material_id, expiry_date, receipt_date)
+            conditions.append(
+                and_(
+                    WarehouseStock.material_id.in_(material_ids),
+                    has_free,
+                    or_(WarehouseStock.expiry_date.is_(None), WarehouseStock.expiry_date >= date.today()),
+                )
+            )
+        if not conditions:
+            return {}
+
+        # A single lock order shared by all issue paths rules out deadlocks
+        return {
+            stock.stock_id: stock
+            for stock in self.db.scalars(
+                select(WarehouseStock)
+                .where(or_(*conditions))
+                .order_by(WarehouseStock.stock_id)
+                .with_for_update()
+            )
+        }
+
+    def _lock_order_reservations(
+        self, draft: WarehouseIssueDraft, stocks: Dict[UUID, WarehouseStock]
+    ) -> List[WarehouseReservation]:
+        """Lock the ACTIVE reservations of the draft's orders on the locked batches, oldest first.
+
+        Called after the stock rows are locked, matching the stock-then-reservation
+        order used by ``ReservationService``.
+        """
+        order_references = {line.orderReference for line in draft.lines if line.orderReference}
+        if not order_references or not stocks:
+            return []
+        return list(
+            self.db.scalars(
+                select(WarehouseReservation)
+                .where(
+                    WarehouseReservation.order_reference.in_(order_references),
+                    WarehouseReservation.stock_id.in_(stocks),
+                    WarehouseReservation.status == ReservationService.ACTIVE,
+                )
+                .order_by(WarehouseReservation.created_at, WarehouseReservation.reservation_id)
+                .with_for_update()
+            )
+        )
+
+    def _consume_reservations(
+        self, reservations: List[WarehouseReservation], consumed: Dict[Tuple[str, UUID], Decimal]
+    ) -> None:
+        """Close the issued part of reservations, oldest first.
+
+        A fully issued reservation becomes CONSUMED; a partly issued one keeps
+        its remainder ACTIVE and the issued part is split off as a CONSUMED row.
+        """
+        consumed = dict(consumed)
+        closed_at = datetime.utcnow()
+        for reservation in reservations:
+            key = (reservation.order_reference, reservation.stock_id)
+            quantity = Decimal(str(reservation.quantity))
+            take = min(consumed.get(key, Decimal(0)), quantity)
+            if take <= 0:
+                continue
+            consumed[key] -= take
+            if take == quantity:
+                reservation.status = ReservationService.CONSUMED
+                reservation.released_at = closed_at
+                continue
+            reservation.quantity = quantity - take
+            self.db.add(
+                WarehouseReservation(
+                    reservation_id=generate_uuid(),
+                    stock_id=reservation.stock_id,
+                    material_id=reservation.material_id,
+                    order_reference=reservation.order_reference,
+                    quantity=take,
+                    status=ReservationService.CONSUMED,
+                    released_at=closed_at,
+                )
+            )
+
+    @staticmethod
+    def _fefo_key(stock: WarehouseStock) -> tuple:
+        return (
+            stock.expiry_date is None,
+            stock.expiry_date or date.max,
+            stock.receipt_date is None,
+            stock.receipt_date or date.max,
+            str(stock.stock_id),
+        )
+
+    def transfer(self, draft: WarehouseTransferDraft) -> WarehouseTransferResult:
+        """Move stock to another warehouse in one transaction, keeping batch identity.
+
+        Each line moves part of a batch onto the row of the same batch in the
+        target warehouse, creating that row (with the batch's receipt date,
+        expiry and price) when it does not exist yet. Source rows and existing
+        target rows are locked together in ``stock_id`` order; balances are
+        written with one bulk UPDATE and one batched INSERT, and every line
+        adds a paired TRANSFER entry (out of the source, into the target) to
+        a single ledger INSERT.
+        """
+        if not draft.lines:
+            return WarehouseTransferResult(lines=[])
+
+        target_code = draft.toWarehouseCode
+        ledger = WarehouseLedger(self.db)
+        document_id = generate_uuid()
+        today = date.today()
+        try:
+            source_ids = {line.stockId for line in draft.lines}
+            # Batch keys of the sources decide which target rows to lock alongside them
+            target_keys = {
+                (material_id, target_code, batch_number)
+                for material_id, batch_number in self.db.execute(
+                    select(WarehouseStock.material_id, WarehouseStock.batch_number).where(
+                        WarehouseStock.stock_id.in_(source_ids),
+                        WarehouseStock.batch_number.is_not(None),
+                    )
+                )
+            }
+            condition = WarehouseStock.stock_id.in_(source_ids)
+            if target_keys:
+                condition = or_(
+                    condition,
+                    tuple_(
+                        WarehouseStock.material_id,
+                        WarehouseStock.warehouse_code,
+                        WarehouseStock.batch_number,
+                    ).in_(target_keys),
+                )
+            locked: Dict[UUID, WarehouseStock] = {
+                stock.stock_id: stock
+                for stock in self.db.scalars(
+                    select(WarehouseStock).where(condition).order_by(WarehouseStock.stock_id).with_for_update()
+                )
+            }
+            targets = {
+                (stock.material_id, stock.warehouse_code, stock.batch_number): stock
+                for stock in locked.values()
+                if stock.warehouse_code == target_code and stock.batch_number is not None
+            }
+            quantities = {stock_id: Decimal(str(stock.quantity or 0)) for stock_id, stock in locked.items()}
+
+            new_stocks: List[WarehouseStock] = []
+            entries = []
+            results: List[WarehouseTransferLineResult] = []
+            for line in draft.lines:
+                source = locked.get(line.stockId)
+                if source is None:
+                    raise ValueError(f"Stock item {line.stockId} not found")
+                if source.warehouse_code == target_code:
+                    raise ValueError(f"Stock item {line.stockId} is already in warehouse {target_code}")
+                quantity = Decimal(str(line.quantity))
+                if quantity <= 0:
+                    raise ValueError(f"Transfer quantity must be positive, got {line.quantity}")
+                available = quantities[source.stock_id] - Decimal(str(source.reserved_quantity or 0))
+                if available < quantity:
+                    raise ValueError(
+                        f"Insufficient stock in batch {source.batch_number or source.stock_id}: "
+                        f"available {available}, requested {line.quantity}"
+                    )
+
+                key = (source.material_id, target_code, source.batch_number)
+                target = targets.get(key) if source.batch_number else None
+                if target is None:
+                    target = WarehouseStock(
+                        stock_id=generate_uuid(),
+                        material_id=source.material_id,
+                        warehouse_code=target_code,
+                        location=line.location or draft.toLocation,
+                        reserved_quantity=0,
+                        unit=source.unit,
+                        purchase_price=source.purchase_price,
+                        batch_number=source.batch_number,
+                        receipt_date=source.receipt_date,
+                        expiry_date=source.expiry_date,
+                        last_receipt_date=today,
+                    )
+                    new_stocks.append(target)
+                    quantities[target.stock_id] = Decimal(0)
+                    if source.batch_number:
+                        targets[key] = target
+
+                quantities[source.stock_id] -= quantity
+                quantities[target.stock_id] += quantity
+                for stock, delta in ((source, -quantity), (target, quantity)):
+                    entries.append(
+                        ledger.entry(
+                            stock,
+                            WarehouseLedger.TRANSFER,
+                            delta,
+                            document_id=document_id,
+                            warehouse_from=source.warehouse_code,
+                            warehouse_to=target_code,
+                            reference_number=draft.referenceNumber,
+                            reference_type="TRANSFER",
+                            notes=draft.comments,
+                        )
+                    )
+                results.append(
+                    WarehouseTransferLineResult(
+                        sourceStockId=source.stock_id,
+                        targetStockId=target.stock_id,
+                        batchNumber=source.batch_number,
+                        fromWarehouseCode=source.warehouse_code,
+                        toWarehouseCode=target_code,
+                        quantity=line.quantity,
+                    )
+                )
+
+            for stock in new_stocks:
+                stock.quantity = quantities[stock.stock_id]
+            self.db.add_all(new_stocks)
+            self.db.flush()
+            self.db.execute(
+                update(WarehouseStock),
+                [
+                    {"stock_id": stock_id, "quantity": quantities[stock_id]}
+                    for stock_id in locked
+                    if quantities[stock_id] != Decimal(str(locked[stock_id].quantity or 0))
+                ],
+            )
+            ledger.record(entries)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        invalidate_batches(line.batchNumber for line in results)
+        logger.info("Transfer %s posted: %s lines to %s", draft.referenceNumber, len(draft.lines), target_code)
+        return WarehouseTransferResult(documentId=document_id, lines=results)
+
+    def _to_list_item(
+        self,
+        stock: WarehouseStock,
+        quantity: Optional[float] = None,
+        reserved: Optional[float] = None,
+        status: Optional[str] = None,
+        unit_cost: Optional[Decimal] = None,
+    ) -> WarehouseStockListItem:
         """Convert WarehouseStock model to WarehouseStockListItem schema."""
-        schema_data = self._to_schema(stock)
+        schema_data = self._to_schema(stock, quantity=quantity, reserved=reserved, status=status, unit_cost=unit_cost)
         return WarehouseStockListItem(**schema_data.model_dump())
@@ -0,0 +1,60 @@
+"""Fixtures for backend service tests.
+
+The services rely on PostgreSQL features (UUID columns, ``ON CONFLICT``,
+``FOR UPDATE SKIP LOCKED``), so the tests run against the database named by
+``TEST_DATABASE_URL`` and are skipped when it is not set. The schema is
+recreated once per run and every table is truncated before each test.
+"""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db.init_db import SCHEMA_UPGRADES  # noqa: E402
+from app.models import Base, Material  # noqa: E402
+from app.services.batch_lookup_service import batch_cache  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def engine():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL, future=True)
+    with engine.begin() as connection:
+        connection.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public"))
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    with engine.begin() as connection:
+        tables = ", ".join(table.name for table in Base.metadata.tables.values())
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+    batch_cache.clear()
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def material(db):
+    def create(code: str = "LEATHER-01", **fields) -> Material:
+        material = Material(code=code, name=code, group="LEATHER", unit_primary="dm2", **fields)
+        db.add(material)
+        db.commit()
+        return material
+
+    return create
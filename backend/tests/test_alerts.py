@@ -0,0 +1,64 @@
+"""Low-stock alerts kept in step with concurrent movements."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session
+
+from app.models import WarehouseStock, WarehouseStockAlert
+from app.services.alert_service import StockAlertService
+
+
+def _batch(db, material, batch_number, quantity):
+    stock = WarehouseStock(
+        material_id=material.material_id,
+        warehouse_code="WH01",
+        batch_number=batch_number,
+        quantity=quantity,
+        reserved_quantity=0,
+        unit="dm2",
+    )
+    db.add(stock)
+    db.commit()
+    return stock.stock_id
+
+
+def _empty(session, stock_id, material_id):
+    session.execute(update(WarehouseStock).where(WarehouseStock.stock_id == stock_id).values(quantity=0))
+    StockAlertService(session).refresh([material_id])
+
+
+def _wait_for_lock(db, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        waiting = db.scalar(
+            text("SELECT count(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()")
+        )
+        db.rollback()
+        if waiting:
+            return
+        time.sleep(0.05)
+    raise AssertionError("The second movement never waited for the first")
+
+
+def test_concurrent_movements_of_one_material(engine, db, material):
+    leather = material(safety_stock=10, reorder_point=50)
+    material_id = leather.material_id
+    first = _batch(db, leather, "B-1", 30)
+    second = _batch(db, leather, "B-2", 30)
+
+    with Session(engine) as one, Session(engine) as other:
+        # The first movement sees 0 + 30 and raises LOW, but has not committed yet
+        _empty(one, first, material_id)
+        worker = threading.Thread(target=lambda: (_empty(other, second, material_id), other.commit()))
+        worker.start()
+        _wait_for_lock(db)
+        one.commit()
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+
+    alert = db.scalars(select(WarehouseStockAlert)).one()
+    assert (alert.level, alert.available_quantity) == (StockAlertService.CRITICAL, 0)
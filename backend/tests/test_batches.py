@@ -0,0 +1,99 @@
+"""Batch rows: one per batch, warehouse and material."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import select, text
+
+from app.models import (
+    WarehouseReservation,
+    WarehouseStock,
+    WarehouseStocktake,
+    WarehouseStocktakeLine,
+    WarehouseTransaction,
+)
+from app.services.batch_lookup_service import BatchLookupService
+from app.services.warehouse_ledger import WarehouseLedger
+
+UNIQUE_MIGRATION = (
+    Path(__file__).resolve().parents[2] / "database" / "migrations" / "014_warehouse_stock_batch_unique.sql"
+)
+
+
+def _stock(material, quantity, receipt_date, reserved=0):
+    return WarehouseStock(
+        material_id=material.material_id,
+        warehouse_code="WH01",
+        batch_number="B-1",
+        quantity=quantity,
+        reserved_quantity=reserved,
+        unit="dm2",
+        receipt_date=receipt_date,
+    )
+
+
+def test_unique_migration_merges_duplicate_batch_rows(engine, db, material):
+    leather = material()
+    # Duplicates written before the unique index existed
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX uq_warehouse_stock_batch"))
+    first = _stock(leather, 10, date(2026, 1, 5), reserved=4)
+    second = _stock(leather, 6, date(2026, 1, 9), reserved=1)
+    db.add_all([first, second])
+    db.flush()
+    ledger = WarehouseLedger(db)
+    ledger.record(
+        [
+            ledger.entry(stock, WarehouseLedger.RECEIPT, stock.quantity, reference_type="RECEIPT")
+            for stock in (first, second)
+        ]
+    )
+    stocktake = WarehouseStocktake(status="OPEN")
+    db.add_all(
+        [
+            WarehouseReservation(
+                stock_id=second.stock_id, material_id=leather.material_id, order_reference="PO-1", quantity=1
+            ),
+            stocktake,
+        ]
+    )
+    db.flush()
+    counted_at = datetime(2026, 2, 1, tzinfo=timezone.utc)
+    db.add_all(
+        [
+            WarehouseStocktakeLine(
+                stocktake_id=stocktake.stocktake_id,
+                stock_id=stock.stock_id,
+                counted_quantity=quantity,
+                counted_at=counted_at,
+            )
+            for stock, quantity in ((first, 9), (second, 6))
+        ]
+    )
+    db.commit()
+    first_id, second_id = first.stock_id, second.stock_id
+
+    connection = engine.raw_connection()
+    try:
+        connection.autocommit = True
+        for _ in range(2):
+            connection.cursor().execute(UNIQUE_MIGRATION.read_text())
+    finally:
+        connection.close()
+
+    db.expire_all()
+    [merged] = db.scalars(select(WarehouseStock)).all()
+    assert merged.stock_id == first_id
+    assert (merged.quantity, merged.reserved_quantity) == (Decimal(16), Decimal(5))
+    assert merged.receipt_date == date(2026, 1, 5)
+    assert {entry.stock_id for entry in db.scalars(select(WarehouseTransaction))} == {first_id}
+    assert db.scalars(select(WarehouseReservation.stock_id)).all() == [first_id]
+    [line] = db.scalars(select(WarehouseStocktakeLine)).all()
+    assert (line.stock_id, line.counted_quantity) == (first_id, Decimal(15))
+    assert db.get(WarehouseStock, second_id) is None
+    assert [item.stockId for item in BatchLookupService(db).lookup(["B-1"]).items] == [first_id]
+    unique = db.scalar(text("SELECT indisunique FROM pg_index WHERE indexrelid = 'uq_warehouse_stock_batch'::regclass"))
+    assert unique is True
@@ -0,0 +1,140 @@
+"""Warehouse ledger, balance snapshots and point-in-time stock."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.exc import IntegrityError
+
+from app.db import database
+from app.models import WarehouseBalanceSnapshot, WarehouseStock, WarehouseTransaction
+from app.schemas.warehouse import (
+    WarehouseIssueDraft,
+    WarehouseIssueLine,
+    WarehouseListQuery,
+    WarehouseReceiptDraft,
+    WarehouseReceiptLine,
+)
+from app.services.warehouse_ledger import WarehouseLedger
+from app.services.warehouse_service import WarehouseService
+
+OPENING_MIGRATION = Path(__file__).resolve().parents[2] / "database" / "migrations" / "012_warehouse_ledger_opening.sql"
+
+
+def _receive(db, material, quantity, batch_number="B-1"):
+    WarehouseService(db).receipt(
+        WarehouseReceiptDraft(
+            lines=[
+                WarehouseReceiptLine(
+                    materialId=material.material_id,
+                    quantity=quantity,
+                    unit="dm2",
+                    price=10,
+                    warehouseCode="WH01",
+                    batchNumber=batch_number,
+                )
+            ]
+        )
+    )
+    return db.scalars(select(WarehouseStock).where(WarehouseStock.batch_number == batch_number)).one()
+
+
+def _issue(db, stock, quantity):
+    WarehouseService(db).issue(
+        WarehouseIssueDraft(
+            lines=[WarehouseIssueLine(stockId=stock.stock_id, quantity=quantity, unit="dm2", reason="PRODUCTION")]
+        )
+    )
+
+
+def _now(db):
+    now = db.scalar(select(func.clock_timestamp()))
+    db.commit()
+    return now
+
+
+def _balance(db, stock, at):
+    balances = WarehouseLedger(db).balances_as_of(at)
+    return db.scalar(select(balances.c.quantity).where(balances.c.stock_id == stock.stock_id))
+
+
+def _listed_quantity(db, at):
+    (item,) = WarehouseService(db).list_stock(WarehouseListQuery(asOf=at)).items
+    return item.quantity
+
+
+def test_balance_as_of_combines_snapshot_and_later_entries(db, material):
+    leather = material()
+    stock = _receive(db, leather, 100)
+    _issue(db, stock, 30)
+    before_snapshot = _now(db)
+
+    assert WarehouseLedger(db).take_snapshot() == 1
+    _issue(db, stock, 20)
+    after_issue = _now(db)
+    _receive(db, leather, 5)
+
+    assert _balance(db, stock, before_snapshot) == 70
+    assert _balance(db, stock, after_issue) == 50
+    assert _listed_quantity(db, after_issue) == 50
+    assert _balance(db, stock, _now(db)) == 55
+
+
+def test_snapshot_is_skipped_until_due(db, material):
+    _receive(db, material(), 10)
+    ledger = WarehouseLedger(db)
+
+    assert ledger.take_snapshot_if_due(timedelta(hours=1)) == 1
+    assert ledger.take_snapshot_if_due(timedelta(hours=1)) is None
+    assert ledger.take_snapshot_if_due(timedelta(0)) == 1
+    assert db.scalar(select(func.count()).select_from(WarehouseBalanceSnapshot)) == 2
+
+
+def test_scheduled_jobs_run_in_one_process_at_a_time(engine, monkeypatch):
+    monkeypatch.setattr(database, "engine", engine)
+    lock_key = WarehouseLedger.SNAPSHOT_LOCK_KEY
+
+    assert database.run_exclusive(lock_key, lambda db: "done") == "done"
+    with engine.connect() as other_worker:
+        other_worker.scalar(select(func.pg_advisory_lock(lock_key)))
+        assert database.run_exclusive(lock_key, lambda db: "done") is None
+        other_worker.scalar(select(func.pg_advisory_unlock(lock_key)))
+
+
+def test_stock_with_ledger_history_cannot_be_deleted(db, material):
+    stock = _receive(db, material(), 10)
+
+    with pytest.raises(IntegrityError):
+        db.execute(delete(WarehouseStock).where(WarehouseStock.stock_id == stock.stock_id))
+    db.rollback()
+
+
+def test_opening_migration_books_balances_that_predate_the_ledger(engine, db, material):
+    leather = material()
+    legacy = WarehouseStock(material_id=leather.material_id, warehouse_code="WH01", quantity=40, unit="dm2")
+    db.add(legacy)
+    db.commit()
+    stock = _receive(db, leather, 10)
+    assert stock.stock_id != legacy.stock_id
+    _issue(db, legacy, 15)
+    # The migration alters the tables, so no transaction may hold them
+    db.commit()
+
+    connection = engine.raw_connection()
+    try:
+        connection.autocommit = True
+        for _ in range(2):
+            connection.cursor().execute(OPENING_MIGRATION.read_text())
+    finally:
+        connection.close()
+
+    openings = db.scalars(
+        select(WarehouseTransaction).where(WarehouseTransaction.transaction_type == WarehouseLedger.OPENING)
+    ).all()
+    assert [(entry.stock_id, entry.quantity) for entry in openings] == [(legacy.stock_id, Decimal(40))]
+    now = _now(db)
+    assert (_balance(db, legacy, now), _balance(db, stock, now)) == (25, 10)
@@ -0,0 +1,20 @@
+"""Model card cache backend selection."""
+
+from __future__ import annotations
+
+from app.core import cache
+from app.core.config import settings
+from app.services import model_cache
+
+
+def test_in_process_fallback_expires_quickly(monkeypatch):
+    # Without Redis other workers never see an invalidation, only the TTL bounds staleness
+    monkeypatch.setattr(settings, "REDIS_URL", "")
+    monkeypatch.setattr(model_cache, "_backend", None)
+
+    backend = model_cache._cache()
+
+    assert isinstance(backend, cache.LRUCache)
+    assert backend.ttl == settings.MODEL_CACHE_LOCAL_TTL_SECONDS
+    assert backend.ttl < settings.MODEL_CACHE_TTL_SECONDS
+    assert cache.create_cache("other", maxsize=10, ttl=600).ttl == 600
@@ -0,0 +1,73 @@
+"""Offset and keyset pagination of list endpoints."""
+
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import select, text
+
+from app.models import WarehouseStock
+from app.schemas.warehouse import WarehouseListQuery
+from app.services.pagination import count_total
+from app.services.warehouse_service import WarehouseService
+
+
+@pytest.fixture
+def stock(db, material):
+    laces = material("LACES")
+    rows = [
+        WarehouseStock(material_id=laces.material_id, warehouse_code="WH01", quantity=1, unit="pcs", batch_number=f"B-{n:02d}")
+        for n in range(7)
+    ]
+    db.add_all(rows)
+    db.commit()
+    # Ties on updated_at are broken by stock_id
+    db.execute(text("UPDATE warehouse_stock SET updated_at = '2026-01-01T00:00:00Z' WHERE batch_number < 'B-04'"))
+    db.commit()
+    return rows
+
+
+def _pages(db, **query):
+    service = WarehouseService(db)
+    pages = []
+    cursor = None
+    while True:
+        result = service.list_stock(WarehouseListQuery(pagination="cursor", pageSize=3, cursor=cursor, **query))
+        pages.append(result)
+        cursor = result.nextCursor
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_row_once_in_offset_order(db, stock):
+    pages = _pages(db)
+
+    assert [len(page.items) for page in pages] == [3, 3, 1]
+    keyset = [item.id for page in pages for item in page.items]
+    offset = WarehouseService(db).list_stock(WarehouseListQuery(pageSize=50))
+    assert keyset == [item.id for item in offset.items]
+    assert offset.total == 7
+
+
+def test_cursor_total_is_only_counted_on_request(db, stock):
+    assert _pages(db)[0].total is None
+
+    exact = _pages(db, totalMode="exact")[0]
+    assert (exact.total, exact.totalIsApproximate) == (7, False)
+
+    approximate = _pages(db, totalMode="approximate")[0]
+    assert approximate.totalIsApproximate is True
+
+
+def test_approximate_total_of_a_filter_with_in(db, stock):
+    stmt = select(WarehouseStock).where(WarehouseStock.batch_number.in_(["B-01", "B-02", "B-03"]))
+
+    total, approximate = count_total(db, stmt, "approximate")
+
+    assert approximate is True
+    assert total >= 0
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "WyJ4Il0"])
+def test_invalid_cursor_is_rejected(db, stock, cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        WarehouseService(db).list_stock(WarehouseListQuery(cursor=cursor))
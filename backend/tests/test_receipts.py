@@ -0,0 +1,68 @@
+"""Warehouse receipts and batch numbering."""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+
+import pytest
+
+from app.models import WarehouseStock
+from app.schemas.warehouse import WarehouseReceiptDraft, WarehouseReceiptLine
+from app.services.warehouse_service import WarehouseService
+
+RECEIPT_DAY = datetime(2026, 3, 2, 9, 30)
+
+
+def _line(material, quantity=10, **fields):
+    return WarehouseReceiptLine(
+        materialId=material.material_id,
+        quantity=quantity,
+        unit="dm2",
+        price=10,
+        warehouseCode="WH01",
+        receiptDate=RECEIPT_DAY,
+        **fields,
+    )
+
+
+def test_generated_batches_continue_after_existing_numbers(db, material):
+    leather = material("LEATHER-01")
+    # Numbered by the earlier per-day count, before the counter table existed
+    for sequence in (1, 2):
+        db.add(
+            WarehouseStock(
+                material_id=leather.material_id,
+                warehouse_code="WH01",
+                quantity=5,
+                unit="dm2",
+                batch_number=f"LEATHER-01-20260302-00{sequence}",
+                receipt_date=date(2026, 3, 2),
+            )
+        )
+    db.commit()
+
+    first = WarehouseService(db).receipt(WarehouseReceiptDraft(lines=[_line(leather), _line(leather)]))
+    second = WarehouseService(db).receipt(WarehouseReceiptDraft(lines=[_line(leather)]))
+
+    assert first == ["LEATHER-01-20260302-003", "LEATHER-01-20260302-004"]
+    assert second == ["LEATHER-01-20260302-005"]
+
+
+def test_receipt_into_a_named_batch_adds_to_it(db, material):
+    leather = material()
+    service = WarehouseService(db)
+
+    service.receipt(WarehouseReceiptDraft(lines=[_line(leather, 10, batchNumber="LOT-7")]))
+    service.receipt(WarehouseReceiptDraft(lines=[_line(leather, 4, batchNumber="LOT-7")]))
+
+    (stock,) = db.query(WarehouseStock).all()
+    assert (stock.batch_number, stock.quantity) == ("LOT-7", 14)
+
+
+@pytest.mark.parametrize("quantity", [0, -3])
+def test_non_positive_receipt_is_rejected(db, material, quantity):
+    leather = material()
+
+    with pytest.raises(ValueError, match="must be positive"):
+        WarehouseService(db).receipt(WarehouseReceiptDraft(lines=[_line(leather), _line(leather, quantity)]))
+    assert db.query(WarehouseStock).count() == 0
@@ -0,0 +1,119 @@
+"""Reservations against stock and their consumption by issues."""
+
+from __future__ import annotations
+
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from app.models import WarehouseReservation, WarehouseStock
+from app.schemas.warehouse import (
+    WarehouseIssueDraft,
+    WarehouseIssueLine,
+    WarehouseReceiptDraft,
+    WarehouseReceiptLine,
+    WarehouseReservationDraft,
+    WarehouseReservationLine,
+)
+from app.services.reservation_service import ReservationService
+from app.services.warehouse_service import WarehouseService
+
+
+def _receive(db, material, quantity):
+    WarehouseService(db).receipt(
+        WarehouseReceiptDraft(
+            lines=[
+                WarehouseReceiptLine(
+                    materialId=material.material_id, quantity=quantity, unit="dm2", price=10, warehouseCode="WH01"
+                )
+            ]
+        )
+    )
+    return db.scalars(select(WarehouseStock).where(WarehouseStock.material_id == material.material_id)).one()
+
+
+def _reserve(db, material, order, quantity):
+    return ReservationService(db).reserve(
+        WarehouseReservationDraft(
+            lines=[WarehouseReservationLine(orderReference=order, materialId=material.material_id, quantity=quantity)]
+        )
+    )
+
+
+def _issue(db, quantity, order=None, **line):
+    return WarehouseService(db).issue(
+        WarehouseIssueDraft(
+            lines=[WarehouseIssueLine(quantity=quantity, unit="dm2", reason="PRODUCTION", orderReference=order, **line)]
+        )
+    )
+
+
+def _statuses(db, order):
+    db.expire_all()
+    return sorted(
+        (reservation.status, Decimal(reservation.quantity))
+        for reservation in db.scalars(select(WarehouseReservation).where(WarehouseReservation.order_reference == order))
+    )
+
+
+def test_issue_for_an_order_consumes_its_reservation(db, material):
+    leather = material()
+    stock = _receive(db, leather, 150)
+    _reserve(db, leather, "PO-1", 120)
+
+    result = _issue(db, 100, order="PO-1", materialId=leather.material_id)
+
+    assert result.issuedCount == 1
+    db.refresh(stock)
+    assert (stock.quantity, stock.reserved_quantity) == (Decimal(50), Decimal(20))
+    assert _statuses(db, "PO-1") == [("ACTIVE", Decimal(20)), ("CONSUMED", Decimal(100))]
+
+    _issue(db, 20, order="PO-1", stockId=stock.stock_id)
+    db.refresh(stock)
+    assert (stock.quantity, stock.reserved_quantity) == (Decimal(30), Decimal(0))
+    assert _statuses(db, "PO-1") == [("CONSUMED", Decimal(20)), ("CONSUMED", Decimal(100))]
+
+
+def test_other_orders_cannot_issue_reserved_stock(db, material):
+    leather = material()
+    _receive(db, leather, 150)
+    _reserve(db, leather, "PO-1", 120)
+
+    with pytest.raises(ValueError, match="short by 70"):
+        _issue(db, 100, order="PO-2", materialId=leather.material_id)
+    assert _statuses(db, "PO-1") == [("ACTIVE", Decimal(120))]
+
+
+def test_fully_reserved_batch_is_issued_to_its_order(db, material):
+    leather = material()
+    stock = _receive(db, leather, 50)
+    _reserve(db, leather, "PO-1", 50)
+
+    _issue(db, 50, order="PO-1", materialId=leather.material_id)
+
+    db.refresh(stock)
+    assert (stock.quantity, stock.reserved_quantity) == (Decimal(0), Decimal(0))
+    assert _statuses(db, "PO-1") == [("CONSUMED", Decimal(50))]
+
+
+def test_release_returns_reserved_stock(db, material):
+    leather = material()
+    stock = _receive(db, leather, 100)
+    _reserve(db, leather, "PO-1", 60)
+
+    result = ReservationService(db).release(["PO-1"])
+
+    assert (result.releasedCount, result.releasedQuantity) == (1, 60)
+    db.refresh(stock)
+    assert stock.reserved_quantity == 0
+    assert _statuses(db, "PO-1") == [("RELEASED", Decimal(60))]
+
+
+@pytest.mark.parametrize("quantity", [0, -5])
+def test_non_positive_reservation_is_rejected(db, material, quantity):
+    leather = material()
+    _receive(db, leather, 100)
+
+    with pytest.raises(ValueError, match="must be positive"):
+        _reserve(db, leather, "PO-1", quantity)
@@ -0,0 +1,68 @@
+"""Warehouse statistics rollup and its scheduled refresh."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from app.models import WarehouseStock
+from app.schemas.warehouse import (
+    WarehouseIssueDraft,
+    WarehouseIssueLine,
+    WarehouseReceiptDraft,
+    WarehouseReceiptLine,
+)
+from app.services.statistics_service import WarehouseStatisticsService
+from app.services.warehouse_service import WarehouseService
+
+
+def _receive(db, material, quantity, price, batch_number):
+    WarehouseService(db).receipt(
+        WarehouseReceiptDraft(
+            lines=[
+                WarehouseReceiptLine(
+                    materialId=material.material_id,
+                    quantity=quantity,
+                    unit="dm2",
+                    price=price,
+                    warehouseCode="WH01",
+                    batchNumber=batch_number,
+                )
+            ]
+        )
+    )
+    return db.scalars(select(WarehouseStock).where(WarehouseStock.batch_number == batch_number)).one()
+
+
+def test_value_comes_from_the_fifo_valuation(db, material):
+    leather = material()
+    _receive(db, leather, 10, 2, "B-1")
+    newer = _receive(db, leather, 10, 4, "B-2")
+    # FIFO values the issue at the older cost, whichever batch it is picked from
+    WarehouseService(db).issue(
+        WarehouseIssueDraft(
+            lines=[WarehouseIssueLine(stockId=newer.stock_id, quantity=5, unit="dm2", reason="PRODUCTION")]
+        )
+    )
+
+    service = WarehouseStatisticsService(db)
+    service.refresh()
+    statistics = service.get_statistics()
+
+    assert statistics.totalValue == 50
+    assert [(bucket.key, bucket.totalValue) for bucket in statistics.byWarehouse] == [("WH01", 50)]
+    assert statistics.itemsCount == 2
+
+
+def test_scheduled_refresh_runs_once_per_interval(db, material):
+    leather = material()
+    _receive(db, leather, 10, 2, "B-1")
+    service = WarehouseStatisticsService(db)
+
+    assert service.refresh_if_due(timedelta(minutes=5)) is not None
+    refreshed_at = service.get_statistics().refreshedAt
+    assert service.refresh_if_due(timedelta(minutes=5)) is None
+    assert service.get_statistics().refreshedAt == refreshed_at
+    assert service.refresh_if_due(timedelta(0)) is not None
+
@@ -0,0 +1,106 @@
+"""Stock status in the warehouse list, shared with low-stock alerts."""
+
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import select
+
+from app.models import WarehouseStock, WarehouseStockAlert
+from app.schemas.warehouse import WarehouseListQuery
+from app.services.alert_service import StockAlertService
+from app.services.warehouse_service import WarehouseService
+
+
+@pytest.fixture
+def stock(db, material):
+    materials = {
+        # Thresholds of their own, compared with the total over all batches
+        "LACES": material("LACES", safety_stock=10, reorder_point=50),
+        "HOOKS": material("HOOKS", safety_stock=10, reorder_point=50),
+        "CORD": material("CORD", safety_stock=10, reorder_point=50),
+        # No thresholds: the fixed defaults apply
+        "THREAD": material("THREAD"),
+        "NEEDLE": material("NEEDLE"),
+        "BUTTON": material("BUTTON"),
+    }
+    batches = {
+        "laces-1": ("LACES", 20, 15),
+        "laces-2": ("LACES", 30, 0),
+        "hooks-1": ("HOOKS", 4, 0),
+        "hooks-2": ("HOOKS", 3, 0),
+        "cord-1": ("CORD", 30, 0),
+        "cord-2": ("CORD", 30, 0),
+        "thread": ("THREAD", 80, 0),
+        "needle": ("NEEDLE", 300, 0),
+        "button": ("BUTTON", 600, 0),
+    }
+    rows = {
+        batch: WarehouseStock(
+            material_id=materials[code].material_id,
+            warehouse_code="WH01",
+            quantity=quantity,
+            reserved_quantity=reserved,
+            unit="pcs",
+            batch_number=batch,
+        )
+        for batch, (code, quantity, reserved) in batches.items()
+    }
+    db.add_all(rows.values())
+    db.commit()
+    return rows
+
+
+def _listed(db, status=None):
+    result = WarehouseService(db).list_stock(WarehouseListQuery(status=status, pageSize=50))
+    return {item.batchNumber: item.status for item in result.items}, result.total
+
+
+def test_status_follows_the_material_total(db, stock):
+    statuses, _ = _listed(db)
+
+    assert statuses == {
+        "laces-1": "LOW",
+        "laces-2": "LOW",
+        "hooks-1": "CRITICAL",
+        "hooks-2": "CRITICAL",
+        # Each batch is below the reorder point, the material is not
+        "cord-1": "OK",
+        "cord-2": "OK",
+        "thread": "CRITICAL",
+        "needle": "LOW",
+        "button": "OK",
+    }
+    service = WarehouseService(db)
+    for row in stock.values():
+        assert service.get_stock(row.stock_id).status == statuses[row.batch_number]
+
+
+def test_status_agrees_with_alerts(db, stock):
+    StockAlertService(db).refresh(row.material_id for row in stock.values())
+    db.commit()
+    alerts = {alert.material_id: alert.level for alert in db.scalars(select(WarehouseStockAlert))}
+    statuses, _ = _listed(db)
+
+    for row in stock.values():
+        if row.material.safety_stock is not None:
+            assert statuses[row.batch_number] == alerts.get(row.material_id, "OK")
+
+
+@pytest.mark.parametrize(
+    ("status", "batches"),
+    [
+        ("critical", {"hooks-1", "hooks-2", "thread"}),
+        ("LOW", {"laces-1", "laces-2", "needle"}),
+        ("OK", {"cord-1", "cord-2", "button"}),
+    ],
+)
+def test_status_filter_and_total(db, stock, status, batches):
+    statuses, total = _listed(db, status)
+
+    assert set(statuses) == batches
+    assert total == len(batches)
+
+
+def test_unknown_status_is_rejected(db, stock):
+    with pytest.raises(ValueError, match="Unknown stock status"):
+        _listed(db, "EMPTY")
@@ -0,0 +1,131 @@
+"""Stocktake counts reconciled against stock that keeps moving."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from app.models import WarehouseStock, WarehouseStocktakeLine, WarehouseTransaction
+from app.schemas.warehouse import (
+    WarehouseIssueDraft,
+    WarehouseIssueLine,
+    WarehouseReceiptDraft,
+    WarehouseReceiptLine,
+    WarehouseStocktakeCount,
+    WarehouseStocktakeCountBatch,
+    WarehouseStocktakeCreate,
+)
+from app.services.stocktake_service import StocktakeService
+from app.services.valuation_service import StockValuation
+from app.services.warehouse_ledger import WarehouseLedger
+from app.services.warehouse_service import WarehouseService
+
+
+def _receive(db, material, quantity, batch_number="B-1", warehouse_code="WH01"):
+    WarehouseService(db).receipt(
+        WarehouseReceiptDraft(
+            lines=[
+                WarehouseReceiptLine(
+                    materialId=material.material_id,
+                    quantity=quantity,
+                    unit="dm2",
+                    price=10,
+                    warehouseCode=warehouse_code,
+                    batchNumber=batch_number,
+                )
+            ]
+        )
+    )
+    return db.scalars(select(WarehouseStock).where(WarehouseStock.batch_number == batch_number)).one()
+
+
+def _count(db, stocktake, stock, quantity, counted_at=None):
+    return StocktakeService(db).add_counts(
+        stocktake.id,
+        WarehouseStocktakeCountBatch(
+            lines=[WarehouseStocktakeCount(stockId=stock.stock_id, countedQuantity=quantity, countedAt=counted_at)]
+        ),
+    )
+
+
+def _issue(db, stock, quantity):
+    WarehouseService(db).issue(
+        WarehouseIssueDraft(
+            lines=[WarehouseIssueLine(stockId=stock.stock_id, quantity=quantity, unit="dm2", reason="PRODUCTION")]
+        )
+    )
+
+
+def test_movements_after_the_count_are_not_differences(db, material):
+    stock = _receive(db, material(), 20)
+    stocktake = StocktakeService(db).create(WarehouseStocktakeCreate(warehouseCode="WH01", responsible="Ivanov"))
+    _count(db, stocktake, stock, 18)
+    _issue(db, stock, 5)
+
+    service = StocktakeService(db)
+    [line] = service.diff(stocktake.id).lines
+    assert (line.systemQuantity, line.countedQuantity, line.difference) == (20, 18, -2)
+
+    result = service.post(stocktake.id)
+
+    assert (result.countedCount, result.adjustedCount) == (1, 1)
+    db.expire_all()
+    assert db.get(WarehouseStock, stock.stock_id).quantity == Decimal(13)
+    adjustment = db.scalars(
+        select(WarehouseTransaction).where(WarehouseTransaction.document_id == result.documentId)
+    ).one()
+    assert (adjustment.transaction_type, adjustment.quantity) == (WarehouseLedger.ADJUSTMENT, Decimal(-2))
+    assert adjustment.performed_by == "Ivanov"
+    assert StockValuation(db).material_valuation(stock.material_id).quantity == 13
+    assert service.get(stocktake.id).status == StocktakeService.POSTED
+    with pytest.raises(ValueError, match="posted"):
+        service.post(stocktake.id)
+
+
+def test_device_clock_is_not_the_cutoff(db, material):
+    stock = _receive(db, material(), 20)
+    stocktake = StocktakeService(db).create(WarehouseStocktakeCreate(warehouseCode="WH01"))
+    # A scanner an hour ahead would otherwise place the later issue before the count
+    scanned_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    _count(db, stocktake, stock, 18, counted_at=scanned_at)
+    _issue(db, stock, 5)
+
+    [line] = StocktakeService(db).diff(stocktake.id).lines
+
+    assert (line.systemQuantity, line.difference) == (20, -2)
+    counted = db.scalars(select(WarehouseStocktakeLine)).one()
+    assert counted.scanned_at == scanned_at
+    assert counted.counted_at < scanned_at
+
+
+def test_recount_replaces_the_previous_count(db, material):
+    stock = _receive(db, material(), 20)
+    stocktake = StocktakeService(db).create(WarehouseStocktakeCreate(warehouseCode="WH01"))
+    _count(db, stocktake, stock, 15)
+    _count(db, stocktake, stock, 23)
+
+    diff = StocktakeService(db).diff(stocktake.id)
+
+    assert diff.countedCount == 1
+    assert [line.difference for line in diff.lines] == [3]
+    result = StocktakeService(db).post(stocktake.id)
+    db.expire_all()
+    assert db.get(WarehouseStock, stock.stock_id).quantity == Decimal(23)
+    assert StockValuation(db).material_valuation(stock.material_id).quantity == 23
+    assert result.adjustedCount == 1
+
+
+def test_counts_outside_the_stocktake_are_rejected(db, material):
+    leather = material()
+    other_warehouse = _receive(db, leather, 5, batch_number="B-2", warehouse_code="WH02")
+    stock = _receive(db, leather, 20)
+    stocktake = StocktakeService(db).create(WarehouseStocktakeCreate(warehouseCode="WH01"))
+
+    with pytest.raises(ValueError, match="not part of this stocktake"):
+        _count(db, stocktake, other_warehouse, 5)
+    with pytest.raises(ValueError, match="must not be negative"):
+        _count(db, stocktake, stock, -1)
+    assert StocktakeService(db).diff(stocktake.id).countedCount == 0
@@ -0,0 +1,112 @@
+"""FIFO layers and moving average cost kept up to date by movements."""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import WarehouseCostLayer, WarehouseStock
+from app.schemas.warehouse import (
+    WarehouseIssueDraft,
+    WarehouseIssueLine,
+    WarehouseListQuery,
+    WarehouseReceiptDraft,
+    WarehouseReceiptLine,
+)
+from app.services.valuation_service import StockValuation
+from app.services.warehouse_service import WarehouseService
+
+SEED_MIGRATION = Path(__file__).resolve().parents[2] / "database" / "migrations" / "013_warehouse_valuation_seed.sql"
+
+
+def _receive(db, material, quantity, price):
+    WarehouseService(db).receipt(
+        WarehouseReceiptDraft(
+            lines=[
+                WarehouseReceiptLine(
+                    materialId=material.material_id, quantity=quantity, unit="dm2", price=price, warehouseCode="WH01"
+                )
+            ]
+        )
+    )
+
+
+def _issue(db, material, quantity):
+    WarehouseService(db).issue(
+        WarehouseIssueDraft(
+            lines=[
+                WarehouseIssueLine(materialId=material.material_id, quantity=quantity, unit="dm2", reason="PRODUCTION")
+            ]
+        )
+    )
+
+
+def test_issues_consume_the_oldest_layers(db, material):
+    leather = material()
+    _receive(db, leather, 10, 2)
+    _receive(db, leather, 10, 4)
+
+    _issue(db, leather, 15)
+
+    valuation = StockValuation(db).material_valuation(leather.material_id)
+    assert (valuation.quantity, valuation.averageCost) == (5, 3)
+    # 10 @ 2 and 5 @ 4 issued, 5 @ 4 left
+    assert valuation.fifoValue == 20
+    assert StockValuation(db).summary().fifoValue == 20
+
+
+def test_seed_migration_values_stock_received_before_valuation(engine, db, material):
+    legacy = material("LEGACY")
+    tracked = material("TRACKED")
+    db.add_all(
+        [
+            WarehouseStock(material_id=legacy.material_id, warehouse_code="WH01", quantity=10, unit="dm2", purchase_price=3),
+            WarehouseStock(material_id=legacy.material_id, warehouse_code="WH02", quantity=30, unit="dm2", purchase_price=5),
+        ]
+    )
+    db.commit()
+    _receive(db, tracked, 8, 7)
+    db.commit()
+
+    connection = engine.raw_connection()
+    try:
+        connection.autocommit = True
+        for _ in range(2):
+            connection.cursor().execute(SEED_MIGRATION.read_text())
+    finally:
+        connection.close()
+
+    valuation = StockValuation(db)
+    seeded = valuation.material_valuation(legacy.material_id)
+    assert (seeded.quantity, seeded.averageCost, seeded.fifoValue) == (40, 4.5, 180)
+    untouched = valuation.material_valuation(tracked.material_id)
+    assert (untouched.quantity, untouched.fifoValue) == (8, 56)
+    layers = db.scalar(
+        select(func.sum(WarehouseCostLayer.remaining_quantity)).where(
+            WarehouseCostLayer.material_id == legacy.material_id
+        )
+    )
+    assert layers == Decimal(40)
+
+
+def test_stock_rows_are_valued_at_the_fifo_unit_cost(db, material):
+    leather = material()
+    _receive(db, leather, 10, 2)
+    _receive(db, leather, 10, 4)
+    newer = db.scalars(select(WarehouseStock).where(WarehouseStock.purchase_price == 4)).one()
+    # FIFO books the issue at the older cost, whichever batch it is picked from
+    WarehouseService(db).issue(
+        WarehouseIssueDraft(
+            lines=[WarehouseIssueLine(stockId=newer.stock_id, quantity=5, unit="dm2", reason="PRODUCTION")]
+        )
+    )
+
+    service = WarehouseService(db)
+    items = service.list_stock(WarehouseListQuery(pageSize=50)).items
+
+    assert sum(item.totalValue for item in items) == pytest.approx(50)
+    assert StockValuation(db).summary().fifoValue == 50
+    assert service.get_stock(newer.stock_id).totalValue == pytest.approx(50 / 15 * 5)
@@ -0,0 +1,16 @@
+-- Календарь мощностей цехов для планирования производства
+
+CREATE TABLE IF NOT EXISTS workshop_capacity (
+    id SERIAL PRIMARY KEY,
+    workshop VARCHAR NOT NULL,
+    capacity_date DATE,            -- NULL: мощность цеха по умолчанию
+    capacity INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_workshop_capacity_day
+    ON workshop_capacity (workshop, COALESCE(capacity_date, DATE '0001-01-01'));
+CREATE INDEX IF NOT EXISTS ix_workshop_capacity_date ON workshop_capacity (capacity_date);
+
+-- Загрузка по дням и цехам читается одним агрегирующим запросом
+CREATE INDEX IF NOT EXISTS ix_production_schedule_date_workshop
+    ON production_schedule (scheduled_date, workshop);
@@ -0,0 +1,11 @@
+-- Отметки запусков MRP для режима расчёта по изменениям (net change)
+
+CREATE TABLE IF NOT EXISTS mrp_watermarks (
+    run_type VARCHAR PRIMARY KEY,
+    last_run_at TIMESTAMP NOT NULL
+);
+
+-- Поиск изменений с прошлого запуска
+CREATE INDEX IF NOT EXISTS ix_warehouse_stock_updated_at ON warehouse_stock (updated_at);
+CREATE INDEX IF NOT EXISTS ix_specifications_updated_at ON specifications (updated_at);
+CREATE INDEX IF NOT EXISTS ix_production_orders_updated_at ON production_orders (updated_at);
@@ -0,0 +1,16 @@
+-- Консолидация планов закупок и размер партии
+
+ALTER TABLE materials ADD COLUMN IF NOT EXISTS min_order_qty NUMERIC;
+ALTER TABLE materials ADD COLUMN IF NOT EXISTS order_multiplicity NUMERIC;
+
+ALTER TABLE purchase_plan ADD COLUMN IF NOT EXISTS order_qty NUMERIC NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS purchase_plan_order_refs (
+    id SERIAL PRIMARY KEY,
+    purchase_plan_id INTEGER NOT NULL REFERENCES purchase_plan (id) ON DELETE CASCADE,
+    order_number VARCHAR NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_purchase_plan_order_refs_plan ON purchase_plan_order_refs (purchase_plan_id);
+CREATE INDEX IF NOT EXISTS ix_purchase_plan_order_refs_order ON purchase_plan_order_refs (order_number);
+CREATE INDEX IF NOT EXISTS ix_purchase_plan_status_material ON purchase_plan (status, material_id);
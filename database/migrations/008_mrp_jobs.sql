@@ -0,0 +1,25 @@
+-- Очередь фоновых запусков MRP
+
+DO $$ BEGIN
+    CREATE TYPE mrpjobstatus AS ENUM ('QUEUED', 'RUNNING', 'COMPLETED', 'FAILED');
+EXCEPTION
+    WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE TABLE IF NOT EXISTS mrp_jobs (
+    id SERIAL PRIMARY KEY,
+    job_type VARCHAR NOT NULL,
+    params JSON,
+    cache_key VARCHAR NOT NULL,
+    status mrpjobstatus,
+    orders_processed INTEGER NOT NULL DEFAULT 0,
+    materials_netted INTEGER NOT NULL DEFAULT 0,
+    result JSON,
+    error VARCHAR,
+    created_at TIMESTAMP NOT NULL,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_mrp_jobs_job_type ON mrp_jobs (job_type);
+CREATE INDEX IF NOT EXISTS ix_mrp_jobs_cache_key ON mrp_jobs (cache_key, status);
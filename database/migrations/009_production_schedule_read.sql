@@ -0,0 +1,5 @@
+-- Чтение графика производства по диапазону дат без обращения к таблице
+
+CREATE INDEX IF NOT EXISTS ix_production_schedule_read
+    ON production_schedule (scheduled_date, order_id)
+    INCLUDE (workshop, capacity_used, status);
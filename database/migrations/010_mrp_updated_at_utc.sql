@@ -0,0 +1,32 @@
+-- Единые часы для расчёта MRP по изменениям: updated_at в UTC по времени БД
+-- независимо от того, что передал клиент (десктоп, веб, скрипты).
+-- Аргументы триггера - столбцы, изменение которых не считается изменением
+-- строки (результаты самого MRP), иначе каждый запуск находил бы свои же записи.
+
+CREATE OR REPLACE FUNCTION set_updated_at_utc() RETURNS trigger AS $$
+DECLARE
+    ignored TEXT[] := TG_ARGV || ARRAY['updated_at'];
+BEGIN
+    IF TG_OP = 'UPDATE' AND (to_jsonb(NEW) - ignored) = (to_jsonb(OLD) - ignored) THEN
+        NEW.updated_at := OLD.updated_at;
+        RETURN NEW;
+    END IF;
+    NEW.updated_at := timezone('utc', now());
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_warehouse_stock_updated_at ON warehouse_stock;
+CREATE TRIGGER trg_warehouse_stock_updated_at
+    BEFORE INSERT OR UPDATE ON warehouse_stock
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at_utc();
+
+DROP TRIGGER IF EXISTS trg_specifications_updated_at ON specifications;
+CREATE TRIGGER trg_specifications_updated_at
+    BEFORE INSERT OR UPDATE ON specifications
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at_utc();
+
+DROP TRIGGER IF EXISTS trg_production_orders_updated_at ON production_orders;
+CREATE TRIGGER trg_production_orders_updated_at
+    BEFORE INSERT OR UPDATE ON production_orders
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at_utc('material_requirements');
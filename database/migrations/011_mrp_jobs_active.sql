@@ -0,0 +1,16 @@
+-- Не больше одного активного задания MRP на тип и параметры;
+-- сигнал живого воркера для снятия заданий упавших процессов
+
+ALTER TABLE mrp_jobs ADD COLUMN IF NOT EXISTS params_key VARCHAR;
+ALTER TABLE mrp_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+
+-- Задания, начатые до миграции, принадлежат остановленным процессам
+UPDATE mrp_jobs
+SET status = 'FAILED', error = 'Процесс воркера остановлен', finished_at = timezone('utc', now())
+WHERE status IN ('QUEUED', 'RUNNING');
+
+UPDATE mrp_jobs SET params_key = cache_key WHERE params_key IS NULL;
+ALTER TABLE mrp_jobs ALTER COLUMN params_key SET NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_mrp_jobs_active_params
+    ON mrp_jobs (params_key) WHERE status IN ('QUEUED', 'RUNNING');
@@ -0,0 +1,51 @@
+-- Журнал складских движений неизменяем: строки остатков и материалы с
+-- историей движений больше не удаляются каскадом вместе с журналом.
+-- Остатки, появившиеся до ведения журнала, получают начальную запись
+-- OPENING, иначе остаток на дату по журналу не сходится с текущим.
+
+BEGIN;
+
+-- Движения ждут окончания миграции, расхождение не изменится по ходу
+LOCK TABLE warehouse_stock IN EXCLUSIVE MODE;
+
+ALTER TABLE warehouse_transactions DROP CONSTRAINT IF EXISTS warehouse_transactions_stock_id_fkey;
+ALTER TABLE warehouse_transactions ADD CONSTRAINT warehouse_transactions_stock_id_fkey
+    FOREIGN KEY (stock_id) REFERENCES warehouse_stock (stock_id) ON DELETE RESTRICT;
+
+ALTER TABLE warehouse_transactions DROP CONSTRAINT IF EXISTS warehouse_transactions_material_id_fkey;
+ALTER TABLE warehouse_transactions ADD CONSTRAINT warehouse_transactions_material_id_fkey
+    FOREIGN KEY (material_id) REFERENCES materials (material_id) ON DELETE RESTRICT;
+
+-- Начальный остаток = текущий остаток минус сумма движений по журналу;
+-- датируется приходом партии, но не позже первого движения по ней
+INSERT INTO warehouse_transactions (
+    transaction_id, stock_id, material_id, transaction_type, quantity, unit,
+    warehouse_to, reference_type, reason, performed_at
+)
+SELECT
+    gen_random_uuid(),
+    s.stock_id,
+    s.material_id,
+    'OPENING',
+    COALESCE(s.quantity, 0) - COALESCE(l.quantity, 0),
+    s.unit,
+    s.warehouse_code,
+    'OPENING',
+    'OPENING',
+    COALESCE(
+        LEAST(s.receipt_date::timestamp AT TIME ZONE 'UTC', l.first_at - INTERVAL '1 microsecond'),
+        now()
+    )
+FROM warehouse_stock s
+LEFT JOIN (
+    SELECT stock_id, SUM(quantity) AS quantity, MIN(performed_at) AS first_at
+    FROM warehouse_transactions
+    GROUP BY stock_id
+) l ON l.stock_id = s.stock_id
+WHERE COALESCE(s.quantity, 0) <> COALESCE(l.quantity, 0)
+  AND NOT EXISTS (
+      SELECT 1 FROM warehouse_transactions o
+      WHERE o.stock_id = s.stock_id AND o.transaction_type = 'OPENING'
+  );
+
+COMMIT;
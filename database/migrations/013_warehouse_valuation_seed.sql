@@ -0,0 +1,56 @@
+-- Начальная оценка склада: FIFO-слои и средняя себестоимость для остатков,
+-- поступивших до учёта стоимости. Однократная миграция данных: материалы,
+-- уже оцениваемые бэкендом, не затрагиваются, повторный запуск ничего не меняет.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS warehouse_cost_layers (
+    layer_id UUID PRIMARY KEY,
+    material_id UUID NOT NULL REFERENCES materials (material_id) ON DELETE CASCADE,
+    stock_id UUID REFERENCES warehouse_stock (stock_id) ON DELETE SET NULL,
+    document_id UUID,
+    received_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    quantity NUMERIC(15, 3) NOT NULL,
+    remaining_quantity NUMERIC(15, 3) NOT NULL,
+    unit_cost NUMERIC(14, 4) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_warehouse_cost_layers_open
+    ON warehouse_cost_layers (material_id, received_at, layer_id) WHERE remaining_quantity > 0;
+
+CREATE TABLE IF NOT EXISTS warehouse_material_valuations (
+    material_id UUID PRIMARY KEY REFERENCES materials (material_id) ON DELETE CASCADE,
+    quantity NUMERIC(15, 3) NOT NULL,
+    average_cost NUMERIC(14, 4) NOT NULL,
+    fifo_value NUMERIC(18, 4) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- Приходы и списания ждут окончания миграции
+LOCK TABLE warehouse_stock IN EXCLUSIVE MODE;
+LOCK TABLE warehouse_material_valuations IN EXCLUSIVE MODE;
+
+-- Один слой на партию по цене закупки
+INSERT INTO warehouse_cost_layers (layer_id, material_id, stock_id, received_at, quantity, remaining_quantity, unit_cost)
+SELECT
+    gen_random_uuid(),
+    s.material_id,
+    s.stock_id,
+    COALESCE(s.receipt_date::timestamp AT TIME ZONE 'UTC', s.updated_at),
+    s.quantity,
+    s.quantity,
+    COALESCE(s.purchase_price, 0)
+FROM warehouse_stock s
+WHERE s.quantity > 0
+  AND NOT EXISTS (SELECT 1 FROM warehouse_material_valuations v WHERE v.material_id = s.material_id);
+
+INSERT INTO warehouse_material_valuations (material_id, quantity, average_cost, fifo_value)
+SELECT
+    l.material_id,
+    SUM(l.remaining_quantity),
+    SUM(l.remaining_quantity * l.unit_cost) / SUM(l.remaining_quantity),
+    SUM(l.remaining_quantity * l.unit_cost)
+FROM warehouse_cost_layers l
+WHERE NOT EXISTS (SELECT 1 FROM warehouse_material_valuations v WHERE v.material_id = l.material_id)
+GROUP BY l.material_id;
+
+COMMIT;
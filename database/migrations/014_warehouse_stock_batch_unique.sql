@@ -0,0 +1,86 @@
+-- Одна строка остатка на партию, склад и материал. Дубликаты, накопленные
+-- до уникального индекса, сливаются в одну строку: количество и резерв
+-- складываются, журнал, резервы, слои стоимости, снимки остатков и строки
+-- инвентаризаций переносятся на оставшуюся строку. Повторный запуск ничего не меняет.
+
+BEGIN;
+
+-- Движения ждут окончания миграции
+LOCK TABLE warehouse_stock IN EXCLUSIVE MODE;
+
+-- Остаётся самая ранняя по приходу строка партии
+CREATE TEMPORARY TABLE stock_batch_merge ON COMMIT DROP AS
+SELECT stock_id, survivor_id
+FROM (
+    SELECT
+        stock_id,
+        FIRST_VALUE(stock_id) OVER (
+            PARTITION BY batch_number, warehouse_code, material_id
+            ORDER BY receipt_date NULLS LAST, stock_id
+        ) AS survivor_id
+    FROM warehouse_stock
+    WHERE batch_number IS NOT NULL
+) ranked
+WHERE stock_id <> survivor_id;
+
+UPDATE warehouse_stock s
+SET quantity = COALESCE(s.quantity, 0) + d.quantity,
+    reserved_quantity = COALESCE(s.reserved_quantity, 0) + d.reserved_quantity,
+    purchase_price = COALESCE(s.purchase_price, d.purchase_price),
+    receipt_date = LEAST(s.receipt_date, d.receipt_date),
+    expiry_date = LEAST(s.expiry_date, d.expiry_date),
+    last_receipt_date = GREATEST(s.last_receipt_date, d.last_receipt_date),
+    last_issue_date = GREATEST(s.last_issue_date, d.last_issue_date),
+    updated_at = now()
+FROM (
+    SELECT
+        m.survivor_id,
+        SUM(COALESCE(x.quantity, 0)) AS quantity,
+        SUM(COALESCE(x.reserved_quantity, 0)) AS reserved_quantity,
+        MAX(x.purchase_price) AS purchase_price,
+        MIN(x.receipt_date) AS receipt_date,
+        MIN(x.expiry_date) AS expiry_date,
+        MAX(x.last_receipt_date) AS last_receipt_date,
+        MAX(x.last_issue_date) AS last_issue_date
+    FROM stock_batch_merge m
+    JOIN warehouse_stock x ON x.stock_id = m.stock_id
+    GROUP BY m.survivor_id
+) d
+WHERE s.stock_id = d.survivor_id;
+
+-- Остаток строки по журналу и снимкам считается суммой по stock_id,
+-- поэтому записи достаточно перенести
+UPDATE warehouse_transactions t SET stock_id = m.survivor_id
+FROM stock_batch_merge m WHERE t.stock_id = m.stock_id;
+
+UPDATE warehouse_balance_snapshots b SET stock_id = m.survivor_id
+FROM stock_batch_merge m WHERE b.stock_id = m.stock_id;
+
+UPDATE warehouse_reservations r SET stock_id = m.survivor_id
+FROM stock_batch_merge m WHERE r.stock_id = m.stock_id;
+
+UPDATE warehouse_cost_layers l SET stock_id = m.survivor_id
+FROM stock_batch_merge m WHERE l.stock_id = m.stock_id;
+
+-- Пересчёты строк одной партии в одной инвентаризации складываются
+INSERT INTO warehouse_stocktake_lines (stocktake_id, stock_id, counted_quantity, counted_at)
+SELECT l.stocktake_id, g.survivor_id, SUM(l.counted_quantity), MAX(l.counted_at)
+FROM warehouse_stocktake_lines l
+JOIN (
+    SELECT stock_id, survivor_id FROM stock_batch_merge
+    UNION
+    SELECT survivor_id, survivor_id FROM stock_batch_merge
+) g ON g.stock_id = l.stock_id
+GROUP BY l.stocktake_id, g.survivor_id
+ON CONFLICT (stocktake_id, stock_id) DO UPDATE
+SET counted_quantity = EXCLUDED.counted_quantity,
+    counted_at = EXCLUDED.counted_at;
+
+DELETE FROM warehouse_stock s
+USING stock_batch_merge m
+WHERE s.stock_id = m.stock_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_warehouse_stock_batch
+    ON warehouse_stock (batch_number, warehouse_code, material_id);
+
+COMMIT;
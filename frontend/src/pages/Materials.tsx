@@ -303,7 +303,7 @@ const Materials: React.FC = () => {
             pagination={{
               current: filters.page,
               pageSize: filters.pageSize,
-              total: data.total,
+              total: data.total ?? undefined,
               showSizeChanger: true,
               onChange: (page, pageSize) =>
                 setFilters((prev) => ({ ...prev, page, pageSize: pageSize ?? prev.pageSize })),
@@ -350,7 +350,7 @@ const Models: React.FC = () => {
             pagination={{
               current: filters.page,
               pageSize: filters.pageSize,
-              total: data.total,
+              total: data.total ?? undefined,
               showSizeChanger: true,
               onChange: handleTableChange,
               onShowSizeChange: handleTableChange,
@@ -252,7 +252,7 @@ const Warehouse: React.FC = () => {
             pagination={{
               current: filters.page,
               pageSize: filters.pageSize,
-              total: data.total,
+              total: data.total ?? undefined,
               onChange: (page, pageSize) =>
                 setFilters((prev) => ({ ...prev, page, pageSize: pageSize ?? prev.pageSize })),
             }}
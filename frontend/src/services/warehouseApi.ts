@@ -5,6 +5,7 @@ import {
   WarehouseListResult,
   WarehouseReceiptDraft,
   WarehouseIssueDraft,
+  WarehouseAvailabilityResult,
 } from '../types';
 
 const notImplemented = (operation: string): never => {
@@ -34,6 +35,11 @@ export const warehouseApi = {
     await apiClient.post('/warehouse/issue', draft);
   },
 
+  async availability(materialIds: string[]): Promise<WarehouseAvailabilityResult> {
+    const response = await apiClient.post('/warehouse/availability', { materialIds });
+    return response.data;
+  },
+
   async inventory(): Promise<never> {
     return notImplemented('inventory');
   },
@@ -64,9 +64,12 @@ export interface KPIBlock {
 
 export interface PaginatedResult<T> {
   items: T[];
-  total: number;
+  /** Null in cursor mode unless totalMode is requested */
+  total?: number | null;
   page: number;
   pageSize: number;
+  nextCursor?: string | null;
+  totalIsApproximate?: boolean;
 }
 
 export interface ListQuery {
@@ -74,4 +77,7 @@ export interface ListQuery {
   pageSize?: number;
   search?: string;
   filters?: Record<string, unknown>;
+  pagination?: 'offset' | 'cursor';
+  cursor?: string;
+  totalMode?: 'none' | 'approximate' | 'exact';
 }
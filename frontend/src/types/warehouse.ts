@@ -65,7 +65,9 @@ export interface WarehouseReceiptDraft {
 }
 
 export interface WarehouseIssueLine {
-  stockId: string;
+  stockId?: string;
+  materialId?: string;
+  warehouseCode?: string;
   quantity: number;
   unit: UnitOfMeasure;
   reason: string;
@@ -74,9 +76,24 @@ export interface WarehouseIssueLine {
 }
 
 export interface WarehouseIssueDraft {
+  allowPartial?: boolean;
   lines: WarehouseIssueLine[];
 }
 
+export interface WarehouseAvailabilityItem {
+  materialId: string;
+  code: string;
+  name: string;
+  unit: UnitOfMeasure;
+  quantity: number;
+  reservedQuantity: number;
+  availableQuantity: number;
+}
+
+export interface WarehouseAvailabilityResult {
+  items: WarehouseAvailabilityItem[];
+}
+
 export interface WarehouseInventoryLine {
   stockId: string;
   systemQuantity: number;
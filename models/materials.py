@@ -33,6 +33,8 @@ class Material(Base, table=True):
     # Поставщик
     supplier_name: Optional[str] = Field(default=None)
     lead_time_days: Optional[int] = Field(default=None)
+    min_order_qty: Optional[Decimal] = Field(default=None)
+    order_multiplicity: Optional[Decimal] = Field(default=None)
     
     # Складские параметры
     safety_stock: Optional[Decimal] = Field(default=None)
@@ -1,8 +1,9 @@
 # krai_system/models/mrp.py
+from sqlalchemy import Index, text
 from sqlmodel import Field, Column, JSON, Enum, SQLModel
 from typing import Optional, Dict, Any, List
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime
 from enum import Enum as PyEnum
 
 class ScheduleStatus(PyEnum):
@@ -41,6 +42,7 @@ class PurchasePlan(SQLModel, table=True):
     required_qty: Decimal = Field(default=Decimal(0))
     available_qty: Decimal = Field(default=Decimal(0))
     deficit_qty: Decimal = Field(default=Decimal(0))
+    order_qty: Decimal = Field(default=Decimal(0), description="Количество к закупке с учётом партии")
     order_refs: List[str] = Field(
         default=[],
         sa_column=Column(JSON),
@@ -52,4 +54,77 @@ class PurchasePlan(SQLModel, table=True):
         default=PurchaseStatus.PENDING,
         sa_column=Column(Enum(PurchaseStatus))
     )
-    notes: Optional[str] = Field(default=None)
\ No newline at end of file
+    notes: Optional[str] = Field(default=None)
+
+class WorkshopCapacity(SQLModel, table=True):
+    """Календарь мощностей цехов
+
+    Строка без даты задаёт мощность цеха по умолчанию,
+    строка с датой — мощность цеха на конкретный день.
+    """
+    __tablename__ = "workshop_capacity"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    workshop: str = Field(index=True)
+    capacity_date: Optional[date] = Field(default=None, index=True)
+    capacity: int = Field(default=0)
+
+
+class MRPWatermark(SQLModel, table=True):
+    """Отметка последнего запуска MRP для расчёта по изменениям"""
+    __tablename__ = "mrp_watermarks"
+
+    run_type: str = Field(primary_key=True)
+    last_run_at: datetime
+
+
+class PurchasePlanOrderRef(SQLModel, table=True):
+    """Ссылки на заказы в плане закупок"""
+    __tablename__ = "purchase_plan_order_refs"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    purchase_plan_id: int = Field(foreign_key="purchase_plan.id", index=True)
+    order_number: str = Field(index=True)
+
+
+class MRPJobStatus(PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class MRPJob(SQLModel, table=True):
+    """Фоновый запуск MRP
+
+    Таблица служит очередью заданий: воркер забирает задание условным UPDATE
+    по статусу, а результат завершённого задания переиспользуется для
+    запросов с тем же ключом входных данных. Частичный уникальный индекс
+    допускает не больше одного активного задания на тип и параметры.
+    """
+    __tablename__ = "mrp_jobs"
+    __table_args__ = (
+        Index(
+            "uq_mrp_jobs_active_params", "params_key", unique=True,
+            postgresql_where=text("status IN ('QUEUED', 'RUNNING')"),
+            sqlite_where=text("status IN ('QUEUED', 'RUNNING')"),
+        ),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_type: str = Field(index=True)
+    params: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    cache_key: str = Field(index=True, description="Хэш типа задания, параметров и отметок входных данных")
+    params_key: str = Field(description="Хэш типа задания и параметров")
+    status: MRPJobStatus = Field(
+        default=MRPJobStatus.QUEUED,
+        sa_column=Column(Enum(MRPJobStatus))
+    )
+    orders_processed: int = Field(default=0)
+    materials_netted: int = Field(default=0)
+    result: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = Field(default=None)
+    heartbeat_at: Optional[datetime] = Field(default=None, description="Последний сигнал живого воркера")
+    finished_at: Optional[datetime] = Field(default=None)
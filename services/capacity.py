@@ -0,0 +1,107 @@
+# krai_system/services/capacity.py
+"""Календарь производственных мощностей цехов"""
+from typing import Dict, Optional
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..models.mrp import ProductionSchedule, WorkshopCapacity
+
+
+class CapacityCalendar:
+    """Мощность и загрузка цехов по дням в памяти
+
+    Загружается двумя запросами, дальше поиск свободного дня и резервирование
+    выполняются над массивами numpy без обращения к БД.
+    """
+
+    DEFAULT_WORKSHOP = "Основной цех"
+
+    def __init__(self, start: date, horizon_days: int, default_capacity: int):
+        self.start = start
+        self.horizon_days = horizon_days
+        self.default_capacity = default_capacity
+        self._workshop_defaults: Dict[str, int] = {}
+        self._overrides: Dict[str, Dict[int, int]] = {}
+        self._capacity: Dict[str, np.ndarray] = {}
+        self._used: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, session: Session, start: date, horizon_days: int,
+             default_capacity: int) -> "CapacityCalendar":
+        """Загрузить мощности и текущую загрузку цехов на горизонт планирования"""
+        calendar = cls(start, horizon_days, default_capacity)
+        end = start + timedelta(days=horizon_days - 1)
+
+        capacities = session.exec(
+            select(WorkshopCapacity).where(
+                (WorkshopCapacity.capacity_date == None)  # noqa: E711
+                | WorkshopCapacity.capacity_date.between(start, end)
+            )
+        ).all()
+        for row in capacities:
+            if row.capacity_date is None:
+                calendar._workshop_defaults[row.workshop] = row.capacity
+            else:
+                calendar._overrides.setdefault(row.workshop, {})[
+                    (row.capacity_date - start).days
+                ] = row.capacity
+
+        used = session.exec(
+            select(
+                ProductionSchedule.workshop,
+                ProductionSchedule.scheduled_date,
+                func.sum(ProductionSchedule.capacity_used)
+            )
+            .where(ProductionSchedule.scheduled_date.between(start, end))
+            .group_by(ProductionSchedule.workshop, ProductionSchedule.scheduled_date)
+        ).all()
+        for workshop, scheduled_date, capacity_used in used:
+            calendar._ensure(workshop or cls.DEFAULT_WORKSHOP)
+            calendar._used[workshop or cls.DEFAULT_WORKSHOP][(scheduled_date - start).days] += capacity_used
+
+        return calendar
+
+    def _ensure(self, workshop: str) -> None:
+        if workshop in self._capacity:
+            return
+        capacity = np.full(
+            self.horizon_days,
+            self._workshop_defaults.get(workshop, self.default_capacity),
+            dtype=np.int64
+        )
+        for day_index, value in self._overrides.get(workshop, {}).items():
+            capacity[day_index] = value
+        self._capacity[workshop] = capacity
+        self._used[workshop] = np.zeros(self.horizon_days, dtype=np.int64)
+
+    def capacity(self, workshop: str) -> np.ndarray:
+        """Мощность цеха по дням горизонта"""
+        self._ensure(workshop)
+        return self._capacity[workshop]
+
+    def free(self, workshop: str) -> np.ndarray:
+        """Свободная мощность цеха по дням горизонта"""
+        self._ensure(workshop)
+        return self._capacity[workshop] - self._used[workshop]
+
+    def first_fit(self, workshop: str, capacity_needed: int,
+                  earliest: Optional[date] = None) -> Optional[date]:
+        """Первый день не раньше ``earliest`` со свободной мощностью под заказ"""
+        offset = max(0, (earliest - self.start).days) if earliest else 0
+        if offset >= self.horizon_days:
+            return None
+
+        candidates = np.flatnonzero(self.free(workshop)[offset:] >= capacity_needed)
+        if candidates.size == 0:
+            return None
+        return self.start + timedelta(days=int(candidates[0]) + offset)
+
+    def reserve(self, workshop: str, day: date, capacity: int) -> None:
+        """Учесть загрузку дня (дни за горизонтом не отслеживаются)"""
+        day_index = (day - self.start).days
+        if 0 <= day_index < self.horizon_days:
+            self._ensure(workshop)
+            self._used[workshop][day_index] += capacity
@@ -1,5 +1,6 @@
 # krai_system/services/database.py
 import os
+from datetime import datetime
 from sqlmodel import create_engine, Session, select
 from typing import Optional, List, Type, TypeVar
 from ..models.base import Base
@@ -51,6 +52,10 @@ class DatabaseService:
     @staticmethod
     def update(instance: T) -> T:
         """Обновить запись"""
+        # Отметка изменения нужна расчёту MRP по изменениям
+        if hasattr(instance, "updated_at"):
+            instance.updated_at = datetime.utcnow()
+
         with Session(engine) as session:
             # Используем merge для обработки отсоединенных объектов
             merged_instance = session.merge(instance)
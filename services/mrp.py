@@ -1,19 +1,104 @@
 # krai_system/services/mrp.py
-from typing import Dict, List, Optional, Any
+import heapq
+import math
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Any, Set, Tuple
 from datetime import date, datetime, timedelta
 from decimal import Decimal
+import numpy as np
+from sqlalchemy import delete, func, insert, update
 from sqlmodel import Session, select
-from ..models.production_orders import ProductionOrder
-from ..models.mrp import ProductionSchedule, PurchasePlan, ScheduleStatus, PurchaseStatus
+from ..models.production_orders import ProductionOrder, OrderStatus
+from ..models.mrp import (
+    MRPWatermark, ProductionSchedule, PurchasePlan, PurchasePlanOrderRef, ScheduleStatus, PurchaseStatus
+)
 from ..models.materials import Material
 from ..models.warehouse import WarehouseStock
 from ..models.specifications import Specification
+from .capacity import CapacityCalendar
 from .database import DatabaseService, engine
+from .mrp_engine import (
+    BomMatrix, ExplosionResult, OrderDemand, PurchaseNeed, explode_orders, lot_size, time_phased_netting
+)
+from .warehouse import WarehouseService
+
+class ScheduleRow(NamedTuple):
+    """Строка графика производства для чтения (доски планирования)"""
+    date: date
+    order_number: str
+    capacity_used: int
+    workshop: Optional[str]
+    status: str
+
+
+# Колбэк прогресса расчёта: (обработано заказов, рассчитано материалов)
+ProgressCallback = Callable[[int, int], None]
 
 class MRPService:
     """Сервис планирования производства и закупок"""
 
-    DAILY_CAPACITY = 150  # Максимальная мощность производства в день
+    DAILY_CAPACITY = 150  # Мощность цеха в день, если не задана в workshop_capacity
+    SCHEDULING_HORIZON_DAYS = 30  # Горизонт поиска свободной даты
+    PLANNING_HORIZON_DAYS = 90  # Горизонт нетто-расчёта по дням
+    DEFAULT_LEAD_TIME_DAYS = 7  # Срок поставки, если не задан у материала
+    LEATHER_USAGE_PER_PAIR = 2  # примерный расход кожи на пару
+    SOLE_USAGE_PER_PAIR = 1
+
+    NET_CHANGE_RUN = "net_change"  # Ключ отметки для расчёта по изменениям
+    # Перекрытие окна изменений: транзакции, начатые до запуска и зафиксированные
+    # после него, и расхождение часов клиентов. Повторный разбор идемпотентен.
+    NET_CHANGE_OVERLAP = timedelta(minutes=5)
+
+    # Заказы, участвующие в планировании
+    OPEN_ORDER_STATUSES = (OrderStatus.DRAFT, OrderStatus.CONFIRMED, OrderStatus.IN_PRODUCTION)
+
+    @staticmethod
+    def _specification_bom(spec: Specification) -> Dict[str, float]:
+        """Нормы расхода материалов на пару из спецификации
+
+        Материалы с количеством в спецификации есть только в разделе
+        фурнитуры: детали кроя ссылаются на справочник деталей, а кожа и
+        подошва выбираются в заказе.
+        """
+        bom: Dict[str, float] = {}
+
+        for item in spec.hardware or []:
+            mat_id = item.get("material_id")
+            if mat_id:
+                bom[str(mat_id)] = bom.get(str(mat_id), 0) + float(item.get("quantity") or 0)
+
+        return bom
+
+    @staticmethod
+    def _order_demand(order: ProductionOrder) -> OrderDemand:
+        """Спрос заказа для матричного разузлования"""
+        direct_usage: Dict[str, float] = {}
+        if order.leather_material_id:
+            direct_usage[str(order.leather_material_id)] = MRPService.LEATHER_USAGE_PER_PAIR
+        if order.sole_material_id:
+            key = str(order.sole_material_id)
+            direct_usage[key] = direct_usage.get(key, 0) + MRPService.SOLE_USAGE_PER_PAIR
+
+        return OrderDemand(
+            order_key=order.order_number,
+            specification_id=order.specification_id,
+            pairs=order.total_pairs,
+            direct_usage=direct_usage
+        )
+
+    @staticmethod
+    def _load_open_orders(session: Session) -> List[ProductionOrder]:
+        """Открытые заказы одним запросом"""
+        return session.exec(
+            select(ProductionOrder).where(
+                ProductionOrder.status.in_(MRPService.OPEN_ORDER_STATUSES)
+            )
+        ).all()
+
+    @staticmethod
+    def get_open_orders() -> List[ProductionOrder]:
+        """Получить открытые заказы"""
+        with Session(engine) as session:
+            return MRPService._load_open_orders(session)
 
     @staticmethod
     def calculate_material_requirements(order: ProductionOrder) -> Dict[str, Any]:
@@ -24,52 +109,475 @@ class MRPService:
         if order.specification_id:
             with Session(engine) as session:
                 spec = session.get(Specification, order.specification_id)
-                if spec and spec.materials:
-                    for mat_id, qty in spec.materials.items():
-                        requirements[mat_id] = float(qty) * order.total_pairs
+                if spec:
+                    for mat_id, qty in MRPService._specification_bom(spec).items():
+                        requirements[mat_id] = qty * order.total_pairs
 
         # Добавляем выбранные материалы (кожа и подошва)
-        if order.leather_material_id:
-            requirements[str(order.leather_material_id)] = requirements.get(
-                str(order.leather_material_id), 0
-            ) + order.total_pairs * 2  # примерный расход кожи
-
-        if order.sole_material_id:
-            requirements[str(order.sole_material_id)] = requirements.get(
-                str(order.sole_material_id), 0
-            ) + order.total_pairs
+        for mat_id, per_pair in MRPService._order_demand(order).direct_usage.items():
+            requirements[mat_id] = requirements.get(mat_id, 0) + order.total_pairs * per_pair
 
         return requirements
 
     @staticmethod
-    def check_material_availability(requirements: Dict[str, float]) -> Dict[str, Any]:
-        """Проверить доступность материалов на складе"""
-        availability = {}
+    def run_batch(orders: Optional[List[ProductionOrder]] = None, persist: bool = True,
+                  progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Пакетный расчёт потребностей по всему портфелю заказов
+
+        Все заказы и спецификации читаются одним запросом каждый, а потребности
+        считаются одним произведением разреженной матрицы норм на вектор спроса.
+        Без ``orders`` берутся все открытые заказы.
+        """
+        with Session(engine) as session:
+            if orders is None:
+                orders = MRPService._load_open_orders(session)
+
+            explosion, specs_count = MRPService._explode(session, orders)
+            if progress:
+                progress(len(orders), 0)
+            requirements = {
+                order.order_number: explosion.order_requirements(j)
+                for j, order in enumerate(orders)
+            }
+
+            if persist and orders:
+                MRPService._save_requirements(session, orders, requirements)
+                session.commit()
+
+        return {
+            "orders_count": len(orders),
+            "specifications_count": specs_count,
+            "requirements": requirements,
+            "gross_requirements": explosion.gross_requirements()
+        }
+
+    @staticmethod
+    def _explode(session: Session, orders: List[ProductionOrder]) -> Tuple[ExplosionResult, int]:
+        """Разузловать заказы, загрузив их спецификации одним запросом"""
+        spec_ids = {order.specification_id for order in orders if order.specification_id}
+        specs = session.exec(
+            select(Specification).where(Specification.id.in_(spec_ids))
+        ).all() if spec_ids else []
+
+        bom = BomMatrix.from_items({spec.id: MRPService._specification_bom(spec) for spec in specs})
+        return explode_orders(bom, [MRPService._order_demand(order) for order in orders]), len(specs)
+
+    @staticmethod
+    def _save_requirements(session: Session, orders: List[ProductionOrder],
+                           requirements: Dict[str, Dict[str, float]]) -> None:
+        """Записать потребности заказов одним пакетным UPDATE"""
+        if not orders:
+            return
+        session.execute(
+            update(ProductionOrder),
+            [
+                {"id": order.id, "material_requirements": requirements[order.order_number]}
+                for order in orders
+            ]
+        )
+
+    @staticmethod
+    def run_net_change(persist: bool = True,
+                       progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Расчёт MRP по изменениям с прошлого запуска (net change)
+
+        Изменения определяются по ``updated_at`` складских остатков,
+        спецификаций и заказов относительно отметки прошлого запуска.
+        Заново разузловываются только затронутые заказы, а потребности и
+        планы закупок пересчитываются только по затронутым материалам.
+        Первый запуск (без отметки) пересчитывает весь портфель. Без
+        ``persist`` расчёт откатывается: ни потребности, ни планы закупок,
+        ни отметка запуска не сохраняются.
+
+        Все отметки времени в UTC: ``updated_at`` этих таблиц выставляет
+        триггер БД (миграция 010), отметка запуска берётся по UTC, а окно
+        изменений начинается раньше отметки на ``NET_CHANGE_OVERLAP``.
+        """
+        run_started = datetime.utcnow()
 
         with Session(engine) as session:
-            for mat_id, required_qty in requirements.items():
-                # Получаем материал
-                material = session.get(Material, int(mat_id))
-                if not material:
-                    continue
-
-                # Получаем складские остатки
-                statement = select(WarehouseStock).where(
-                    WarehouseStock.material_id == int(mat_id)
-                )
-                stocks = session.exec(statement).all()
-                available_qty = sum(float(stock.quantity) for stock in stocks)
-
-                availability[mat_id] = {
-                    "material_name": material.name,
-                    "required": required_qty,
-                    "available": available_qty,
-                    "deficit": max(0, required_qty - available_qty),
-                    "supplier": material.supplier_name
+            watermark = session.get(MRPWatermark, MRPService.NET_CHANGE_RUN)
+            since = watermark.last_run_at - MRPService.NET_CHANGE_OVERLAP if watermark else None
+
+            if since is None:
+                changed_materials: Set[str] = set()
+                changed_specs: Set[int] = set()
+                affected_orders = MRPService._load_open_orders(session)
+                changed_orders = affected_orders
+            else:
+                changed_materials = {
+                    str(mat_id) for mat_id in session.exec(
+                        select(WarehouseStock.material_id)
+                        .where(WarehouseStock.updated_at > since)
+                        .distinct()
+                    ).all()
                 }
+                changed_specs = set(session.exec(
+                    select(Specification.id).where(Specification.updated_at > since)
+                ).all())
+                changed_orders = session.exec(
+                    select(ProductionOrder).where(
+                        (ProductionOrder.updated_at > since)
+                        | ProductionOrder.specification_id.in_(changed_specs)
+                    )
+                ).all()
+                affected_orders = [
+                    order for order in changed_orders
+                    if order.status in MRPService.OPEN_ORDER_STATUSES
+                ]
+
+            # Материалы, чьи потребности могли измениться: старые и новые строки заказов
+            affected_materials = set(changed_materials)
+            for order in changed_orders:
+                affected_materials.update(order.material_requirements or {})
+
+            explosion, _ = MRPService._explode(session, affected_orders)
+            if progress:
+                progress(len(affected_orders), 0)
+            requirements = {
+                order.order_number: explosion.order_requirements(j)
+                for j, order in enumerate(affected_orders)
+            }
+            for order_requirements in requirements.values():
+                affected_materials.update(order_requirements)
+
+            # Закрытые заказы больше не формируют потребность
+            closed_orders = [
+                order for order in changed_orders
+                if order.status not in MRPService.OPEN_ORDER_STATUSES and order.material_requirements
+            ]
+            for order in closed_orders:
+                requirements[order.order_number] = {}
+
+            MRPService._save_requirements(session, affected_orders + closed_orders, requirements)
+            session.flush()
+
+            purchase_plans = MRPService._renet_materials(session, affected_materials)
+
+            if persist:
+                if watermark is None:
+                    watermark = MRPWatermark(run_type=MRPService.NET_CHANGE_RUN, last_run_at=run_started)
+                watermark.last_run_at = run_started
+                session.add(watermark)
+                session.commit()
+            else:
+                session.rollback()
+            if progress:
+                progress(len(affected_orders), len(affected_materials))
+
+            return {
+                "since": since,
+                "changed_materials": sorted(changed_materials),
+                "changed_specifications": sorted(changed_specs),
+                "changed_orders": [order.order_number for order in changed_orders],
+                "affected_materials": sorted(affected_materials),
+                "purchase_plans": len(purchase_plans)
+            }
+
+    @staticmethod
+    def _renet_materials(session: Session, material_ids: Set[str]) -> List[PurchasePlan]:
+        """Пересчитать нетто-потребность и план закупок по набору материалов
+
+        Валовая потребность собирается из сохранённых потребностей открытых
+        заказов, незакрытые ожидающие планы по этим материалам заменяются.
+        """
+        if not material_ids:
+            return []
+
+        gross: Dict[str, float] = {}
+        order_refs: Dict[str, List[str]] = {}
+        need_dates: Dict[str, date] = {}
+        rows = session.exec(
+            select(
+                ProductionOrder.order_number,
+                ProductionOrder.material_requirements,
+                ProductionOrder.planned_start_date,
+                ProductionOrder.due_date
+            ).where(
+                ProductionOrder.status.in_(MRPService.OPEN_ORDER_STATUSES)
+            )
+        ).all()
+        for order_number, order_requirements, planned_start_date, due_date in rows:
+            need_date = planned_start_date or due_date
+            for mat_id, qty in (order_requirements or {}).items():
+                if mat_id in material_ids and qty:
+                    gross[mat_id] = gross.get(mat_id, 0) + float(qty)
+                    order_refs.setdefault(mat_id, []).append(order_number)
+                    if need_date and (mat_id not in need_dates or need_date < need_dates[mat_id]):
+                        need_dates[mat_id] = need_date
+
+        ordered_rows = session.exec(
+            select(PurchasePlan.material_id, func.sum(MRPService._ordered_quantity()))
+            .where(
+                PurchasePlan.status == PurchaseStatus.ORDERED,
+                PurchasePlan.material_id.in_([int(mat_id) for mat_id in material_ids])
+            )
+            .group_by(PurchasePlan.material_id)
+        ).all()
+        on_order = {str(mat_id): float(qty or 0) for mat_id, qty in ordered_rows}
+
+        MRPService._delete_pending_plans(session, material_ids)
+
+        stock = WarehouseService.get_bulk_availability(material_ids)
+        needs = []
+        for mat_id, required in gross.items():
+            info = stock.get(int(mat_id))
+            if not info:
+                continue
+            needs.append(MRPService._purchase_need(
+                int(mat_id), info, order_refs[mat_id], required,
+                info["available"] + on_order.get(mat_id, 0), need_dates.get(mat_id)
+            ))
+
+        return MRPService._consolidate_purchase_plans(session, needs, notes="Net change MRP")
+
+    @staticmethod
+    def _ordered_quantity():
+        """Количество заказанной закупки: партия с учётом кратности, для старых планов - дефицит"""
+        return func.coalesce(PurchasePlan.order_qty, PurchasePlan.deficit_qty)
+
+    @staticmethod
+    def _purchase_need(material_id: int, info: Dict[str, Any], order_numbers: List[str],
+                       required: float, available: float, need_date: Optional[date]) -> PurchaseNeed:
+        """Дефицит материала по данным складской доступности"""
+        return PurchaseNeed(
+            material_id=material_id,
+            material_name=info["material_name"],
+            supplier=info["supplier"],
+            order_numbers=tuple(order_numbers),
+            required=required,
+            available=available,
+            need_date=need_date,
+            lead_time_days=info.get("lead_time_days"),
+            min_order_qty=info.get("min_order_qty", 0.0),
+            order_multiplicity=info.get("order_multiplicity", 0.0)
+        )
+
+    @staticmethod
+    def _consolidate_purchase_plans(session: Session, needs: List[PurchaseNeed],
+                                    notes: Optional[str] = None) -> List[PurchasePlan]:
+        """Свести дефициты в планы закупок по материалу и поставщику
+
+        Потребности одного материала и поставщика объединяются между собой и
+        с уже ожидающим планом, к итоговому дефициту применяются минимальная
+        партия и кратность заказа. Несколько ожидающих планов одного ключа
+        (например, по дням после нетто-расчёта по дням) сливаются в план с
+        самой ранней датой, остальные удаляются. Валовая потребность
+        ожидающего плана собирается заново по объединённому набору его
+        заказов: заказ из ``needs`` входит новой потребностью, остальные -
+        сохранённой, так что повторная обработка заказа не удваивает его
+        спрос. Новые планы и ссылки на заказы пишутся пакетными INSERT.
+        """
+        if not needs:
+            return []
+
+        merged: Dict[Tuple[int, Optional[str]], Dict[str, Any]] = {}
+        for need in needs:
+            entry = merged.setdefault((need.material_id, need.supplier), {
+                "need": need, "required": 0.0, "orders": {}, "need_date": None
+            })
+            entry["required"] += need.required
+            entry["orders"].update(dict.fromkeys(need.order_numbers))
+            if need.need_date and (entry["need_date"] is None or need.need_date < entry["need_date"]):
+                entry["need_date"] = need.need_date
+
+        pending: Dict[Tuple[int, Optional[str]], List[PurchasePlan]] = {}
+        for plan in session.exec(
+            select(PurchasePlan).where(
+                PurchasePlan.status == PurchaseStatus.PENDING,
+                PurchasePlan.material_id.in_({material_id for material_id, _ in merged})
+            )
+        ).all():
+            if (plan.material_id, plan.supplier) in merged:
+                pending.setdefault((plan.material_id, plan.supplier), []).append(plan)
+
+        # Один ожидающий план на ключ: остаётся план с самой ранней датой,
+        # заказы остальных переходят к нему
+        existing: Dict[Tuple[int, Optional[str]], PurchasePlan] = {}
+        plan_orders: Dict[Tuple[int, Optional[str]], List[str]] = {}
+        duplicate_ids: List[int] = []
+        for key, group in pending.items():
+            group.sort(key=lambda plan: (plan.planned_date is None, plan.planned_date or date.min, plan.id))
+            existing[key] = group[0]
+            plan_orders[key] = list(dict.fromkeys(number for plan in group for number in plan.order_refs or []))
+            for duplicate in group[1:]:
+                if duplicate.planned_date and (
+                    group[0].planned_date is None or duplicate.planned_date < group[0].planned_date
+                ):
+                    group[0].planned_date = duplicate.planned_date
+                duplicate_ids.append(duplicate.id)
+        if duplicate_ids:
+            session.execute(
+                delete(PurchasePlanOrderRef).where(PurchasePlanOrderRef.purchase_plan_id.in_(duplicate_ids))
+            )
+            session.execute(delete(PurchasePlan).where(PurchasePlan.id.in_(duplicate_ids)))
+
+        keys = list(merged)
+        other_orders = {
+            number
+            for key in keys if key in existing
+            for number in plan_orders[key]
+            if number not in merged[key]["orders"]
+        }
+        stored = dict(session.exec(
+            select(ProductionOrder.order_number, ProductionOrder.material_requirements).where(
+                ProductionOrder.order_number.in_(other_orders),
+                ProductionOrder.status.in_(MRPService.OPEN_ORDER_STATUSES)
+            )
+        ).all()) if other_orders else {}
+        for key in keys:
+            plan = existing.get(key)
+            if plan is not None:
+                mat_id = str(key[0])
+                merged[key]["required"] += sum(
+                    float((stored.get(number) or {}).get(mat_id) or 0)
+                    for number in plan_orders[key]
+                    if number not in merged[key]["orders"]
+                )
+
+        required = np.array([merged[key]["required"] for key in keys])
+        available = np.array([merged[key]["need"].available for key in keys])
+        deficits = np.maximum(required - available, 0)
+        quantities = lot_size(
+            deficits,
+            np.array([merged[key]["need"].min_order_qty for key in keys]),
+            np.array([merged[key]["need"].order_multiplicity for key in keys])
+        )
+
+        plans: List[PurchasePlan] = []
+        new_plans: List[PurchasePlan] = []
+        extra_refs: List[Dict[str, Any]] = []
+        for key, req, avail, deficit, qty in zip(keys, required, available, deficits, quantities):
+            entry = merged[key]
+            need = entry["need"]
+            planned_date = MRPService._release_date(entry["need_date"], need.lead_time_days)
+            plan = existing.get(key)
+
+            if plan is not None:
+                added = [
+                    number for number in dict.fromkeys(plan_orders[key] + list(entry["orders"]))
+                    if number not in (plan.order_refs or [])
+                ]
+                plan.required_qty = Decimal(str(round(float(req), 3)))
+                plan.available_qty = Decimal(str(round(float(avail), 3)))
+                plan.deficit_qty = Decimal(str(round(float(deficit), 3)))
+                plan.order_qty = Decimal(str(round(float(qty), 3)))
+                plan.order_refs = list(plan.order_refs or []) + added
+                if plan.planned_date is None or planned_date < plan.planned_date:
+                    plan.planned_date = planned_date
+                session.add(plan)
+                extra_refs += [{"purchase_plan_id": plan.id, "order_number": number} for number in added]
+                plans.append(plan)
+            elif deficit > 0:
+                plan = PurchasePlan(
+                    material_id=need.material_id,
+                    material_name=need.material_name,
+                    required_qty=Decimal(str(round(float(req), 3))),
+                    available_qty=Decimal(str(round(float(avail), 3))),
+                    deficit_qty=Decimal(str(round(float(deficit), 3))),
+                    order_qty=Decimal(str(round(float(qty), 3))),
+                    order_refs=list(entry["orders"]),
+                    supplier=need.supplier,
+                    planned_date=planned_date,
+                    status=PurchaseStatus.PENDING,
+                    notes=notes
+                )
+                new_plans.append(plan)
+                plans.append(plan)
+
+        session.flush()
+        MRPService._insert_purchase_plans(session, new_plans)
+        if extra_refs:
+            session.execute(insert(PurchasePlanOrderRef), extra_refs)
+        return plans
+
+    @staticmethod
+    def _insert_purchase_plans(session: Session, plans: List[PurchasePlan]) -> None:
+        """Вставить планы закупок и их ссылки на заказы двумя пакетными INSERT"""
+        if not plans:
+            return
+
+        plan_ids = session.execute(
+            insert(PurchasePlan).returning(PurchasePlan.id, sort_by_parameter_order=True),
+            [plan.model_dump(exclude={"id"}) for plan in plans]
+        ).scalars().all()
+        for plan, plan_id in zip(plans, plan_ids):
+            plan.id = plan_id
+
+        refs = [
+            {"purchase_plan_id": plan.id, "order_number": number}
+            for plan in plans
+            for number in plan.order_refs
+        ]
+        if refs:
+            session.execute(insert(PurchasePlanOrderRef), refs)
+
+    @staticmethod
+    def _delete_pending_plans(session: Session, material_ids: Set[str]) -> None:
+        """Удалить ожидающие планы закупок по материалам вместе со ссылками на заказы"""
+        pending = select(PurchasePlan.id).where(
+            PurchasePlan.status == PurchaseStatus.PENDING,
+            PurchasePlan.material_id.in_([int(mat_id) for mat_id in material_ids])
+        )
+        session.execute(
+            delete(PurchasePlanOrderRef).where(PurchasePlanOrderRef.purchase_plan_id.in_(pending))
+        )
+        session.execute(delete(PurchasePlan).where(PurchasePlan.id.in_(pending)))
+
+    @staticmethod
+    def check_material_availability(requirements: Dict[str, float]) -> Dict[str, Any]:
+        """Проверить доступность материалов на складе"""
+        availability = {}
+        stock = WarehouseService.get_bulk_availability(requirements.keys())
+
+        for mat_id, required_qty in requirements.items():
+            info = stock.get(int(mat_id))
+            if not info:
+                continue
+
+            availability[mat_id] = {
+                "material_name": info["material_name"],
+                "required": required_qty,
+                "available": info["available"],
+                "deficit": max(0, required_qty - info["available"]),
+                "supplier": info["supplier"],
+                "lead_time_days": info["lead_time_days"],
+                "min_order_qty": info["min_order_qty"],
+                "order_multiplicity": info["order_multiplicity"]
+            }
 
         return availability
 
+    @staticmethod
+    def load_capacity_calendar(session: Session) -> CapacityCalendar:
+        """Загрузить календарь мощностей на горизонт планирования"""
+        return CapacityCalendar.load(
+            session,
+            start=date.today() + timedelta(days=1),
+            horizon_days=MRPService.SCHEDULING_HORIZON_DAYS,
+            default_capacity=MRPService.DAILY_CAPACITY
+        )
+
+    @staticmethod
+    def _plan_on_calendar(order: ProductionOrder, calendar: CapacityCalendar) -> ProductionSchedule:
+        """Найти первый свободный день в календаре и занять мощность"""
+        workshop = order.workshop or CapacityCalendar.DEFAULT_WORKSHOP
+        capacity_needed = order.total_pairs
+
+        scheduled_date = calendar.first_fit(workshop, capacity_needed)
+        if scheduled_date is None:
+            # Если не нашли свободную дату, планируем на первый день за горизонтом
+            scheduled_date = calendar.start + timedelta(days=calendar.horizon_days)
+        calendar.reserve(workshop, scheduled_date, capacity_needed)
+
+        return ProductionSchedule(
+            order_id=order.id,
+            scheduled_date=scheduled_date,
+            capacity_used=capacity_needed,
+            workshop=workshop,
+            status=ScheduleStatus.PLANNED
+        )
+
     @staticmethod
     def schedule_production(order: ProductionOrder) -> ProductionSchedule:
         """Запланировать производство заказа"""
@@ -83,71 +591,273 @@ class MRPService:
             if existing:
                 return existing
 
-            # Находим первую доступную дату
-            current_date = date.today() + timedelta(days=1)
-            capacity_needed = order.total_pairs
-
-            for _ in range(30):  # Ищем в пределах 30 дней
-                # Проверяем загрузку на эту дату
-                statement = select(ProductionSchedule).where(
-                    ProductionSchedule.scheduled_date == current_date
-                )
-                schedules = session.exec(statement).all()
-                used_capacity = sum(s.capacity_used for s in schedules)
-
-                if used_capacity + capacity_needed <= MRPService.DAILY_CAPACITY:
-                    # Создаем расписание
-                    schedule = ProductionSchedule(
-                        order_id=order.id,
-                        scheduled_date=current_date,
-                        capacity_used=capacity_needed,
-                        workshop=order.workshop or "Основной цех",
-                        status=ScheduleStatus.PLANNED
-                    )
-                    session.add(schedule)
-                    session.commit()
-                    session.refresh(schedule)
-                    return schedule
-
-                current_date += timedelta(days=1)
-
-            # Если не нашли свободную дату, планируем на ближайшую
-            schedule = ProductionSchedule(
-                order_id=order.id,
-                scheduled_date=current_date,
-                capacity_used=capacity_needed,
-                workshop=order.workshop or "Основной цех",
-                status=ScheduleStatus.PLANNED
-            )
+            calendar = MRPService.load_capacity_calendar(session)
+            schedule = MRPService._plan_on_calendar(order, calendar)
             session.add(schedule)
             session.commit()
             session.refresh(schedule)
             return schedule
 
     @staticmethod
-    def create_purchase_plan(order: ProductionOrder, availability: Dict[str, Any]) -> List[PurchasePlan]:
-        """Создать план закупок для заказа"""
-        purchase_plans = []
+    def schedule_orders(orders: List[ProductionOrder]) -> List[ProductionSchedule]:
+        """Запланировать пакет заказов за один проход по календарю мощностей
+
+        Календарь загружается один раз, новые строки графика вставляются
+        одним пакетом, плановые даты заказов обновляются одним UPDATE.
+        """
+        with Session(engine, expire_on_commit=False) as session:
+            order_ids = [order.id for order in orders]
+            existing = {
+                schedule.order_id: schedule
+                for schedule in session.exec(
+                    select(ProductionSchedule).where(ProductionSchedule.order_id.in_(order_ids))
+                ).all()
+            } if order_ids else {}
+
+            calendar = MRPService.load_capacity_calendar(session)
+            new_schedules = [
+                MRPService._plan_on_calendar(order, calendar)
+                for order in orders
+                if order.id not in existing
+            ]
+
+            if new_schedules:
+                session.add_all(new_schedules)
+                session.flush()
+                session.execute(
+                    update(ProductionOrder),
+                    [
+                        {
+                            "id": schedule.order_id,
+                            "planned_start_date": schedule.scheduled_date,
+                            "production_capacity_used": schedule.capacity_used
+                        }
+                        for schedule in new_schedules
+                    ]
+                )
+                session.commit()
+
+            created = {schedule.order_id: schedule for schedule in new_schedules}
+            return [existing.get(order.id) or created[order.id] for order in orders]
+
+    @staticmethod
+    def schedule_finite_capacity() -> Dict[str, Any]:
+        """Планирование всех незапланированных заказов с учётом конечной мощности
+
+        Заказы выбираются из кучи по ключу (резерв времени до срока, приоритет):
+        первым планируется заказ с наименьшим запасом времени, при равенстве —
+        с большим ``priority``. Каждый заказ за один проход занимает первый
+        свободный день своего цеха; строки графика вставляются одним пакетом.
+        Возвращает отчёт с опаздывающими заказами.
+        """
+        today = date.today()
 
         with Session(engine) as session:
-            for mat_id, info in availability.items():
-                if info["deficit"] > 0:
-                    # Создаем план закупки
-                    plan = PurchasePlan(
-                        material_id=int(mat_id),
-                        material_name=info["material_name"],
-                        required_qty=Decimal(str(info["required"])),
-                        available_qty=Decimal(str(info["available"])),
-                        deficit_qty=Decimal(str(info["deficit"])),
-                        order_refs=[order.order_number],
-                        supplier=info["supplier"],
-                        planned_date=date.today() + timedelta(days=3),
-                        status=PurchaseStatus.PENDING,
-                        notes=f"Для заказа {order.order_number}"
-                    )
-                    session.add(plan)
-                    purchase_plans.append(plan)
+            rows = session.exec(
+                select(
+                    ProductionOrder.id,
+                    ProductionOrder.order_number,
+                    ProductionOrder.due_date,
+                    ProductionOrder.priority,
+                    ProductionOrder.workshop,
+                    ProductionOrder.sizes
+                )
+                .outerjoin(ProductionSchedule, ProductionSchedule.order_id == ProductionOrder.id)
+                .where(
+                    ProductionSchedule.id == None,  # noqa: E711
+                    ProductionOrder.status.in_(MRPService.OPEN_ORDER_STATUSES)
+                )
+            ).all()
+
+            calendar = MRPService.load_capacity_calendar(session)
+            daily_capacity: Dict[str, float] = {}
+
+            heap = []
+            for order_id, order_number, due_date, priority, workshop, sizes in rows:
+                workshop = workshop or CapacityCalendar.DEFAULT_WORKSHOP
+                pairs = sum((sizes or {}).values())
+                if workshop not in daily_capacity:
+                    daily_capacity[workshop] = max(float(calendar.capacity(workshop).mean()), 1.0)
+                # Резерв времени: дни до срока минус дни, нужные на выпуск заказа
+                slack = (due_date - today).days - math.ceil(pairs / daily_capacity[workshop])
+                heap.append((slack, -(priority or 0), order_id, order_number, due_date, workshop, pairs))
+            heapq.heapify(heap)
+
+            beyond_horizon = calendar.start + timedelta(days=calendar.horizon_days)
+            schedules = []
+            late_orders = []
+            while heap:
+                _, _, order_id, order_number, due_date, workshop, pairs = heapq.heappop(heap)
+                scheduled_date = calendar.first_fit(workshop, pairs) or beyond_horizon
+                calendar.reserve(workshop, scheduled_date, pairs)
+                schedules.append({
+                    "order_id": order_id,
+                    "scheduled_date": scheduled_date,
+                    "capacity_used": pairs,
+                    "workshop": workshop,
+                    "status": ScheduleStatus.PLANNED
+                })
+                if scheduled_date > due_date:
+                    late_orders.append({
+                        "order_number": order_number,
+                        "workshop": workshop,
+                        "due_date": due_date,
+                        "scheduled_date": scheduled_date,
+                        "days_late": (scheduled_date - due_date).days
+                    })
+
+            if schedules:
+                session.execute(insert(ProductionSchedule), schedules)
+                session.execute(
+                    update(ProductionOrder),
+                    [
+                        {
+                            "id": schedule["order_id"],
+                            "planned_start_date": schedule["scheduled_date"],
+                            "production_capacity_used": schedule["capacity_used"]
+                        }
+                        for schedule in schedules
+                    ]
+                )
+                session.commit()
+
+        return {
+            "scheduled": len(schedules),
+            "beyond_horizon": sum(1 for schedule in schedules if schedule["scheduled_date"] == beyond_horizon),
+            "late_orders": late_orders
+        }
+
+    @staticmethod
+    def _release_date(need_date: Optional[date], lead_time_days: Optional[int]) -> date:
+        """Дата запуска закупки: дата потребности минус срок поставки, не раньше сегодня"""
+        if need_date is None:
+            return date.today()
+        return max(date.today(), need_date - timedelta(days=MRPService._lead_time(lead_time_days)))
+
+    @staticmethod
+    def _lead_time(lead_time_days: Optional[int]) -> int:
+        """Срок поставки материала или срок по умолчанию"""
+        return lead_time_days if lead_time_days is not None else MRPService.DEFAULT_LEAD_TIME_DAYS
+
+    @staticmethod
+    def run_time_phased(horizon_days: Optional[int] = None, persist: bool = True,
+                        progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """Нетто-расчёт по дням на горизонте планирования
+
+        Валовые потребности раскладываются по дням запуска заказов, плановые
+        поступления — по ожидаемым датам прихода заказанных закупок. Прогнозный
+        остаток и плановые заказы считаются массивами сразу для всех
+        материалов, запуск закупки смещается на срок поставки материала.
+        """
+        horizon_days = horizon_days or MRPService.PLANNING_HORIZON_DAYS
+        today = date.today()
 
+        with Session(engine) as session:
+            orders = MRPService._load_open_orders(session)
+            explosion, _ = MRPService._explode(session, orders)
+            if progress:
+                progress(len(orders), 0)
+            material_ids = explosion.material_ids
+            material_index = {mat_id: i for i, mat_id in enumerate(material_ids)}
+
+            # Валовые потребности: материалы × дни
+            order_days = np.array([
+                (order.planned_start_date or order.due_date or today) - today
+                for order in orders
+            ], dtype="timedelta64[D]").astype(np.int64) if orders else np.zeros(0, dtype=np.int64)
+            order_days = np.clip(order_days, 0, horizon_days - 1)
+            requirements = explosion.matrix.tocoo()
+            gross = np.zeros((len(material_ids), horizon_days))
+            np.add.at(gross, (requirements.row, order_days[requirements.col]), requirements.data)
+
+            stock = WarehouseService.get_bulk_availability(material_ids)
+            on_hand = np.array([stock.get(int(m), {}).get("available", 0.0) for m in material_ids])
+            safety_stock = np.array([stock.get(int(m), {}).get("safety_stock", 0.0) for m in material_ids])
+            lead_times = np.array([
+                MRPService._lead_time(stock.get(int(m), {}).get("lead_time_days"))
+                for m in material_ids
+            ], dtype=np.int64)
+
+            # Плановые поступления: заказанные закупки приходят через срок поставки
+            receipts = np.zeros_like(gross)
+            ordered = session.exec(
+                select(PurchasePlan.material_id, PurchasePlan.planned_date, MRPService._ordered_quantity()).where(
+                    PurchasePlan.status == PurchaseStatus.ORDERED,
+                    PurchasePlan.material_id.in_([int(m) for m in material_ids])
+                )
+            ).all()
+            for mat_id, planned_date, qty in ordered:
+                i = material_index[str(mat_id)]
+                arrival = (planned_date or today) + timedelta(days=int(lead_times[i]))
+                receipts[i, min(max((arrival - today).days, 0), horizon_days - 1)] += float(qty or 0)
+
+            result = time_phased_netting(gross, receipts, on_hand, lead_times, safety_stock)
+            if progress:
+                progress(len(orders), len(material_ids))
+
+            # Заказы, формирующие потребность в каждой корзине
+            bucket_orders: Dict[Tuple[int, int], List[str]] = {}
+            for i, j in zip(requirements.row, requirements.col):
+                bucket_orders.setdefault((int(i), int(order_days[j])), []).append(orders[j].order_number)
+
+            plans = []
+            rows, days = np.nonzero(result.planned_receipts > 0)
+            for i, t in zip(rows.tolist(), days.tolist()):
+                info = stock.get(int(material_ids[i]), {})
+                release_day = int(result.release_days[i, t])
+                planned_qty = float(result.planned_receipts[i, t])
+                plans.append(PurchasePlan(
+                    material_id=int(material_ids[i]),
+                    material_name=info.get("material_name"),
+                    required_qty=Decimal(str(round(float(gross[i, t]), 3))),
+                    available_qty=Decimal(str(round(float(result.projected_available[i, t]) - planned_qty, 3))),
+                    deficit_qty=Decimal(str(round(planned_qty, 3))),
+                    order_qty=Decimal(str(round(planned_qty, 3))),
+                    order_refs=bucket_orders.get((i, t), []),
+                    supplier=info.get("supplier"),
+                    planned_date=today + timedelta(days=max(release_day, 0)),
+                    status=PurchaseStatus.PENDING,
+                    notes=f"Потребность на {today + timedelta(days=t)}"
+                    + (" (запуск просрочен)" if release_day < 0 else "")
+                ))
+
+            if persist:
+                MRPService._delete_pending_plans(session, set(material_ids))
+                MRPService._insert_purchase_plans(session, plans)
+                session.commit()
+
+            return {
+                "start_date": today,
+                "horizon_days": horizon_days,
+                "material_ids": material_ids,
+                "gross": gross,
+                "receipts": receipts,
+                "projected_available": result.projected_available,
+                "planned_receipts": result.planned_receipts,
+                "purchase_plans": len(plans),
+                "late_plans": int(np.count_nonzero(result.release_days[rows, days] < 0))
+            }
+
+    @staticmethod
+    def create_purchase_plan(order: ProductionOrder, availability: Dict[str, Any]) -> List[PurchasePlan]:
+        """Создать план закупок для заказа
+
+        Дефициты заказа сводятся с ожидающими планами по тем же материалам
+        и поставщикам, а не создают по строке на каждый заказ.
+        """
+        need_date = order.planned_start_date or order.due_date
+        needs = [
+            MRPService._purchase_need(
+                int(mat_id), info, [order.order_number], info["required"], info["available"], need_date
+            )
+            for mat_id, info in availability.items()
+            if info["deficit"] > 0
+        ]
+
+        with Session(engine, expire_on_commit=False) as session:
+            purchase_plans = MRPService._consolidate_purchase_plans(
+                session, needs, notes=f"Для заказа {order.order_number}"
+            )
             session.commit()
 
         return purchase_plans
@@ -164,7 +874,8 @@ class MRPService:
         # Планируем производство
         schedule = MRPService.schedule_production(order)
 
-        # Создаем план закупок
+        # Создаем план закупок к дате запуска
+        order.planned_start_date = schedule.scheduled_date
         purchase_plans = MRPService.create_purchase_plan(order, availability)
 
         # Обновляем заказ
@@ -185,28 +896,42 @@ class MRPService:
     @staticmethod
     def get_production_schedule(start_date: date = None, end_date: date = None) -> List[Dict]:
         """Получить производственное расписание"""
-        with Session(engine) as session:
-            statement = select(ProductionSchedule)
-
-            if start_date:
-                statement = statement.where(ProductionSchedule.scheduled_date >= start_date)
-            if end_date:
-                statement = statement.where(ProductionSchedule.scheduled_date <= end_date)
-
-            schedules = session.exec(statement.order_by(ProductionSchedule.scheduled_date)).all()
-
-            result = []
-            for schedule in schedules:
-                order = session.get(ProductionOrder, schedule.order_id)
-                result.append({
-                    "date": schedule.scheduled_date,
-                    "order_number": order.order_number if order else "N/A",
-                    "capacity_used": schedule.capacity_used,
-                    "workshop": schedule.workshop,
-                    "status": schedule.status.value
-                })
+        return [
+            row._asdict()
+            for row in MRPService.iter_production_schedule(start_date, end_date)
+        ]
 
-            return result
+    @staticmethod
+    def iter_production_schedule(start_date: date = None, end_date: date = None,
+                                 workshop: Optional[str] = None,
+                                 batch_size: int = 1000) -> Iterator[ScheduleRow]:
+        """Потоковое чтение графика одним запросом с JOIN на заказы
+
+        Строки читаются серверным курсором порциями по ``batch_size``
+        и отдаются компактными кортежами без загрузки ORM-объектов.
+        """
+        statement = (
+            select(
+                ProductionSchedule.scheduled_date,
+                ProductionOrder.order_number,
+                ProductionSchedule.capacity_used,
+                ProductionSchedule.workshop,
+                ProductionSchedule.status
+            )
+            .join(ProductionOrder, ProductionOrder.id == ProductionSchedule.order_id)
+            .order_by(ProductionSchedule.scheduled_date, ProductionSchedule.order_id)
+            .execution_options(yield_per=batch_size)
+        )
+        if start_date:
+            statement = statement.where(ProductionSchedule.scheduled_date >= start_date)
+        if end_date:
+            statement = statement.where(ProductionSchedule.scheduled_date <= end_date)
+        if workshop:
+            statement = statement.where(ProductionSchedule.workshop == workshop)
+
+        with Session(engine) as session:
+            for scheduled_date, order_number, capacity_used, row_workshop, status in session.exec(statement):
+                yield ScheduleRow(scheduled_date, order_number, capacity_used, row_workshop, status.value)
 
     @staticmethod
     def get_purchase_plans(status: PurchaseStatus = None) -> List[PurchasePlan]:
@@ -0,0 +1,194 @@
+# krai_system/services/mrp_cli.py
+"""Консольный запуск MRP
+
+Пример: python -m krai_system.services.mrp_cli batch --dry-run
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import List, Optional
+
+from .mrp import MRPService
+from .mrp_jobs import MRPJobRunner, get_job_runner
+from .mrp_simulation import compare_scenarios, scenario_from_dict
+
+logger = logging.getLogger(__name__)
+
+
+def _print_json(data) -> None:
+    print(json.dumps(data, ensure_ascii=False, indent=2, default=str))
+
+
+def _run_batch(args: argparse.Namespace) -> int:
+    result = MRPService.run_batch(persist=not args.dry_run)
+    logger.info(
+        "Пакетный MRP: заказов %s, спецификаций %s",
+        result["orders_count"], result["specifications_count"]
+    )
+    if args.details:
+        _print_json(result)
+    else:
+        _print_json({
+            "orders_count": result["orders_count"],
+            "specifications_count": result["specifications_count"],
+            "gross_requirements": result["gross_requirements"]
+        })
+    return 0
+
+
+def _run_schedule(args: argparse.Namespace) -> int:
+    orders = MRPService.get_open_orders()
+    schedules = MRPService.schedule_orders(orders)
+    logger.info("Запланировано заказов: %s", len(schedules))
+    _print_json([
+        {
+            "order_id": schedule.order_id,
+            "date": schedule.scheduled_date,
+            "workshop": schedule.workshop,
+            "capacity_used": schedule.capacity_used
+        }
+        for schedule in schedules
+    ])
+    return 0
+
+
+def _run_schedule_finite(args: argparse.Namespace) -> int:
+    result = MRPService.schedule_finite_capacity()
+    logger.info(
+        "Запланировано заказов: %s, опаздывают: %s, за горизонтом: %s",
+        result["scheduled"], len(result["late_orders"]), result["beyond_horizon"]
+    )
+    _print_json(result["late_orders"])
+    return 0
+
+
+def _run_net_change(args: argparse.Namespace) -> int:
+    result = MRPService.run_net_change(persist=not args.dry_run)
+    logger.info(
+        "MRP по изменениям: заказов %s, материалов %s",
+        len(result["changed_orders"]), len(result["affected_materials"])
+    )
+    _print_json(result)
+    return 0
+
+
+def _run_time_phased(args: argparse.Namespace) -> int:
+    result = MRPService.run_time_phased(horizon_days=args.horizon, persist=not args.dry_run)
+    logger.info(
+        "Нетто-расчёт по дням: материалов %s, плановых закупок %s, просроченных %s",
+        len(result["material_ids"]), result["purchase_plans"], result["late_plans"]
+    )
+    return 0
+
+
+def _run_simulate(args: argparse.Namespace) -> int:
+    with open(args.scenarios, encoding="utf-8") as f:
+        scenarios = [scenario_from_dict(item) for item in json.load(f)]
+    result = compare_scenarios(scenarios, max_workers=args.workers)
+    logger.info("Смоделировано сценариев: %s", len(result["scenarios"]))
+    _print_json(result if args.details else result["comparison"])
+    return 0
+
+
+def _job_state(job) -> dict:
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status.value,
+        "orders_processed": job.orders_processed,
+        "materials_netted": job.materials_netted,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "error": job.error,
+        "result": job.result
+    }
+
+
+def _run_job_submit(args: argparse.Namespace) -> int:
+    params = {"persist": not args.dry_run}
+    if args.horizon:
+        params["horizon_days"] = args.horizon
+
+    runner = get_job_runner()
+    job = runner.submit(args.job_type, params, force=args.force)
+    logger.info("Задание MRP %s (%s)", job.id, job.status.value)
+
+    # Опрос прогресса до завершения: пул живёт в этом же процессе
+    while job.status.value in ("queued", "running"):
+        time.sleep(args.poll)
+        job = runner.get_job(job.id)
+        logger.info("Заказов %s, материалов %s", job.orders_processed, job.materials_netted)
+    runner.shutdown()
+
+    _print_json(_job_state(job))
+    return 0 if job.status.value == "completed" else 1
+
+
+def _run_job_status(args: argparse.Namespace) -> int:
+    job = get_job_runner().get_job(args.job_id)
+    if job is None:
+        logger.error("Задание MRP %s не найдено", args.job_id)
+        return 1
+    _print_json(_job_state(job))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="krai-mrp", description="Планирование потребностей KRAI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Пакетный расчёт потребностей по всем открытым заказам")
+    batch.add_argument("--dry-run", action="store_true", help="Не сохранять потребности в заказах")
+    batch.add_argument("--details", action="store_true", help="Вывести потребности по каждому заказу")
+    batch.set_defaults(handler=_run_batch)
+
+    net_change = commands.add_parser("net-change", help="Пересчитать только изменившиеся потребности")
+    net_change.add_argument("--dry-run", action="store_true", help="Не сохранять планы закупок и отметку запуска")
+    net_change.set_defaults(handler=_run_net_change)
+
+    time_phased = commands.add_parser("time-phased", help="Нетто-расчёт по дням с учётом сроков поставки")
+    time_phased.add_argument("--horizon", type=int, default=None, help="Горизонт планирования, дней")
+    time_phased.add_argument("--dry-run", action="store_true", help="Не сохранять планы закупок")
+    time_phased.set_defaults(handler=_run_time_phased)
+
+    schedule = commands.add_parser("schedule", help="Запланировать открытые заказы по календарю мощностей")
+    schedule.set_defaults(handler=_run_schedule)
+
+    schedule_finite = commands.add_parser(
+        "schedule-finite", help="Запланировать все незапланированные заказы по сроку и приоритету"
+    )
+    schedule_finite.set_defaults(handler=_run_schedule_finite)
+
+    simulate = commands.add_parser("simulate", help="Сравнить сценарии «что если» без записи в БД")
+    simulate.add_argument("scenarios", help="JSON-файл со списком сценариев")
+    simulate.add_argument("--workers", type=int, default=None, help="Число процессов")
+    simulate.add_argument("--details", action="store_true", help="Вывести графики и дефициты по сценариям")
+    simulate.set_defaults(handler=_run_simulate)
+
+    job_submit = commands.add_parser("job-submit", help="Запустить MRP фоновым заданием с опросом прогресса")
+    job_submit.add_argument("job_type", choices=sorted(MRPJobRunner.JOB_TYPES), help="Тип расчёта")
+    job_submit.add_argument("--horizon", type=int, default=None, help="Горизонт нетто-расчёта, дней")
+    job_submit.add_argument("--dry-run", action="store_true", help="Не сохранять результаты расчёта")
+    job_submit.add_argument("--force", action="store_true", help="Не использовать кэш завершённых заданий")
+    job_submit.add_argument("--poll", type=float, default=1.0, help="Интервал опроса, секунд")
+    job_submit.set_defaults(handler=_run_job_submit)
+
+    job_status = commands.add_parser("job-status", help="Состояние фонового задания MRP")
+    job_status.add_argument("job_id", type=int)
+    job_status.set_defaults(handler=_run_job_status)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа CLI"""
+    logging.basicConfig(level=logging.INFO)
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":  # pragma: no cover - ручной запуск
+    sys.exit(main())
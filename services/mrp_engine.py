@@ -0,0 +1,183 @@
+# krai_system/services/mrp_engine.py
+"""Векторизованные расчёты MRP (чистые функции, без обращения к БД)"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from datetime import date
+
+import numpy as np
+from scipy import sparse
+
+
+class OrderDemand(NamedTuple):
+    """Спрос одного заказа для разузлования"""
+    order_key: str
+    specification_id: Optional[int]
+    pairs: int
+    # Материалы заказа вне спецификации: {material_id: расход на пару}
+    direct_usage: Dict[str, float]
+
+
+class PurchaseNeed(NamedTuple):
+    """Дефицит материала, который нужно закрыть закупкой"""
+    material_id: int
+    material_name: Optional[str]
+    supplier: Optional[str]
+    order_numbers: Tuple[str, ...]
+    required: float
+    available: float
+    need_date: Optional[date]
+    lead_time_days: Optional[int]
+    min_order_qty: float
+    order_multiplicity: float
+
+
+class BomMatrix:
+    """Разреженная матрица норм расхода: материалы × спецификации"""
+
+    def __init__(self, material_ids: List[str], spec_ids: List[int], matrix: sparse.csr_matrix):
+        self.material_ids = material_ids
+        self.spec_ids = spec_ids
+        self.material_index = {mat_id: i for i, mat_id in enumerate(material_ids)}
+        self.spec_index = {spec_id: j for j, spec_id in enumerate(spec_ids)}
+        self.matrix = matrix
+
+    @classmethod
+    def from_items(cls, bom_items: Dict[int, Dict[str, float]]) -> "BomMatrix":
+        """Собрать матрицу из норм расхода {spec_id: {material_id: расход на пару}}"""
+        spec_ids = list(bom_items.keys())
+        material_ids: List[str] = []
+        material_index: Dict[str, int] = {}
+        rows, cols, values = [], [], []
+
+        for j, spec_id in enumerate(spec_ids):
+            for mat_id, qty in bom_items[spec_id].items():
+                i = material_index.get(mat_id)
+                if i is None:
+                    i = material_index[mat_id] = len(material_ids)
+                    material_ids.append(mat_id)
+                rows.append(i)
+                cols.append(j)
+                values.append(float(qty))
+
+        matrix = sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(material_ids), len(spec_ids)), dtype=np.float64
+        )
+        return cls(material_ids, spec_ids, matrix)
+
+
+class ExplosionResult:
+    """Потребности в материалах: материалы × заказы"""
+
+    def __init__(self, material_ids: List[str], order_keys: List[str], matrix: sparse.csc_matrix):
+        self.material_ids = material_ids
+        self.order_keys = order_keys
+        self.matrix = matrix
+        self.gross = np.asarray(matrix.sum(axis=1)).ravel()
+
+    def order_requirements(self, j: int) -> Dict[str, float]:
+        """Потребности j-го заказа в формате {material_id: количество}"""
+        column = self.matrix.getcol(j)
+        return {
+            self.material_ids[i]: float(qty)
+            for i, qty in zip(column.indices, column.data)
+            if qty
+        }
+
+    def gross_requirements(self) -> Dict[str, float]:
+        """Валовые потребности по всему портфелю заказов"""
+        return {
+            mat_id: float(qty)
+            for mat_id, qty in zip(self.material_ids, self.gross)
+            if qty
+        }
+
+
+def explode_orders(bom: BomMatrix, demands: Iterable[OrderDemand]) -> ExplosionResult:
+    """Разузловать портфель заказов одним матричным произведением
+
+    R = B · D + P, где B — матрица норм (материалы × спецификации),
+    D — пары по спецификациям (спецификации × заказы),
+    P — прямой расход материалов заказов (материалы × заказы).
+    """
+    demands = list(demands)
+    material_ids = list(bom.material_ids)
+    material_index = dict(bom.material_index)
+
+    d_rows, d_cols, d_values = [], [], []
+    p_rows, p_cols, p_values = [], [], []
+
+    for j, demand in enumerate(demands):
+        spec_j = bom.spec_index.get(demand.specification_id)
+        if spec_j is not None and demand.pairs:
+            d_rows.append(spec_j)
+            d_cols.append(j)
+            d_values.append(float(demand.pairs))
+
+        for mat_id, per_pair in demand.direct_usage.items():
+            i = material_index.get(mat_id)
+            if i is None:
+                i = material_index[mat_id] = len(material_ids)
+                material_ids.append(mat_id)
+            p_rows.append(i)
+            p_cols.append(j)
+            p_values.append(float(per_pair) * demand.pairs)
+
+    n_orders = len(demands)
+    demand_matrix = sparse.csc_matrix(
+        (d_values, (d_rows, d_cols)), shape=(len(bom.spec_ids), n_orders), dtype=np.float64
+    )
+    direct_matrix = sparse.csc_matrix(
+        (p_values, (p_rows, p_cols)), shape=(len(material_ids), n_orders), dtype=np.float64
+    )
+
+    bom_matrix = bom.matrix
+    if bom_matrix.shape[0] < len(material_ids):
+        # Материалы, встречающиеся только как прямой расход, дополняют матрицу норм нулями
+        bom_matrix = sparse.vstack(
+            [bom_matrix, sparse.csr_matrix((len(material_ids) - bom_matrix.shape[0], bom_matrix.shape[1]))]
+        ).tocsr()
+
+    requirements = (bom_matrix @ demand_matrix + direct_matrix).tocsc()
+    requirements.sum_duplicates()
+    return ExplosionResult(material_ids, [d.order_key for d in demands], requirements)
+
+
+class TimePhasedResult(NamedTuple):
+    """Результат нетто-расчёта по дням: массивы материалы × дни"""
+    projected_available: np.ndarray
+    planned_receipts: np.ndarray
+    release_days: np.ndarray
+
+
+def time_phased_netting(gross: np.ndarray, receipts: np.ndarray, on_hand: np.ndarray,
+                        lead_times: np.ndarray,
+                        safety_stock: Optional[np.ndarray] = None) -> TimePhasedResult:
+    """Нетто-расчёт по дневным корзинам для всех материалов сразу
+
+    Прогнозный доступный остаток (PAB) — накопленная сумма поступлений минус
+    потребности поверх текущего остатка. Плановые поступления закрывают
+    накопленный дефицит ниже страхового запаса; дата запуска заказа —
+    день потребности минус срок поставки (отрицательный день — просрочка).
+    """
+    if safety_stock is None:
+        safety_stock = np.zeros(on_hand.shape[0])
+
+    balance = on_hand[:, None] + np.cumsum(receipts - gross, axis=1)
+    shortage = np.maximum.accumulate(np.maximum(safety_stock[:, None] - balance, 0), axis=1)
+    planned_receipts = np.diff(shortage, axis=1, prepend=0)
+    release_days = np.arange(gross.shape[1])[None, :] - lead_times[:, None]
+
+    return TimePhasedResult(
+        projected_available=balance + shortage,
+        planned_receipts=planned_receipts,
+        release_days=release_days
+    )
+
+
+def lot_size(deficits: np.ndarray, min_order_qty: np.ndarray,
+             order_multiplicity: np.ndarray) -> np.ndarray:
+    """Размер партии закупки: не меньше минимальной партии и кратно кратности заказа"""
+    quantities = np.maximum(deficits, min_order_qty)
+    multiple = np.where(order_multiplicity > 0, order_multiplicity, 1.0)
+    rounded = np.ceil(np.round(quantities / multiple, 9)) * multiple
+    quantities = np.where(order_multiplicity > 0, rounded, quantities)
+    return np.where(deficits > 0, quantities, 0.0)
@@ -0,0 +1,301 @@
+# krai_system/services/mrp_jobs.py
+"""Фоновые запуски MRP: очередь в таблице mrp_jobs и локальный пул воркеров"""
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from ..models.materials import Material
+from ..models.mrp import MRPJob, MRPJobStatus, PurchasePlan, PurchaseStatus, WorkshopCapacity
+from ..models.production_orders import ProductionOrder
+from ..models.specifications import Specification
+from ..models.warehouse import WarehouseStock
+from .database import engine
+from .mrp import MRPService, ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+
+def _run_batch(params: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    result = MRPService.run_batch(persist=params.get("persist", True), progress=progress)
+    return {
+        "orders_count": result["orders_count"],
+        "specifications_count": result["specifications_count"],
+        "gross_requirements": result["gross_requirements"]
+    }
+
+
+def _run_net_change(params: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    return MRPService.run_net_change(persist=params.get("persist", True), progress=progress)
+
+
+def _run_time_phased(params: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    result = MRPService.run_time_phased(
+        horizon_days=params.get("horizon_days"),
+        persist=params.get("persist", True),
+        progress=progress
+    )
+    return {
+        "start_date": result["start_date"],
+        "horizon_days": result["horizon_days"],
+        "materials_count": len(result["material_ids"]),
+        "purchase_plans": result["purchase_plans"],
+        "late_plans": result["late_plans"]
+    }
+
+
+def _run_full(params: Dict[str, Any], progress: ProgressCallback) -> Dict[str, Any]:
+    return {
+        "batch": _run_batch(params, progress),
+        "time_phased": _run_time_phased(params, progress)
+    }
+
+
+class MRPJobRunner:
+    """Очередь фоновых запусков MRP без внешнего брокера
+
+    Задание сначала записывается в ``mrp_jobs`` со статусом QUEUED, затем
+    исполняется в локальном пуле потоков. Прогресс пишется в строку задания,
+    поэтому его можно опрашивать из любого процесса. Повторный запрос с теми
+    же входными данными возвращает уже выполняющееся или завершённое задание.
+
+    Активным (QUEUED или RUNNING) может быть только одно задание на тип и
+    параметры. Выполняющееся задание раз в ``HEARTBEAT_INTERVAL`` отмечает
+    ``heartbeat_at``; задание без сигнала дольше ``STALE_AFTER`` осталось от
+    упавшего процесса и помечается FAILED.
+    """
+
+    HEARTBEAT_INTERVAL = timedelta(seconds=30)
+    STALE_AFTER = timedelta(minutes=5)
+
+    JOB_TYPES: Dict[str, Callable[[Dict[str, Any], ProgressCallback], Dict[str, Any]]] = {
+        "batch": _run_batch,
+        "net_change": _run_net_change,
+        "time_phased": _run_time_phased,
+        "full": _run_full,
+    }
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mrp-job")
+
+    @staticmethod
+    def input_watermarks(session: Session) -> Dict[str, Any]:
+        """Отметки входных данных MRP по таблицам
+
+        Для таблиц с ``updated_at`` - последнее изменение и число строк. У
+        заказанных закупок и календаря мощностей отметки изменения нет, их
+        отметка - контрольная сумма столбцов, которые читает MRP: правка
+        количества, даты или мощности на месте меняет ключ кэша.
+        """
+        watermarks = {}
+        for name, model in (
+            ("orders", ProductionOrder),
+            ("specifications", Specification),
+            ("materials", Material),
+            ("stock", WarehouseStock),
+        ):
+            watermarks[name] = session.exec(
+                select(func.max(model.updated_at), func.count(model.id))
+            ).one()
+        watermarks["ordered_purchases"] = MRPJobRunner._checksum(session, (
+            select(PurchasePlan.id, PurchasePlan.material_id, PurchasePlan.planned_date,
+                   MRPService._ordered_quantity())
+            .where(PurchasePlan.status == PurchaseStatus.ORDERED)
+            .order_by(PurchasePlan.id)
+        ))
+        watermarks["capacity"] = MRPJobRunner._checksum(session, (
+            select(WorkshopCapacity.id, WorkshopCapacity.workshop, WorkshopCapacity.capacity_date,
+                   WorkshopCapacity.capacity)
+            .order_by(WorkshopCapacity.id)
+        ))
+        return watermarks
+
+    @staticmethod
+    def _checksum(session: Session, statement) -> str:
+        """Контрольная сумма строк запроса"""
+        digest = hashlib.sha256()
+        for row in session.exec(statement):
+            digest.update(json.dumps(list(row), default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def cache_key(job_type: str, params: Dict[str, Any], watermarks: Dict[str, Any]) -> str:
+        """Ключ кэша: тип задания, параметры и отметки входных данных"""
+        payload = json.dumps([job_type, params, watermarks], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def params_key(job_type: str, params: Dict[str, Any]) -> str:
+        """Ключ активного задания: тип задания и параметры"""
+        payload = json.dumps([job_type, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def fail_stale(cls, session: Session) -> int:
+        """Пометить FAILED выполняющиеся задания без сигнала воркера"""
+        cutoff = datetime.utcnow() - cls.STALE_AFTER
+        failed = session.execute(
+            update(MRPJob)
+            .where(
+                MRPJob.status == MRPJobStatus.RUNNING,
+                func.coalesce(MRPJob.heartbeat_at, MRPJob.started_at) < cutoff
+            )
+            .values(status=MRPJobStatus.FAILED, error="Процесс воркера остановлен", finished_at=datetime.utcnow())
+        ).rowcount
+        session.commit()
+        if failed:
+            logger.warning("Сняты задания MRP упавших процессов: %s", failed)
+        return failed
+
+    def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None,
+               force: bool = False) -> MRPJob:
+        """Поставить запуск MRP в очередь
+
+        Если задание с тем же ключом завершено, оно возвращается без нового
+        расчёта (``force`` отключает кэш). Если задание с тем же типом и
+        параметрами ещё в очереди или выполняется, возвращается оно.
+        """
+        if job_type not in self.JOB_TYPES:
+            raise ValueError(f"Неизвестный тип задания MRP: {job_type}")
+        params = params or {}
+        params_key = self.params_key(job_type, params)
+
+        with Session(engine, expire_on_commit=False) as session:
+            self.fail_stale(session)
+            active = self._active_job(session, params_key)
+            if active:
+                return active
+
+            key = self.cache_key(job_type, params, self.input_watermarks(session))
+            if not force:
+                existing = session.exec(
+                    select(MRPJob)
+                    .where(MRPJob.cache_key == key, MRPJob.status == MRPJobStatus.COMPLETED)
+                    .order_by(MRPJob.id.desc())
+                    .limit(1)
+                ).first()
+                if existing:
+                    return existing
+
+            job = MRPJob(job_type=job_type, params=params, cache_key=key, params_key=params_key)
+            session.add(job)
+            try:
+                session.commit()
+            except IntegrityError:
+                # Такое же задание только что поставил другой процесс
+                session.rollback()
+                return self._active_job(session, params_key) or self.submit(job_type, params, force)
+
+        self._executor.submit(self._execute, job.id)
+        return job
+
+    @staticmethod
+    def _active_job(session: Session, params_key: str) -> Optional[MRPJob]:
+        return session.exec(
+            select(MRPJob).where(
+                MRPJob.params_key == params_key,
+                MRPJob.status.in_((MRPJobStatus.QUEUED, MRPJobStatus.RUNNING))
+            )
+        ).first()
+
+    def resume_pending(self) -> int:
+        """Вернуть в пул задания, оставшиеся в очереди после перезапуска процесса
+
+        Задания упавших процессов, оставшиеся в RUNNING, помечаются FAILED.
+        """
+        with Session(engine) as session:
+            self.fail_stale(session)
+            job_ids = session.exec(
+                select(MRPJob.id).where(MRPJob.status == MRPJobStatus.QUEUED).order_by(MRPJob.id)
+            ).all()
+        for job_id in job_ids:
+            self._executor.submit(self._execute, job_id)
+        return len(job_ids)
+
+    @staticmethod
+    def get_job(job_id: int) -> Optional[MRPJob]:
+        """Состояние задания для опроса прогресса"""
+        with Session(engine) as session:
+            return session.get(MRPJob, job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    @staticmethod
+    def _claim(job_id: int) -> bool:
+        """Забрать задание условным UPDATE, чтобы его не исполнили дважды"""
+        with Session(engine) as session:
+            claimed = session.execute(
+                update(MRPJob)
+                .where(MRPJob.id == job_id, MRPJob.status == MRPJobStatus.QUEUED)
+                .values(status=MRPJobStatus.RUNNING, started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+            ).rowcount
+            session.commit()
+        return claimed == 1
+
+    @staticmethod
+    def _update_job(job_id: int, **values: Any) -> None:
+        with Session(engine) as session:
+            session.execute(update(MRPJob).where(MRPJob.id == job_id).values(**values))
+            session.commit()
+
+    def _execute(self, job_id: int) -> None:
+        if not self._claim(job_id):
+            return
+
+        job = self.get_job(job_id)
+
+        def progress(orders_processed: int, materials_netted: int) -> None:
+            self._update_job(job_id, orders_processed=orders_processed, materials_netted=materials_netted)
+
+        stopped = threading.Event()
+
+        def heartbeat() -> None:
+            while not stopped.wait(self.HEARTBEAT_INTERVAL.total_seconds()):
+                self._update_job(job_id, heartbeat_at=datetime.utcnow())
+
+        threading.Thread(target=heartbeat, name=f"mrp-job-{job_id}-heartbeat", daemon=True).start()
+        try:
+            result = self.JOB_TYPES[job.job_type](job.params or {}, progress)
+        except Exception as e:
+            logger.exception("Задание MRP %s завершилось с ошибкой", job_id)
+            self._update_job(
+                job_id, status=MRPJobStatus.FAILED, error=str(e), finished_at=datetime.utcnow()
+            )
+            return
+        finally:
+            stopped.set()
+
+        self._update_job(
+            job_id,
+            status=MRPJobStatus.COMPLETED,
+            # JSON-колонка: даты и прочие объекты приводятся к строкам
+            result=json.loads(json.dumps(result, default=str)),
+            finished_at=datetime.utcnow()
+        )
+
+
+_runner: Optional[MRPJobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> MRPJobRunner:
+    """Общий для процесса пул фоновых запусков MRP
+
+    Создаётся под блокировкой: одновременные первые вызовы не заводят
+    второй пул и не возвращают в очередь одни и те же задания дважды.
+    """
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = MRPJobRunner()
+                _runner.resume_pending()
+    return _runner
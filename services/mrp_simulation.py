@@ -0,0 +1,249 @@
+# krai_system/services/mrp_simulation.py
+"""Моделирование сценариев MRP «что если» без записи в БД"""
+import copy
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+from ..models.mrp import ProductionSchedule
+from ..models.specifications import Specification
+from .capacity import CapacityCalendar
+from .database import engine
+from .mrp import MRPService
+from .mrp_engine import BomMatrix, OrderDemand, explode_orders, lot_size
+from .warehouse import WarehouseService
+
+
+class SimulatedOrder(NamedTuple):
+    """Заказ в снимке или в сценарии"""
+    demand: OrderDemand
+    workshop: str
+    due_date: Optional[date]
+    scheduled_date: Optional[date] = None
+
+
+class Scenario(NamedTuple):
+    """Сценарий: дополнительные заказы и задержки поставщиков"""
+    name: str
+    extra_orders: Tuple[SimulatedOrder, ...] = ()
+    supplier_delays: Dict[str, int] = {}
+
+
+class MRPSnapshot(NamedTuple):
+    """Снимок остатков, мощностей и заказов для моделирования"""
+    taken_on: date
+    bom_items: Dict[int, Dict[str, float]]
+    orders: List[SimulatedOrder]
+    stock: Dict[int, Dict[str, Any]]
+    calendar: CapacityCalendar
+
+
+def scenario_from_dict(data: Dict[str, Any]) -> Scenario:
+    """Собрать сценарий из словаря (например, из JSON-файла)
+
+    ``extra_orders`` — заказы с полями specification_id, pairs и необязательными
+    workshop, due_date (ISO), leather_material_id, sole_material_id;
+    ``supplier_delays`` — {поставщик: задержка поставки в днях}.
+    """
+    name = data["name"]
+    extra_orders = []
+    for n, item in enumerate(data.get("extra_orders", []), start=1):
+        direct_usage: Dict[str, float] = {}
+        if item.get("leather_material_id"):
+            direct_usage[str(item["leather_material_id"])] = MRPService.LEATHER_USAGE_PER_PAIR
+        if item.get("sole_material_id"):
+            key = str(item["sole_material_id"])
+            direct_usage[key] = direct_usage.get(key, 0) + MRPService.SOLE_USAGE_PER_PAIR
+
+        extra_orders.append(SimulatedOrder(
+            demand=OrderDemand(
+                order_key=item.get("order_number") or f"{name}-{n}",
+                specification_id=item.get("specification_id"),
+                pairs=int(item["pairs"]),
+                direct_usage=direct_usage
+            ),
+            workshop=item.get("workshop") or CapacityCalendar.DEFAULT_WORKSHOP,
+            due_date=date.fromisoformat(item["due_date"]) if item.get("due_date") else None
+        ))
+
+    return Scenario(
+        name=name,
+        extra_orders=tuple(extra_orders),
+        supplier_delays={supplier: int(days) for supplier, days in data.get("supplier_delays", {}).items()}
+    )
+
+
+def load_snapshot(scenarios: Sequence[Scenario] = ()) -> MRPSnapshot:
+    """Прочитать всё, что нужно для моделирования, за одну сессию
+
+    Нормы, остатки, цены и сроки поставки загружаются для спецификаций и
+    материалов открытых заказов и дополнительных заказов ``scenarios``.
+    Неизвестная спецификация или материал сценария — ошибка ``ValueError``:
+    иначе сценарий молча разузловался бы в пустую потребность.
+    """
+    extra_orders = [order for scenario in scenarios for order in scenario.extra_orders]
+
+    with Session(engine) as session:
+        orders = MRPService._load_open_orders(session)
+        scheduled = dict(session.exec(
+            select(ProductionSchedule.order_id, ProductionSchedule.scheduled_date).where(
+                ProductionSchedule.order_id.in_([order.id for order in orders])
+            )
+        ).all()) if orders else {}
+
+        spec_ids = {order.specification_id for order in orders if order.specification_id}
+        scenario_spec_ids = {
+            order.demand.specification_id for order in extra_orders if order.demand.specification_id
+        }
+        spec_ids |= scenario_spec_ids
+        specs = session.exec(
+            select(Specification).where(Specification.id.in_(spec_ids))
+        ).all() if spec_ids else []
+        bom_items = {spec.id: MRPService._specification_bom(spec) for spec in specs}
+
+        unknown_specs = scenario_spec_ids - bom_items.keys()
+        if unknown_specs:
+            raise ValueError(f"Спецификации сценария не найдены: {sorted(unknown_specs)}")
+
+        calendar = MRPService.load_capacity_calendar(session)
+
+    simulated = [
+        SimulatedOrder(
+            demand=MRPService._order_demand(order),
+            workshop=order.workshop or CapacityCalendar.DEFAULT_WORKSHOP,
+            due_date=order.due_date,
+            scheduled_date=scheduled.get(order.id)
+        )
+        for order in orders
+    ]
+    material_ids = {mat_id for bom in bom_items.values() for mat_id in bom}
+    material_ids.update(
+        mat_id for order in simulated + extra_orders for mat_id in order.demand.direct_usage
+    )
+
+    stock = WarehouseService.get_bulk_availability(material_ids)
+    unknown_materials = {
+        mat_id for order in extra_orders for mat_id in order.demand.direct_usage
+        if int(mat_id) not in stock
+    }
+    if unknown_materials:
+        raise ValueError(f"Материалы сценария не найдены: {sorted(unknown_materials)}")
+
+    return MRPSnapshot(
+        taken_on=date.today(),
+        bom_items=bom_items,
+        orders=simulated,
+        stock=stock,
+        calendar=calendar
+    )
+
+
+def simulate(snapshot: MRPSnapshot, scenario: Scenario) -> Dict[str, Any]:
+    """Прогнать цепочку MRP по снимку в памяти
+
+    Потребности → доступность → график → закупки, как в
+    ``MRPService.process_order``, но для всего портфеля сразу и без записи в БД.
+    """
+    orders = snapshot.orders + list(scenario.extra_orders)
+
+    # Потребности
+    explosion = explode_orders(
+        BomMatrix.from_items(snapshot.bom_items), [order.demand for order in orders]
+    )
+    material_ids = explosion.material_ids
+    info = [snapshot.stock.get(int(mat_id), {}) for mat_id in material_ids]
+
+    # Доступность
+    available = np.array([item.get("available", 0.0) for item in info])
+    deficits = np.maximum(explosion.gross - available, 0)
+
+    # Закупки: партия закупки, стоимость и дата прихода с учётом задержки поставщика
+    quantities = lot_size(
+        deficits,
+        np.array([item.get("min_order_qty", 0.0) for item in info]),
+        np.array([item.get("order_multiplicity", 0.0) for item in info])
+    )
+    prices = np.array([item.get("price", 0.0) for item in info])
+    delays = np.array([scenario.supplier_delays.get(item.get("supplier"), 0) for item in info], dtype=np.int64)
+    arrival_days = np.array([
+        MRPService._lead_time(item.get("lead_time_days")) for item in info
+    ], dtype=np.int64) + delays
+
+    # График: остаток распределяется по заказам по очереди; заказ, которому
+    # не хватило материала, не стартует раньше прихода закупки. Запланированный
+    # заказ сохраняет дату, пока её не сорвёт задержка поставщика его материала
+    calendar = copy.deepcopy(snapshot.calendar)
+    remaining = available.copy()
+    requirements = explosion.matrix.tocsc()
+    schedule: Dict[str, date] = {}
+    late_orders = []
+
+    def place(order: SimulatedOrder, earliest: date) -> date:
+        """Первый свободный день цеха не раньше ``earliest``"""
+        scheduled_date = calendar.first_fit(order.workshop, order.demand.pairs, earliest)
+        if scheduled_date is None:
+            scheduled_date = max(earliest, calendar.start + timedelta(days=calendar.horizon_days))
+        calendar.reserve(order.workshop, scheduled_date, order.demand.pairs)
+        return scheduled_date
+
+    for j, order in enumerate(orders):
+        start, end = requirements.indptr[j], requirements.indptr[j + 1]
+        rows = requirements.indices[start:end]
+        short_rows = rows[remaining[rows] < requirements.data[start:end]]
+        remaining[rows] -= requirements.data[start:end]
+
+        if order.scheduled_date:
+            scheduled_date = order.scheduled_date
+            delayed_rows = short_rows[delays[short_rows] > 0]
+            if delayed_rows.size:
+                earliest = snapshot.taken_on + timedelta(days=int(arrival_days[delayed_rows].max()))
+                if earliest > scheduled_date:
+                    calendar.reserve(order.workshop, scheduled_date, -order.demand.pairs)
+                    scheduled_date = place(order, earliest)
+        else:
+            wait_days = int(arrival_days[short_rows].max()) if short_rows.size else 0
+            scheduled_date = place(order, snapshot.taken_on + timedelta(days=wait_days))
+
+        schedule[order.demand.order_key] = scheduled_date
+        if order.due_date and scheduled_date > order.due_date:
+            late_orders.append(order.demand.order_key)
+
+    return {
+        "scenario": scenario.name,
+        "shortages": {
+            mat_id: float(deficit)
+            for mat_id, deficit in zip(material_ids, deficits)
+            if deficit > 0
+        },
+        "purchase_spend": float(quantities @ prices),
+        "schedule": schedule,
+        "late_orders": late_orders,
+        "last_start_date": max(schedule.values()) if schedule else None
+    }
+
+
+def compare_scenarios(scenarios: List[Scenario], max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Сравнить сценарии с базовым планом, считая их параллельно в процессах"""
+    snapshot = load_snapshot(scenarios)
+    scenarios = [Scenario(name="База")] + list(scenarios)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(simulate, [snapshot] * len(scenarios), scenarios))
+
+    return {
+        "snapshot_date": snapshot.taken_on,
+        "scenarios": results,
+        "comparison": {
+            result["scenario"]: {
+                "shortage_materials": len(result["shortages"]),
+                "shortage_qty": sum(result["shortages"].values()),
+                "purchase_spend": result["purchase_spend"],
+                "late_orders": len(result["late_orders"]),
+                "last_start_date": result["last_start_date"]
+            }
+            for result in results
+        }
+    }
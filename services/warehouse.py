@@ -1,7 +1,8 @@
 # krai_system/services/warehouse.py
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from datetime import datetime, date
 from decimal import Decimal
+from sqlalchemy import case, func, or_
 from sqlmodel import Session, select
 from ..models.materials import Material, MaterialGroup
 from ..models.warehouse import WarehouseStock
@@ -43,7 +44,7 @@ class WarehouseService:
                 unit=stock_data.get('unit', 'шт'),
                 location=stock_data.get('location', 'Основной склад'),
                 receipt_date=date.today(),
-                updated_at=datetime.now()
+                updated_at=datetime.utcnow()
             )
             session.add(stock)
             session.commit()
@@ -67,7 +68,7 @@ class WarehouseService:
                     else:
                         setattr(stock, key, value)
 
-            stock.updated_at = datetime.now()
+            stock.updated_at = datetime.utcnow()
             session.add(stock)
             session.commit()
             session.refresh(stock)
@@ -87,31 +88,101 @@ class WarehouseService:
             session.commit()
             return True
     
+    @staticmethod
+    def get_bulk_availability(material_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Доступность материалов одним агрегирующим запросом (остаток минус резерв)
+        """
+        material_ids = {int(mat_id) for mat_id in material_ids}
+        if not material_ids:
+            return {}
+
+        quantity = func.coalesce(func.sum(WarehouseStock.quantity), 0)
+        reserved = func.coalesce(func.sum(WarehouseStock.reserved_qty), 0)
+        statement = (
+            select(
+                Material.id,
+                Material.name,
+                Material.supplier_name,
+                Material.lead_time_days,
+                Material.safety_stock,
+                Material.min_order_qty,
+                Material.order_multiplicity,
+                Material.price,
+                quantity.label("quantity"),
+                reserved.label("reserved")
+            )
+            .outerjoin(WarehouseStock, WarehouseStock.material_id == Material.id)
+            .where(Material.id.in_(material_ids))
+            .group_by(Material.id)
+        )
+
+        with Session(engine) as session:
+            rows = session.exec(statement).all()
+
+        return {
+            row.id: {
+                'material_name': row.name,
+                'supplier': row.supplier_name,
+                'lead_time_days': row.lead_time_days,
+                'safety_stock': float(row.safety_stock or 0),
+                'min_order_qty': float(row.min_order_qty or 0),
+                'order_multiplicity': float(row.order_multiplicity or 0),
+                'price': float(row.price or 0),
+                'quantity': float(row.quantity),
+                'reserved': float(row.reserved),
+                'available': float(row.quantity) - float(row.reserved)
+            }
+            for row in rows
+        }
+
     @staticmethod
     def check_low_stock() -> List[Dict[str, Any]]:
         """
         Проверить материалы с низким остатком
+
+        Доступный остаток материала (за вычетом резерва, по всем партиям)
+        сравнивается с его собственными страховым запасом (CRITICAL) и точкой
+        заказа (LOW). Материалы без порогов не проверяются.
         """
-        low_stock_items = []
+        available = func.coalesce(
+            func.sum(func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(WarehouseStock.reserved_qty, 0)), 0
+        )
+        statement = (
+            select(
+                Material.id,
+                Material.name,
+                Material.unit,
+                Material.safety_stock,
+                Material.reorder_point,
+                available.label("available")
+            )
+            .outerjoin(WarehouseStock, WarehouseStock.material_id == Material.id)
+            .where(or_(Material.safety_stock.is_not(None), Material.reorder_point.is_not(None)))
+            .group_by(Material.id)
+            .having(or_(available < Material.safety_stock, available < Material.reorder_point))
+            .order_by(Material.id)
+        )
 
         with Session(engine) as session:
-            stocks = session.exec(
-                select(WarehouseStock).where(
-                    WarehouseStock.quantity < Decimal('100')  # Low stock threshold
+            rows = session.exec(statement).all()
+
+        return [
+            {
+                'material_id': row.id,
+                'material_name': row.name,
+                'current_stock': float(row.available),
+                'safety_stock': float(row.safety_stock) if row.safety_stock is not None else None,
+                'reorder_point': float(row.reorder_point) if row.reorder_point is not None else None,
+                'unit': row.unit,
+                'status': (
+                    'CRITICAL'
+                    if row.safety_stock is not None and row.available < row.safety_stock
+                    else 'LOW'
                 )
-            ).all()
-
-            for stock in stocks:
-                low_stock_items.append({
-                    'stock_id': stock.id,
-                    'material_id': stock.material_id,
-                    'warehouse_code': stock.warehouse_code,
-                    'current_stock': float(stock.quantity) if stock.quantity else 0,
-                    'unit': stock.unit,
-                    'status': stock.status
-                })
-
-        return low_stock_items
+            }
+            for row in rows
+        ]
     
     @staticmethod
     def receive_materials(receipt_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -143,7 +214,7 @@ class WarehouseService:
                         location=receipt_data.get('location', 'Основной склад'),
                         receipt_date=date.today(),
                         last_receipt_date=date.today(),
-                        updated_at=datetime.now()
+                        updated_at=datetime.utcnow()
                     )
                     session.add(stock)
                     session.flush()
@@ -153,7 +224,7 @@ class WarehouseService:
                     quantity = Decimal(str(item.get('quantity', 0)))
                     stock.quantity = (stock.quantity or Decimal('0')) + quantity
                     stock.last_receipt_date = date.today()
-                    stock.updated_at = datetime.now()
+                    stock.updated_at = datetime.utcnow()
 
             session.commit()
 
@@ -203,7 +274,7 @@ class WarehouseService:
                 # Уменьшаем количество
                 stock.quantity = (stock.quantity or Decimal('0')) - quantity
                 stock.last_issue_date = date.today()
-                stock.updated_at = datetime.now()
+                stock.updated_at = datetime.utcnow()
 
             session.commit()
 
@@ -274,28 +345,47 @@ class WarehouseService:
     def get_warehouse_statistics() -> Dict[str, Any]:
         """
         Получить статистику склада
-        """
-        with Session(engine) as session:
-            stocks = session.exec(select(WarehouseStock)).all()
 
-            total_value = Decimal('0')
-            total_items = 0
-            critical_items = 0
+        Считается агрегатами в SQL, размер ответа не зависит от числа
+        складских остатков. Стоимость партии — по цене закупки, а без неё —
+        по цене материала: FIFO-оценка склада (warehouse_material_valuations)
+        ведётся движениями бэкенда v0.6 в его базе, в базе десктопа её нет.
+        Критический остаток — ниже страхового запаса материала (без него —
+        прежний порог 100).
+        """
+        available = func.coalesce(WarehouseStock.quantity, 0) - func.coalesce(WarehouseStock.reserved_qty, 0)
+        value = func.coalesce(WarehouseStock.quantity, 0) * func.coalesce(
+            WarehouseStock.purchase_price, Material.price, 0
+        )
+        critical = case((available < func.coalesce(Material.safety_stock, 100), 1), else_=0)
+        statement = (
+            select(
+                WarehouseStock.warehouse_code,
+                func.count(WarehouseStock.id).label("items"),
+                func.coalesce(func.sum(value), 0).label("value"),
+                func.coalesce(func.sum(critical), 0).label("critical")
+            )
+            .join(Material, Material.id == WarehouseStock.material_id)
+            .group_by(WarehouseStock.warehouse_code)
+        )
 
-            for stock in stocks:
-                total_items += 1
-                if stock.status == 'CRITICAL':
-                    critical_items += 1
-                # Считаем общую стоимость (временно используем количество * 100 как цену)
-                total_value += stock.quantity * 100
+        with Session(engine) as session:
+            rows = session.exec(statement).all()
 
-            return {
-                'total_materials': total_items,
-                'total_value': float(total_value),
-                'low_stock_count': critical_items,
-                'warehouse_items': stocks,  # Передаем все складские остатки
-                'last_updated': datetime.now().isoformat()
-            }
+        return {
+            'total_materials': sum(row.items for row in rows),
+            'total_value': float(sum(Decimal(str(row.value)) for row in rows)),
+            'low_stock_count': int(sum(row.critical for row in rows)),
+            'by_warehouse': {
+                row.warehouse_code or '': {
+                    'items': row.items,
+                    'value': float(row.value),
+                    'low_stock_count': int(row.critical)
+                }
+                for row in rows
+            },
+            'last_updated': datetime.now().isoformat()
+        }
 
     @staticmethod
     def has_stock_for_material(material_id: str) -> bool:
@@ -0,0 +1,49 @@
+"""Фикстуры тестов сервисов планирования и склада.
+
+Сервисы импортируются как пакет ``krai_system`` (так они развёрнуты) и
+работают с временной базой SQLite; перед каждым тестом схема создаётся
+заново.
+"""
+
+import importlib
+import os
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DB_PATH = Path(tempfile.mkdtemp(prefix="krai_tests_")) / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+# Пакет krai_system из каталогов репозитория; модули mrp и warehouse
+# в развёрнутой системе называются без суффикса _models
+_package = types.ModuleType("krai_system")
+_package.__path__ = [str(ROOT)]
+sys.modules.setdefault("krai_system", _package)
+for _alias, _module in {"mrp": "mrp_models", "warehouse": "warehouse_models"}.items():
+    sys.modules[f"krai_system.models.{_alias}"] = importlib.import_module(f"krai_system.models.{_module}")
+
+from sqlmodel import Session, SQLModel  # noqa: E402
+
+from krai_system.models import (  # noqa: E402,F401
+    cutting_parts, materials, models, mrp_models, production_orders, specifications, warehouse_models,
+)
+from krai_system.services import database  # noqa: E402
+
+database.engine.echo = False
+
+
+@pytest.fixture
+def engine():
+    SQLModel.metadata.drop_all(database.engine)
+    SQLModel.metadata.create_all(database.engine)
+    return database.engine
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,222 @@
+"""Тесты расчёта потребностей и плана закупок MRP"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlmodel import select
+
+from krai_system.models.materials import Material, MaterialGroup
+from krai_system.models.mrp import (
+    MRPWatermark, ProductionSchedule, PurchasePlan, PurchasePlanOrderRef, PurchaseStatus, WorkshopCapacity,
+)
+from krai_system.models.production_orders import OrderStatus, ProductionOrder
+from krai_system.models.specifications import Specification
+from krai_system.models.warehouse import WarehouseStock
+from krai_system.services.mrp import MRPService
+from krai_system.services.warehouse import WarehouseService
+
+
+def _material(session, code, **fields):
+    material = Material(code=code, name=code, group_type=MaterialGroup.HARDWARE, supplier_name="Поставщик", **fields)
+    session.add(material)
+    session.commit()
+    return material
+
+
+def _order(session, number, sizes, **fields):
+    fields.setdefault("due_date", date.today() + timedelta(days=30))
+    order = ProductionOrder(
+        order_number=number,
+        model_id=1,
+        sizes=sizes,
+        status=OrderStatus.CONFIRMED,
+        **fields,
+    )
+    session.add(order)
+    session.commit()
+    return order
+
+
+def test_requirements_use_specification_hardware_and_order_materials(session):
+    laces = _material(session, "LACES")
+    leather = _material(session, "LEATHER")
+    spec = Specification(model_id=1, hardware=[{"material_id": laces.id, "quantity": 2}])
+    session.add(spec)
+    session.commit()
+    order = _order(session, "PO-1", {"40": 3, "41": 2}, specification_id=spec.id, leather_material_id=leather.id)
+
+    requirements = MRPService.calculate_material_requirements(order)
+
+    assert requirements == {
+        str(laces.id): 10,
+        str(leather.id): 5 * MRPService.LEATHER_USAGE_PER_PAIR,
+    }
+
+
+def test_net_change_sees_desktop_stock_updates_and_in_flight_changes(session):
+    leather = _material(session, "LEATHER")
+    order = _order(session, "PO-1", {"40": 5}, leather_material_id=leather.id)
+    first = MRPService.run_net_change()
+    assert first["changed_orders"] == ["PO-1"]
+
+    # Складской сервис десктопа пишет updated_at по тем же часам (UTC)
+    WarehouseService.create_stock({"material_id": leather.id, "quantity": 3})
+    # Изменение из транзакции, начатой до прошлого запуска
+    watermark = session.get(MRPWatermark, MRPService.NET_CHANGE_RUN).last_run_at
+    order = session.get(ProductionOrder, order.id)
+    order.sizes = {"40": 6}
+    order.updated_at = watermark - timedelta(minutes=1)
+    session.add(order)
+    session.commit()
+
+    second = MRPService.run_net_change()
+
+    assert str(leather.id) in second["changed_materials"]
+    assert second["changed_orders"] == ["PO-1"]
+
+
+def test_ordered_lot_counts_as_incoming_supply(session):
+    leather = _material(session, "LEATHER", lead_time_days=3, min_order_qty=Decimal(100))
+    _order(session, "PO-1", {"40": 25}, leather_material_id=leather.id)
+    # Заказана минимальная партия 100 при дефиците 10
+    session.add(PurchasePlan(
+        material_id=leather.id, material_name="LEATHER", required_qty=Decimal(10), available_qty=Decimal(0),
+        deficit_qty=Decimal(10), order_qty=Decimal(100), supplier="Поставщик",
+        planned_date=date.today(), status=PurchaseStatus.ORDERED,
+    ))
+    session.commit()
+
+    phased = MRPService.run_time_phased(persist=False)
+    assert phased["purchase_plans"] == 0
+    assert phased["receipts"].sum() == 100
+
+    MRPService.run_net_change()
+    pending = session.exec(select(PurchasePlan).where(PurchasePlan.status == PurchaseStatus.PENDING)).all()
+    assert pending == []
+
+
+def test_reprocessing_an_order_does_not_double_its_demand(session):
+    leather = _material(session, "LEATHER")
+    session.add(WarehouseStock(material_id=leather.id, quantity=Decimal(10), unit="дм"))
+    session.commit()
+    first = _order(session, "PO-1", {"40": 10}, leather_material_id=leather.id)
+    second = _order(session, "PO-2", {"41": 10}, leather_material_id=leather.id)
+
+    def pending_plan():
+        session.expire_all()
+        return session.exec(select(PurchasePlan).where(PurchasePlan.status == PurchaseStatus.PENDING)).one()
+
+    MRPService.process_order(first)
+    plan = pending_plan()
+    assert (plan.required_qty, plan.deficit_qty) == (Decimal(20), Decimal(10))
+
+    MRPService.process_order(session.get(ProductionOrder, first.id))
+    plan = pending_plan()
+    assert (plan.required_qty, plan.deficit_qty) == (Decimal(20), Decimal(10))
+
+    MRPService.process_order(second)
+    plan = pending_plan()
+    assert (plan.required_qty, plan.deficit_qty) == (Decimal(40), Decimal(30))
+    assert plan.order_refs == ["PO-1", "PO-2"]
+
+
+def _daily_load(session):
+    load = {}
+    for schedule in session.exec(select(ProductionSchedule)).all():
+        key = (schedule.workshop, schedule.scheduled_date)
+        load[key] = load.get(key, 0) + schedule.capacity_used
+    return load
+
+
+def test_capacity_calendar_respects_workshop_and_date_capacity(session):
+    first_day = date.today() + timedelta(days=1)
+    session.add_all([
+        WorkshopCapacity(workshop="Цех 1", capacity=10),
+        WorkshopCapacity(workshop="Цех 1", capacity_date=first_day + timedelta(days=1), capacity=0),
+    ])
+    session.commit()
+    orders = [_order(session, f"PO-{n}", {"40": 6}, workshop="Цех 1") for n in range(3)]
+
+    schedules = MRPService.schedule_orders(orders)
+
+    assert [schedule.scheduled_date for schedule in schedules] == [
+        first_day, first_day + timedelta(days=2), first_day + timedelta(days=3)
+    ]
+    # Загрузка из графика учитывается при следующем планировании
+    late = _order(session, "PO-3", {"40": 4}, workshop="Цех 1")
+    assert MRPService.schedule_production(late).scheduled_date == first_day
+    assert max(_daily_load(session).values()) == 10
+
+
+def test_finite_capacity_schedules_by_slack_then_priority(session):
+    today = date.today()
+    first_day = today + timedelta(days=1)
+    session.add(WorkshopCapacity(workshop="Цех 1", capacity=10))
+    session.commit()
+    relaxed = _order(session, "PO-RELAXED", {"40": 10}, workshop="Цех 1", due_date=today + timedelta(days=20))
+    urgent = _order(session, "PO-URGENT", {"40": 10}, workshop="Цех 1", due_date=today + timedelta(days=3))
+    important = _order(session, "PO-IMPORTANT", {"40": 10}, workshop="Цех 1", priority=90,
+                       due_date=today + timedelta(days=20))
+    _order(session, "PO-HUGE", {"40": 50}, workshop="Цех 1", due_date=today + timedelta(days=20))
+
+    report = MRPService.schedule_finite_capacity()
+
+    beyond_horizon = first_day + timedelta(days=MRPService.SCHEDULING_HORIZON_DAYS)
+    scheduled = {
+        schedule.order_id: schedule.scheduled_date
+        for schedule in session.exec(select(ProductionSchedule)).all()
+    }
+    assert [scheduled[order.id] for order in (urgent, important, relaxed)] == [
+        first_day, first_day + timedelta(days=1), first_day + timedelta(days=2)
+    ]
+    assert (report["scheduled"], report["beyond_horizon"]) == (4, 1)
+    assert [late["order_number"] for late in report["late_orders"]] == ["PO-HUGE"]
+    assert report["late_orders"][0]["scheduled_date"] == beyond_horizon
+    assert all(
+        load <= 10 for (_, day), load in _daily_load(session).items() if day < beyond_horizon
+    )
+
+    assert MRPService.schedule_finite_capacity()["scheduled"] == 0
+
+
+def test_schedule_read_joins_order_numbers_and_filters(session):
+    first_day = date.today() + timedelta(days=1)
+    for n, (workshop, offset) in enumerate([("Цех 1", 2), ("Цех 2", 0), ("Цех 1", 0), ("Цех 1", 9)]):
+        order = _order(session, f"PO-{n}", {"40": 5})
+        session.add(ProductionSchedule(order_id=order.id, scheduled_date=first_day + timedelta(days=offset),
+                                       capacity_used=5, workshop=workshop))
+    session.commit()
+
+    rows = MRPService.get_production_schedule(first_day, first_day + timedelta(days=5))
+
+    assert [(row["date"], row["order_number"], row["workshop"]) for row in rows] == [
+        (first_day, "PO-1", "Цех 2"),
+        (first_day, "PO-2", "Цех 1"),
+        (first_day + timedelta(days=2), "PO-0", "Цех 1"),
+    ]
+    assert rows[0]["status"] == "planned"
+    streamed = MRPService.iter_production_schedule(workshop="Цех 1", batch_size=1)
+    assert [row.order_number for row in streamed] == ["PO-2", "PO-0", "PO-3"]
+
+
+def test_processing_an_order_merges_all_pending_plans_of_a_material(session):
+    leather = _material(session, "LEATHER")
+    today = date.today()
+    for number, days in (("PO-1", 10), ("PO-2", 20)):
+        _order(session, number, {"40": 10}, leather_material_id=leather.id, due_date=today + timedelta(days=days),
+               material_requirements={str(leather.id): 20})
+    # Нетто-расчёт по дням оставляет по плану на каждый день потребности
+    MRPService.run_time_phased()
+    assert len(session.exec(select(PurchasePlan)).all()) == 2
+    third = _order(session, "PO-3", {"40": 10}, leather_material_id=leather.id)
+
+    MRPService.process_order(third)
+
+    session.expire_all()
+    [plan] = session.exec(select(PurchasePlan).where(PurchasePlan.status == PurchaseStatus.PENDING)).all()
+    assert (plan.required_qty, plan.deficit_qty) == (Decimal(60), Decimal(60))
+    # PO-3 запускается завтра: закупка нужна уже сегодня
+    assert plan.planned_date == today
+    assert plan.order_refs == ["PO-1", "PO-2", "PO-3"]
+    refs = session.exec(select(PurchasePlanOrderRef.order_number)).all()
+    assert sorted(refs) == ["PO-1", "PO-2", "PO-3"]
@@ -0,0 +1,114 @@
+"""Тесты фоновых запусков MRP"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from krai_system.models.materials import Material, MaterialGroup
+from krai_system.models.mrp import MRPJob, MRPJobStatus, MRPWatermark, PurchasePlan, PurchaseStatus, WorkshopCapacity
+from krai_system.models.production_orders import OrderStatus, ProductionOrder
+from krai_system.services import mrp_jobs
+from krai_system.services.mrp_jobs import MRPJobRunner
+
+
+def _run(job_type, params):
+    runner = MRPJobRunner(max_workers=1)
+    job = runner.submit(job_type, params)
+    runner.shutdown(wait=True)
+    return runner.get_job(job.id)
+
+
+def test_dry_run_net_change_job_writes_nothing(session):
+    leather = Material(code="LEATHER", name="Кожа", group_type=MaterialGroup.LEATHER, supplier_name="Поставщик")
+    session.add(leather)
+    session.commit()
+    session.add(ProductionOrder(order_number="PO-1", due_date=date.today() + timedelta(days=30), model_id=1,
+                                sizes={"40": 5}, leather_material_id=leather.id, status=OrderStatus.CONFIRMED))
+    session.commit()
+
+    job = _run("net_change", {"persist": False})
+
+    assert job.status == MRPJobStatus.COMPLETED
+    assert job.result["purchase_plans"] == 1
+    assert session.get(MRPWatermark, "net_change") is None
+    assert session.exec(select(PurchasePlan)).all() == []
+
+
+def test_job_of_a_crashed_process_is_failed_and_resubmitted(session):
+    params = {"persist": False}
+    stale_at = datetime.utcnow() - MRPJobRunner.STALE_AFTER - timedelta(minutes=1)
+    stale = MRPJob(job_type="batch", params=params, cache_key="stale", params_key=MRPJobRunner.params_key("batch", params),
+                   status=MRPJobStatus.RUNNING, started_at=stale_at, heartbeat_at=stale_at)
+    session.add(stale)
+    session.commit()
+
+    job = _run("batch", params)
+
+    assert job.id != stale.id
+    assert job.status == MRPJobStatus.COMPLETED
+    session.refresh(stale)
+    assert stale.status == MRPJobStatus.FAILED
+
+
+def test_one_active_job_per_type_and_params(session):
+    params_key = MRPJobRunner.params_key("batch", {})
+    queued = MRPJob(job_type="batch", params={}, cache_key="a", params_key=params_key)
+    session.add(queued)
+    session.commit()
+
+    assert MRPJobRunner(max_workers=1).submit("batch").id == queued.id
+
+    session.add(MRPJob(job_type="batch", params={}, cache_key="b", params_key=params_key))
+    with pytest.raises(IntegrityError):
+        session.commit()
+
+
+def test_cache_key_changes_when_ordered_purchase_or_capacity_is_edited_in_place(session):
+    plan = PurchasePlan(material_id=1, order_qty=Decimal(100), planned_date=date.today(), status=PurchaseStatus.ORDERED)
+    capacity = WorkshopCapacity(workshop="Цех 1", capacity=100)
+    session.add_all([plan, capacity])
+    session.commit()
+
+    def cache_key():
+        return MRPJobRunner.cache_key("time_phased", {}, MRPJobRunner.input_watermarks(session))
+
+    keys = [cache_key()]
+    plan.order_qty = Decimal(150)
+    session.add(plan)
+    session.commit()
+    keys.append(cache_key())
+    capacity.capacity = 80
+    session.add(capacity)
+    session.commit()
+    keys.append(cache_key())
+
+    assert len(set(keys)) == 3
+    assert cache_key() == keys[-1]
+
+
+def test_concurrent_first_calls_share_one_runner(session, monkeypatch):
+    created = []
+    init = MRPJobRunner.__init__
+
+    def slow_init(runner, *args, **kwargs):
+        time.sleep(0.05)
+        init(runner, *args, **kwargs)
+        created.append(runner)
+
+    monkeypatch.setattr(mrp_jobs, "_runner", None)
+    monkeypatch.setattr(MRPJobRunner, "__init__", slow_init)
+    runners = []
+    threads = [threading.Thread(target=lambda: runners.append(mrp_jobs.get_job_runner())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert {id(runner) for runner in runners} == {id(created[0])}
+    created[0].shutdown()
@@ -0,0 +1,57 @@
+"""Тесты моделирования сценариев MRP"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from krai_system.models.materials import Material, MaterialGroup
+from krai_system.models.mrp import ProductionSchedule
+from krai_system.models.production_orders import OrderStatus, ProductionOrder
+from krai_system.models.specifications import Specification
+from krai_system.services.mrp_simulation import load_snapshot, scenario_from_dict, simulate
+
+
+def test_scenario_for_a_specification_without_open_orders(session):
+    laces = Material(code="LACES", name="Шнурки", group_type=MaterialGroup.HARDWARE, supplier_name="Поставщик",
+                     price=Decimal(3))
+    session.add(laces)
+    session.commit()
+    spec = Specification(model_id=1, hardware=[{"material_id": laces.id, "quantity": 2}])
+    session.add(spec)
+    session.commit()
+    scenario = scenario_from_dict({"name": "+500 пар", "extra_orders": [{"specification_id": spec.id, "pairs": 500}]})
+
+    result = simulate(load_snapshot([scenario]), scenario)
+
+    assert result["shortages"] == {str(laces.id): 1000.0}
+    assert result["purchase_spend"] == 3000.0
+
+
+def test_unknown_scenario_specification_is_an_error(session):
+    scenario = scenario_from_dict({"name": "ошибка", "extra_orders": [{"specification_id": 999, "pairs": 10}]})
+
+    with pytest.raises(ValueError, match="999"):
+        load_snapshot([scenario])
+
+
+def test_supplier_delay_pushes_back_an_already_scheduled_order(session):
+    leather = Material(code="LEATHER", name="Кожа", group_type=MaterialGroup.LEATHER, supplier_name="Кожевник",
+                       lead_time_days=2)
+    session.add(leather)
+    session.commit()
+    tomorrow = date.today() + timedelta(days=1)
+    order = ProductionOrder(order_number="PO-1", model_id=1, sizes={"40": 10}, status=OrderStatus.CONFIRMED,
+                            due_date=tomorrow + timedelta(days=5), leather_material_id=leather.id)
+    session.add(order)
+    session.commit()
+    session.add(ProductionSchedule(order_id=order.id, scheduled_date=tomorrow + timedelta(days=3), capacity_used=10))
+    session.commit()
+    delay = scenario_from_dict({"name": "Задержка", "supplier_delays": {"Кожевник": 10}})
+    base = scenario_from_dict({"name": "База"})
+    snapshot = load_snapshot([delay])
+
+    assert simulate(snapshot, base)["schedule"] == {"PO-1": tomorrow + timedelta(days=3)}
+    delayed = simulate(snapshot, delay)
+    assert delayed["schedule"] == {"PO-1": date.today() + timedelta(days=12)}
+    assert delayed["late_orders"] == ["PO-1"]